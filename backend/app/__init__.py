@@ -26,11 +26,15 @@ def create_app(config_name='default'):
     """
     app = Flask(__name__)
     
+    # Encode ObjectId/datetime directly when writing JSON responses
+    from app.utils.json_provider import MongoJSONProvider
+    app.json = MongoJSONProvider(app)
+    
     # Load configuration
     app.config.from_object(config[config_name])
     
     # Initialize extensions
-    CORS(app, origins=app.config['CORS_ORIGINS'])
+    CORS(app, origins=app.config['CORS_ORIGINS'], expose_headers=['X-Next-Cursor'])
     jwt.init_app(app)
     
     # Initialize MongoDB
@@ -41,6 +45,31 @@ def create_app(config_name='default'):
     # Store db in app context
     app.db = db
     
+    # Size the per-worker user/tenant caches
+    from app.utils.cache import get_cache
+    max_entries = app.config['CONTEXT_CACHE_MAX_ENTRIES']
+    get_cache('users').configure(maxsize=max_entries, ttl=app.config['USER_CACHE_TTL'])
+    get_cache('tenants').configure(maxsize=max_entries, ttl=app.config['TENANT_CACHE_TTL'])
+    get_cache('tenant_ids').configure(maxsize=max_entries)
+    get_cache('demo_tokens').configure(maxsize=max_entries)
+    get_cache('authz_versions').configure(maxsize=max_entries, ttl=app.config['AUTHZ_VERSION_CACHE_TTL'])
+    get_cache('chart_of_accounts').configure(maxsize=max_entries, ttl=app.config['ACCOUNT_CACHE_TTL'])
+    get_cache('settings').configure(maxsize=max_entries, ttl=app.config['SETTINGS_CACHE_TTL'])
+    get_cache('settings_versions').configure(maxsize=max_entries, ttl=app.config['SETTINGS_VERSION_CACHE_TTL'])
+    get_cache('dashboard_stats').configure(maxsize=max_entries, ttl=app.config['DASHBOARD_CACHE_TTL'])
+    
+    # Bounded bcrypt pool
+    from app.utils.password_service import configure_password_hashing
+    configure_password_hashing(
+        rounds=app.config['BCRYPT_ROUNDS'],
+        workers=app.config['PASSWORD_HASH_WORKERS'],
+        queue_limit=app.config['PASSWORD_HASH_QUEUE_LIMIT']
+    )
+    
+    # Batched activity log writer
+    from app.utils.activity_service import configure_activity_writer
+    configure_activity_writer(app)
+    
     # Register blueprints
     from app.routes import register_blueprints
     register_blueprints(app)
@@ -50,13 +79,19 @@ def create_app(config_name='default'):
     
     # Initialize super admin
     with app.app_context():
-        from app.utils.init_db import initialize_super_admin
+        from app.utils.init_db import initialize_super_admin, initialize_indexes
         initialize_super_admin()
+        if app.config['AUTO_CREATE_INDEXES']:
+            initialize_indexes()
     
     # Initialize background scheduler
     from app.jobs.scheduler import init_scheduler
     init_scheduler(app)
     
+    # Drain post-commit side effects (ledger postings, activity logs)
+    from app.utils.outbox_service import start_outbox_workers
+    start_outbox_workers(app)
+    
     return app
 
 
@@ -44,6 +44,70 @@ class Config:
     
     # CORS
     CORS_ORIGINS = os.getenv('CORS_ORIGINS', 'http://localhost:3000,http://localhost:5173').split(',')
+    
+    # Stock reservations
+    STOCK_RESERVATION_MAX_RETRIES = int(os.getenv('STOCK_RESERVATION_MAX_RETRIES', 3))
+    
+    # Document number sequences (numbers reserved per worker at a time)
+    SEQUENCE_BLOCK_SIZE = int(os.getenv('SEQUENCE_BLOCK_SIZE', 1))
+    
+    # Indexes (build missing registry indexes on startup - off by default, deploys run
+    # `python manage_indexes.py build` once instead of every worker building at boot)
+    AUTO_CREATE_INDEXES = os.getenv('AUTO_CREATE_INDEXES', 'false').lower() == 'true'
+    
+    # In-process user/tenant cache (seconds, 0 disables)
+    USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', 30))
+    TENANT_CACHE_TTL = int(os.getenv('TENANT_CACHE_TTL', 30))
+    CONTEXT_CACHE_MAX_ENTRIES = int(os.getenv('CONTEXT_CACHE_MAX_ENTRIES', 10000))
+    
+    # Chart of accounts cache used by ledger posting (seconds, 0 disables)
+    ACCOUNT_CACHE_TTL = int(os.getenv('ACCOUNT_CACHE_TTL', 300))
+    
+    # Tenant settings cache (seconds, 0 disables) and how long a worker trusts
+    # its cached settings version before re-checking it
+    SETTINGS_CACHE_TTL = int(os.getenv('SETTINGS_CACHE_TTL', 300))
+    SETTINGS_VERSION_CACHE_TTL = int(os.getenv('SETTINGS_VERSION_CACHE_TTL', 5))
+    
+    # Per-tenant dashboard statistics cache (/api/customer/stats, seconds, 0 disables)
+    DASHBOARD_CACHE_TTL = int(os.getenv('DASHBOARD_CACHE_TTL', 30))
+    
+    # Authorize from access token claims (revoked via per-tenant authz versions)
+    AUTH_CLAIMS_MODE = os.getenv('AUTH_CLAIMS_MODE', 'false').lower() == 'true'
+    AUTHZ_VERSION_CACHE_TTL = int(os.getenv('AUTHZ_VERSION_CACHE_TTL', 5))
+    
+    # Password hashing (bcrypt cost factor and hashing pool; 0 workers = one per core)
+    BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', 12))
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 0))
+    PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv('PASSWORD_HASH_QUEUE_LIMIT', 64))
+    
+    # In-process barcode/SKU index (rebuilt after TTL seconds, LRU over tenants)
+    PRODUCT_INDEX_TTL = int(os.getenv('PRODUCT_INDEX_TTL', 300))
+    PRODUCT_INDEX_MAX_TENANTS = int(os.getenv('PRODUCT_INDEX_MAX_TENANTS', 500))
+    
+    # In-process product search (rebuilt after TTL seconds; velocity window in days)
+    SEARCH_INDEX_TTL = int(os.getenv('SEARCH_INDEX_TTL', 600))
+    SEARCH_INDEX_MAX_TENANTS = int(os.getenv('SEARCH_INDEX_MAX_TENANTS', 200))
+    SEARCH_VELOCITY_DAYS = int(os.getenv('SEARCH_VELOCITY_DAYS', 30))
+    
+    # Batch journal posting (entries per request; entries per insert_many)
+    JOURNAL_BATCH_MAX_ENTRIES = int(os.getenv('JOURNAL_BATCH_MAX_ENTRIES', 5000))
+    JOURNAL_BATCH_CHUNK_SIZE = int(os.getenv('JOURNAL_BATCH_CHUNK_SIZE', 1000))
+    
+    # Outbox for post-commit side effects (worker threads per process, 0 = enqueue only)
+    OUTBOX_WORKERS = int(os.getenv('OUTBOX_WORKERS', 2))
+    OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', 8))
+    OUTBOX_POLL_INTERVAL = float(os.getenv('OUTBOX_POLL_INTERVAL', 2))
+    OUTBOX_LEASE_SECONDS = int(os.getenv('OUTBOX_LEASE_SECONDS', 60))
+    
+    # Buffered activity log writer (entries held in memory, 0 = write directly; flush interval in seconds)
+    ACTIVITY_BUFFER_SIZE = int(os.getenv('ACTIVITY_BUFFER_SIZE', 10000))
+    ACTIVITY_BATCH_SIZE = int(os.getenv('ACTIVITY_BATCH_SIZE', 500))
+    ACTIVITY_FLUSH_INTERVAL = float(os.getenv('ACTIVITY_FLUSH_INTERVAL', 1.0))
+    
+    # Log retention (days kept in the hot collections; tenants can override activity logs in settings)
+    ACTIVITY_RETENTION_DAYS = int(os.getenv('ACTIVITY_RETENTION_DAYS', 90))
+    AUDIT_RETENTION_DAYS = int(os.getenv('AUDIT_RETENTION_DAYS', 365))
+    LOG_ARCHIVE_GRACE_DAYS = int(os.getenv('LOG_ARCHIVE_GRACE_DAYS', 7))
 
 
 class DevelopmentConfig(Config):
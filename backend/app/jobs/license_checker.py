@@ -4,6 +4,8 @@ Background job for checking and updating license statuses
 from datetime import datetime, timezone, timedelta
 from flask import current_app
 from app.utils.constants import LICENSE_STATUS_ACTIVE, LICENSE_STATUS_EXPIRED, LICENSE_STATUS_TRIAL
+from app.models.tenant import Tenant
+from app.utils.retention_service import get_expire_at
 
 
 def check_license_expiry():
@@ -47,6 +49,7 @@ def check_license_expiry():
                             {'_id': tenant['_id']},
                             {'$set': {'license.status': LICENSE_STATUS_EXPIRED}}
                         )
+                        Tenant.invalidate_access(tenant['_id'])
                         expired_count += 1
                         
                         # Log the expiry
@@ -57,6 +60,7 @@ def check_license_expiry():
                         {'_id': tenant['_id']},
                         {'$set': {'license.status': LICENSE_STATUS_EXPIRED}}
                     )
+                    Tenant.invalidate_access(tenant['_id'])
                     expired_count += 1
                     
                     # Log the expiry
@@ -89,6 +93,7 @@ def log_license_expiry(db, tenant):
         },
         'timestamp': get_current_utc_time()
     }
+    audit_log['expire_at'] = get_expire_at(audit_log['timestamp'], current_app.config.get('AUDIT_RETENTION_DAYS', 365))
     
     db.audit_logs.insert_one(audit_log)
 
@@ -150,5 +155,6 @@ def log_reminder(db, tenant, days):
         },
         'timestamp': get_current_utc_time()
     }
+    audit_log['expire_at'] = get_expire_at(audit_log['timestamp'], current_app.config.get('AUDIT_RETENTION_DAYS', 365))
     
     db.audit_logs.insert_one(audit_log)
@@ -60,6 +60,25 @@ def init_scheduler(app):
             name='Cleanup expired demo accounts',
             replace_existing=True
         )
+        
+        # Move activity/audit logs past their retention window to the archive daily at 3 AM
+        scheduler.add_job(
+            func=lambda: archive_logs_with_context(app),
+            trigger=CronTrigger(hour=3, minute=0),
+            id='log_archive',
+            name='Archive old activity and audit logs',
+            replace_existing=True
+        )
+        
+        # Enqueue outbox records a crashed request left on its sale / PO every minute
+        scheduler.add_job(
+            func=lambda: sweep_outbox_with_context(app),
+            trigger='interval',
+            minutes=1,
+            id='outbox_sweep',
+            name='Enqueue stranded outbox records',
+            replace_existing=True
+        )
     
     scheduler.start()
     print("✅ Background scheduler started")
@@ -90,6 +109,29 @@ def cleanup_expired_demos_with_context(app):
             print(f"✅ Cleaned up {count} expired demo accounts")
 
 
+def archive_logs_with_context(app):
+    """Run log archiving with app context"""
+    with app.app_context():
+        from app.utils.retention_service import archive_logs
+        try:
+            archived = archive_logs()
+            print(f"✅ Archived logs: {archived}")
+        except Exception as e:
+            print(f"❌ Error in log archive job: {str(e)}")
+
+
+def sweep_outbox_with_context(app):
+    """Run the outbox sweep with app context"""
+    with app.app_context():
+        from app.utils.outbox_service import sweep_pending
+        try:
+            swept = sweep_pending()
+            if swept > 0:
+                print(f"✅ Enqueued {swept} stranded outbox records")
+        except Exception as e:
+            print(f"❌ Error in outbox sweep job: {str(e)}")
+
+
 def shutdown_scheduler():
     """Shutdown the scheduler"""
     global scheduler
@@ -6,8 +6,18 @@ from flask import jsonify, request, current_app, g
 from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity, get_jwt
 from app.models.user import User
 from bson import ObjectId
+from app.utils.cache import get_cache
+from app.utils.authz_service import is_claims_mode, user_from_claims
 from datetime import datetime, timezone
 import jwt as pyjwt
+import logging
+import time
+
+
+logger = logging.getLogger(__name__)
+
+# Validated demo tokens -> demo user, cached for the token lifetime
+demo_token_cache = get_cache('demo_tokens')
 
 
 def jwt_required_custom(fn):
@@ -50,50 +60,107 @@ def is_demo_user():
     return hasattr(g, 'is_demo') and g.is_demo
 
 
-def get_demo_user_from_token():
-    """Extract demo user from Authorization header"""
+class Principal:
+    """Authenticated identity of the current request, stored in g.principal"""
+    
+    DEMO = 'demo'
+    USER = 'user'
+    
+    __slots__ = ('kind', 'user_id', 'tenant_id', 'user')
+    
+    def __init__(self, kind, user):
+        self.kind = kind
+        self.user_id = user['_id']
+        self.tenant_id = user.get('tenant_id')
+        self.user = user
+    
+    @property
+    def is_demo(self):
+        return self.kind == Principal.DEMO
+    
+    def __repr__(self):
+        return f"<Principal {self.kind} {self.user_id}>"
+
+
+def get_current_principal():
+    """Get the Principal set by tenant_required (None outside tenant routes)"""
+    return g.get('principal')
+
+
+def get_bearer_token():
+    """Raw token from the Authorization header"""
     auth_header = request.headers.get('Authorization', '')
     if not auth_header.startswith('Bearer '):
         return None
+    return auth_header[7:].strip() or None
+
+
+def read_unverified_claims(token):
+    """
+    Read the token claims without verifying the signature
+    Only used to pick the verification path - never trust the result on its own
+    """
+    try:
+        return pyjwt.decode(token, options={'verify_signature': False})
+    except pyjwt.InvalidTokenError:
+        return None
+
+
+def resolve_demo_user(token):
+    """
+    Verify a demo token and load its demo user
+    The result is cached until the token or the demo account expires, so a
+    demo session pays for one signature check and one lookup
+    """
+    cached = demo_token_cache.get(token)
+    if cached:
+        return cached
     
-    token = auth_header.split(' ')[1]
     try:
-        # Decode the token - this is the demo token signed with our secret
         payload = pyjwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
-        
-        # Check if this is a demo token
         if not payload.get('is_demo'):
             return None
-        
-        db = current_app.db
-        demo_user = db.demo_users.find_one({'_id': ObjectId(payload['demo_user_id'])})
-        
-        if demo_user:
-            expires_at = demo_user.get('expires_at')
-            if expires_at:
-                if expires_at.tzinfo is None:
-                    expires_at = expires_at.replace(tzinfo=timezone.utc)
-                if expires_at > datetime.now(timezone.utc):
-                    # Create a user-like object for the demo user
-                    demo_user['is_demo'] = True
-                    demo_user['tenant_id'] = str(demo_user['_id'])  # Use demo user ID as virtual tenant
-                    return demo_user
-                else:
-                    print(f"[Demo Auth] Token expired for user {payload['demo_user_id']}")
-            else:
-                print(f"[Demo Auth] No expires_at field for user {payload['demo_user_id']}")
-        else:
-            print(f"[Demo Auth] Demo user not found: {payload['demo_user_id']}")
+        demo_user = current_app.db.demo_users.find_one({'_id': ObjectId(payload['demo_user_id'])})
+    except Exception as e:
+        logger.debug("Rejected demo token: %s", e)
+        return None
+    
+    if not demo_user:
+        logger.debug("Demo user not found: %s", payload['demo_user_id'])
         return None
-    except pyjwt.ExpiredSignatureError:
-        print("[Demo Auth] Token expired")
+    
+    expires_at = demo_user.get('expires_at')
+    if not expires_at:
+        logger.debug("No expires_at field for demo user %s", payload['demo_user_id'])
         return None
-    except pyjwt.InvalidTokenError as e:
-        print(f"[Demo Auth] Invalid token: {e}")
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    if expires_at <= datetime.now(timezone.utc):
+        logger.debug("Demo account expired: %s", payload['demo_user_id'])
         return None
-    except Exception as e:
-        print(f"[Demo Auth] Error: {e}")
+    
+    # Create a user-like object for the demo user
+    demo_user['is_demo'] = True
+    demo_user['tenant_id'] = str(demo_user['_id'])  # Use demo user ID as virtual tenant
+    
+    valid_until = expires_at.timestamp()
+    if payload.get('exp'):
+        valid_until = min(valid_until, payload['exp'])
+    demo_token_cache.set(token, demo_user, ttl=valid_until - time.time())
+    return demo_user
+
+
+def get_demo_user_from_token():
+    """Extract demo user from Authorization header"""
+    token = get_bearer_token()
+    if not token:
+        return None
+    
+    claims = read_unverified_claims(token)
+    if not claims or not claims.get('is_demo'):
         return None
+    
+    return resolve_demo_user(token)
 
 
 def super_admin_required(fn):
@@ -120,30 +187,47 @@ def tenant_required(fn):
     """Require tenant user (not super admin) - also works for demo users"""
     @wraps(fn)
     def wrapper(*args, **kwargs):
-        # First check for demo user token
-        demo_user = get_demo_user_from_token()
-        if demo_user:
+        # Classify the token once: demo tokens are verified with SECRET_KEY,
+        # everything else goes straight to flask_jwt_extended
+        token = get_bearer_token()
+        claims = read_unverified_claims(token) if token else None
+        
+        if claims and claims.get('is_demo'):
+            demo_user = resolve_demo_user(token)
+            if not demo_user:
+                return jsonify({'error': 'Authentication failed'}), 401
+            
             g.demo_user = demo_user
             g.is_demo = True
+            g.principal = Principal(Principal.DEMO, demo_user)
             return fn(*args, **kwargs)
         
         # Regular tenant user flow
         try:
             verify_jwt_in_request()
-            user = get_current_user()
-            
+            user = None
+            if is_claims_mode():
+                # Authorize from token claims while they are still current
+                claims = get_jwt()
+                user = user_from_claims(get_jwt_identity(), claims)
+                if user:
+                    g.current_user = user
+                    g.authz_claims = claims
             if not user:
-                return jsonify({'error': 'User not found'}), 404
-            
-            if user.get('is_super_admin', False):
-                return jsonify({'error': 'Tenant user access required'}), 403
-            
-            if not user.get('tenant_id'):
-                return jsonify({'error': 'No tenant associated with user'}), 403
-            
-            g.is_demo = False
-            return fn(*args, **kwargs)
-        except Exception as e:
+                user = get_current_user()
+        except Exception:
             return jsonify({'error': 'Authentication failed'}), 401
+        
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        
+        if user.get('is_super_admin', False):
+            return jsonify({'error': 'Tenant user access required'}), 403
+        
+        if not user.get('tenant_id'):
+            return jsonify({'error': 'No tenant associated with user'}), 403
+        
+        g.is_demo = False
+        g.principal = Principal(Principal.USER, user)
+        return fn(*args, **kwargs)
     return wrapper
-
@@ -29,16 +29,20 @@ def module_required(module_name):
             if user.get('is_demo') or (hasattr(g, 'is_demo') and g.is_demo):
                 return f(*args, **kwargs)
             
-            # Get tenant
-            from app.models.tenant import Tenant
-            tenant = Tenant.find_by_id(user.get('tenant_id'))
-            
-            if not tenant:
-                return jsonify({'error': 'Tenant not found'}), 404
+            # Tenant modules come from the token claims when they are current
+            authz_claims = g.get('authz_claims')
+            if authz_claims:
+                enabled_modules = authz_claims.get('enabled_modules', [])
+            else:
+                from app.models.tenant import Tenant
+                tenant = Tenant.find_by_id(user.get('tenant_id'))
+                
+                if not tenant:
+                    return jsonify({'error': 'Tenant not found'}), 404
+                
+                enabled_modules = tenant.get('enabled_modules', [])
             
             # Check if module is enabled for tenant
-            enabled_modules = tenant.get('enabled_modules', [])
-            
             if module_name not in enabled_modules:
                 return jsonify({
                     'error': f'Module "{module_name}" is not enabled for your account',
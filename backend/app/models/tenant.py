@@ -5,6 +5,14 @@ from flask import current_app
 from bson import ObjectId
 from app.utils.helpers import generate_tenant_id, get_current_utc_time, serialize_doc
 from app.utils.constants import LICENSE_STATUS_TRIAL
+from app.utils.cache import get_cache
+from app.utils.authz_service import bump_authz_version
+
+
+# Tenants are read on every module-guarded request - cached by str(_id).
+# tenant_id strings never change, so they map to the _id in a separate cache.
+tenant_cache = get_cache('tenants')
+tenant_id_cache = get_cache('tenant_ids', ttl=3600)
 
 
 class Tenant:
@@ -53,20 +61,45 @@ class Tenant:
     
     @staticmethod
     def find_by_id(tenant_id):
-        """Find tenant by ID"""
+        """Find tenant by ID (cached)"""
+        cached = tenant_cache.get(str(tenant_id))
+        if cached:
+            return cached
+        
         db = current_app.db
         if isinstance(tenant_id, str) and len(tenant_id) == 24:
             try:
                 tenant_id = ObjectId(tenant_id)
             except:
                 pass
-        return db.tenants.find_one({'_id': tenant_id})
+        tenant = db.tenants.find_one({'_id': tenant_id})
+        tenant_cache.set(str(tenant_id), tenant)
+        return tenant
     
     @staticmethod
     def find_by_tenant_id(tenant_id):
-        """Find tenant by tenant_id string"""
+        """Find tenant by tenant_id string (cached)"""
+        object_id = tenant_id_cache.get(tenant_id)
+        if object_id:
+            return Tenant.find_by_id(object_id)
+        
         db = current_app.db
-        return db.tenants.find_one({'tenant_id': tenant_id})
+        tenant = db.tenants.find_one({'tenant_id': tenant_id})
+        if tenant:
+            tenant_id_cache.set(tenant_id, tenant['_id'])
+            tenant_cache.set(str(tenant['_id']), tenant)
+        return tenant
+    
+    @staticmethod
+    def invalidate_cache(tenant_id):
+        """Drop a cached tenant after writing it outside this model"""
+        tenant_cache.invalidate(str(tenant_id))
+    
+    @staticmethod
+    def invalidate_access(tenant_id):
+        """Drop the cached tenant and revoke token claims (modules/license changed)"""
+        Tenant.invalidate_cache(tenant_id)
+        bump_authz_version(tenant_id)
     
     @staticmethod
     def find_by_email(email):
@@ -93,6 +126,7 @@ class Tenant:
                 pass
         
         db.tenants.update_one({'_id': tenant_id}, {'$set': data})
+        Tenant.invalidate_access(tenant_id)
         return Tenant.find_by_id(tenant_id)
     
     @staticmethod
@@ -109,6 +143,7 @@ class Tenant:
             {'_id': tenant_id},
             {'$set': {'license': license_data}}
         )
+        Tenant.invalidate_access(tenant_id)
         return Tenant.find_by_id(tenant_id)
     
     @staticmethod
@@ -125,6 +160,7 @@ class Tenant:
             {'_id': tenant_id},
             {'$set': {'enabled_modules': modules}}
         )
+        Tenant.invalidate_access(tenant_id)
         return Tenant.find_by_id(tenant_id)
     
     @staticmethod
@@ -3,8 +3,14 @@ User Model
 """
 from flask import current_app
 from bson import ObjectId
-import bcrypt
 from app.utils.helpers import get_current_utc_time, serialize_doc
+from app.utils.cache import get_cache
+from app.utils.authz_service import bump_authz_version
+from app.utils.password_service import hash_password, hash_password_later, verify_password, needs_rehash, record_rehash
+
+
+# Users are read on every authenticated request - cache by str(_id)
+user_cache = get_cache('users')
 
 
 class User:
@@ -19,11 +25,7 @@ class User:
         
         # Hash password if provided
         if 'password' in data:
-            password_hash = bcrypt.hashpw(
-                data['password'].encode('utf-8'),
-                bcrypt.gensalt()
-            ).decode('utf-8')
-            data['password_hash'] = password_hash
+            data['password_hash'] = hash_password(data['password'])
             del data['password']
         
         # Set defaults
@@ -37,11 +39,28 @@ class User:
     
     @staticmethod
     def find_by_id(user_id):
-        """Find user by ID"""
+        """Find user by ID (cached)"""
+        cached = user_cache.get(str(user_id))
+        if cached:
+            return cached
+        
         db = current_app.db
         if isinstance(user_id, str):
             user_id = ObjectId(user_id)
-        return db.users.find_one({'_id': user_id})
+        user = db.users.find_one({'_id': user_id})
+        user_cache.set(str(user_id), user)
+        return user
+    
+    @staticmethod
+    def invalidate_cache(user_id):
+        """Drop a cached user after writing it outside this model"""
+        user_cache.invalidate(str(user_id))
+    
+    @staticmethod
+    def invalidate_access(user_id, tenant_id):
+        """Drop the cached user and revoke token claims (role/modules/status changed)"""
+        User.invalidate_cache(user_id)
+        bump_authz_version(tenant_id)
     
     @staticmethod
     def find_by_email(email):
@@ -60,10 +79,36 @@ class User:
         """Verify user password"""
         if not user or 'password_hash' not in user:
             return False
-        return bcrypt.checkpw(
-            password.encode('utf-8'),
-            user['password_hash'].encode('utf-8')
-        )
+        return verify_password(password, user['password_hash'])
+    
+    @staticmethod
+    def rehash_password_if_needed(user, password):
+        """
+        Re-hash a verified password when BCRYPT_ROUNDS has changed
+        The hash runs on the bcrypt pool after the response - the login does not wait for it
+        """
+        if not needs_rehash(user.get('password_hash')):
+            return
+        app = current_app._get_current_object()
+        
+        def store(password_hash):
+            try:
+                with app.app_context():
+                    # Only replace the hash that was verified (not a password changed meanwhile)
+                    app.db.users.update_one(
+                        {'_id': user['_id'], 'password_hash': user['password_hash']},
+                        {'$set': {'password_hash': password_hash}}
+                    )
+                    User.invalidate_cache(user['_id'])
+                record_rehash()
+            except Exception as e:
+                print(f"Password rehash skipped for user {user['_id']}: {str(e)}")
+        
+        try:
+            hash_password_later(password, store)
+        except Exception as e:
+            # Pool busy - keep the old hash, it still verifies; the next login retries
+            print(f"Password rehash skipped for user {user['_id']}: {str(e)}")
     
     @staticmethod
     def update(user_id, data):
@@ -74,15 +119,15 @@ class User:
         
         # Hash password if being updated
         if 'password' in data:
-            password_hash = bcrypt.hashpw(
-                data['password'].encode('utf-8'),
-                bcrypt.gensalt()
-            ).decode('utf-8')
-            data['password_hash'] = password_hash
+            data['password_hash'] = hash_password(data['password'])
             del data['password']
         
         db.users.update_one({'_id': user_id}, {'$set': data})
-        return User.find_by_id(user_id)
+        User.invalidate_cache(user_id)
+        user = User.find_by_id(user_id)
+        if user and user.get('tenant_id'):
+            bump_authz_version(user['tenant_id'])
+        return user
     
     @staticmethod
     def update_last_login(user_id):
@@ -94,6 +139,7 @@ class User:
             {'_id': user_id},
             {'$set': {'last_login': get_current_utc_time()}}
         )
+        User.invalidate_cache(user_id)
     
     @staticmethod
     def find_by_tenant(tenant_id, filters=None):
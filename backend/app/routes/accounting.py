@@ -1,10 +1,20 @@
 """
 Accounting Module Routes
 """
+import json
+import time
 from flask import Blueprint, request, jsonify, current_app
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 from app.middleware.auth import tenant_required, get_current_user
 from app.middleware.modules import module_required
-from app.utils.helpers import get_current_utc_time, serialize_doc, validate_required_fields, is_demo_request, get_collection_name
+from app.utils.helpers import get_current_utc_time, validate_required_fields, is_demo_request, get_collection_name
+from app.utils.projection import get_projection
+from app.utils.json_provider import stream_documents
+from app.utils.pagination import keyset_paginate, get_page_args, is_page_request, page_response
+from app.utils.ledger_service import invalidate_account_cache, get_account_map
+from app.utils.rollup_service import get_sales_totals
+from app.utils.aging_service import get_aging_args, age_summary, age_bucket_page
 from bson import ObjectId
 
 accounting_bp = Blueprint('accounting', __name__)
@@ -34,8 +44,10 @@ def get_journal_entries_collection():
 def get_accounts():
     """Get all accounts in Chart of Accounts"""
     try:
-        accounts = list(get_accounts_collection().find(get_tenant_filter()))
-        return jsonify(serialize_doc(accounts)), 200
+        accounts = list(get_accounts_collection().find(get_tenant_filter(), get_projection('accounts')))
+        return jsonify(accounts), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -65,8 +77,9 @@ def create_account():
         
         result = get_accounts_collection().insert_one(account)
         account['_id'] = result.inserted_id
+        invalidate_account_cache()
         
-        return jsonify(serialize_doc(account)), 201
+        return jsonify(account), 201
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -76,13 +89,117 @@ def create_account():
 @tenant_required
 @module_required('accounting')
 def get_journal_entries():
-    """Get journal entries"""
+    """Get journal entries (streamed; ?format=ndjson for one entry per line, ?limit=&cursor= for keyset pages)"""
     try:
-        entries = list(get_journal_entries_collection().find(get_tenant_filter()).sort('date', -1))
-        return jsonify(serialize_doc(entries)), 200
+        if is_page_request():
+            cursor, limit = get_page_args()
+            # created_at, not date: date is the client's string on manual entries and a datetime on posted ones
+            page = keyset_paginate(get_journal_entries_collection(), get_tenant_filter(), 'created_at', limit=limit, cursor=cursor,
+                                   projection=get_projection('journal_entries'))
+            return page_response(page), 200
+        
+        return stream_documents(get_journal_entries_collection().find(get_tenant_filter(), get_projection('journal_entries')).sort([('created_at', -1), ('_id', -1)]))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def get_tenant_account_ids(refresh=False):
+    """str(_id) of every account in the current tenant's chart of accounts"""
+    return {str(account['_id']) for account in get_account_map(get_tenant_filter(), refresh=refresh).values()}
+
+
+def check_line_accounts(lines, account_ids=None):
+    """
+    Error message for the first line whose account_id is not one of the tenant's accounts, or None
+
+    Args:
+        lines: Journal lines
+        account_ids: Result of get_tenant_account_ids(refresh=True) when checking many entries
+    """
+    for line in lines:
+        account_id = line.get('account_id')
+        if account_id is None:
+            continue
+        if not isinstance(account_id, str) or not ObjectId.is_valid(account_id):
+            return f'Invalid account_id: {account_id}'
+        if account_ids is None:
+            account_ids = get_tenant_account_ids()
+            if account_id not in account_ids:
+                # Created since the chart of accounts was cached?
+                account_ids = get_tenant_account_ids(refresh=True)
+        if account_id not in account_ids:
+            return f'Account not found: {account_id}'
+    return None
+
+
+def build_journal_entry(data, user, account_ids=None):
+    """
+    Validate a posted journal entry and build the document to insert
+
+    Args:
+        data: Posted entry
+        user: Current user
+        account_ids: Result of get_tenant_account_ids(refresh=True) when building many entries
+
+    Returns:
+        Tuple of (entry document, None) or (None, error message)
+    """
+    if not isinstance(data, dict) or not validate_required_fields(data, ['date', 'description', 'lines']):
+        return None, 'Missing required fields'
+        
+    lines = data['lines']
+    if not isinstance(lines, list) or len(lines) < 2:
+        return None, 'Journal entry must have at least 2 lines'
+    
+    try:
+        total_debit = sum(float(l.get('debit', 0)) for l in lines)
+        total_credit = sum(float(l.get('credit', 0)) for l in lines)
+    except (AttributeError, TypeError, ValueError):
+        return None, 'Line debits and credits must be numbers'
+        
+    # Verify double entry balance
+    if abs(total_debit - total_credit) > 0.01:
+        return None, f'Debits ({total_debit}) do not equal Credits ({total_credit})'
+    
+    error = check_line_accounts(lines, account_ids)
+    if error:
+        return None, error
+        
+    entry = {
+        **get_tenant_filter(),
+        'date': data['date'],
+        'description': data['description'],
+        'reference': data.get('reference', ''),
+        'lines': lines,
+        'total_amount': total_debit,
+        'status': 'posted',
+        'created_at': get_current_utc_time(),
+        'created_by': user['_id']
+    }
+    return entry, None
+
+
+def add_balance_changes(balance_changes, lines):
+    """Accumulate each line's debit - credit into {account_id: change}"""
+    for line in lines:
+        account_id = line.get('account_id')
+        if isinstance(account_id, str):
+            change = float(line.get('debit', 0)) - float(line.get('credit', 0))
+            balance_changes[account_id] = balance_changes.get(account_id, 0) + change
+
+
+def apply_balance_changes(balance_changes):
+    """Apply net balance changes to accounts in one round trip"""
+    operations = [
+        UpdateOne({'_id': ObjectId(account_id), **get_tenant_filter()}, {'$inc': {'balance': change}})
+        for account_id, change in balance_changes.items()
+        if change
+    ]
+    if operations:
+        get_accounts_collection().bulk_write(operations, ordered=False)
+
+
 @accounting_bp.route('/journal', methods=['POST'])
 @tenant_required
 @module_required('accounting')
@@ -90,51 +207,125 @@ def create_journal_entry():
     """Create a new journal entry"""
     try:
         user = get_current_user()
-        data = request.get_json()
-        
-        if not validate_required_fields(data, ['date', 'description', 'lines']):
-            return jsonify({'error': 'Missing required fields'}), 400
-            
-        lines = data['lines']
-        if not isinstance(lines, list) or len(lines) < 2:
-            return jsonify({'error': 'Journal entry must have at least 2 lines'}), 400
-            
-        # Verify double entry balance
-        total_debit = sum(float(l.get('debit', 0)) for l in lines)
-        total_credit = sum(float(l.get('credit', 0)) for l in lines)
-        
-        if abs(total_debit - total_credit) > 0.01:
-            return jsonify({'error': f'Debits ({total_debit}) do not equal Credits ({total_credit})'}), 400
-            
-        entry = {
-            **get_tenant_filter(),
-            'date': data['date'],
-            'description': data['description'],
-            'reference': data.get('reference', ''),
-            'lines': lines,
-            'total_amount': total_debit,
-            'status': 'posted',
-            'created_at': get_current_utc_time(),
-            'created_by': user['_id']
-        }
+        entry, error = build_journal_entry(request.get_json(), user)
+        if error:
+            return jsonify({'error': error}), 400
         
         result = get_journal_entries_collection().insert_one(entry)
         entry['_id'] = result.inserted_id
         
         # Update account balances
-        for line in lines:
-            account_id = line['account_id']
-            debit = float(line.get('debit', 0))
-            credit = float(line.get('credit', 0))
-            change = debit - credit
-            
-            if isinstance(account_id, str):
-                 get_accounts_collection().update_one(
-                     {'_id': ObjectId(account_id)},
-                     {'$inc': {'balance': change}} 
-                 )
+        balance_changes = {}
+        add_balance_changes(balance_changes, entry['lines'])
+        apply_balance_changes(balance_changes)
 
-        return jsonify(serialize_doc(entry)), 201
+        return jsonify(entry), 201
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+
+
+def read_batch_entries():
+    """
+    Read the entries of a batch request
+
+    Accepts a JSON array (or {"entries": [...]}) or an NDJSON body with one
+    entry per line. NDJSON lines that are not valid JSON are returned as
+    errors so they get a per-entry result instead of failing the batch.
+
+    Returns:
+        List of (entry data, parse error or None)
+    """
+    if request.mimetype in NDJSON_MIMETYPES:
+        items = []
+        for raw in request.stream:
+            raw = raw.strip()
+            if not raw:
+                continue
+            try:
+                items.append((json.loads(raw), None))
+            except ValueError as e:
+                items.append((None, f'Invalid JSON: {e}'))
+        return items
+    
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get('entries')
+    if not isinstance(data, list):
+        raise ValueError('Expected a JSON array of journal entries or an NDJSON body')
+    return [(item, None) for item in data]
+
+
+@accounting_bp.route('/journal/batch', methods=['POST'])
+@tenant_required
+@module_required('accounting')
+def create_journal_entries_batch():
+    """
+    Create many journal entries in one request (imports, end-of-day postings)
+    
+    Every entry is validated on its own; valid entries are inserted with
+    insert_many in chunks and their net balance changes applied per account
+    in a single bulk_write. Returns a result per entry, in input order.
+    """
+    try:
+        started = time.perf_counter()
+        user = get_current_user()
+        
+        try:
+            items = read_batch_entries()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        max_entries = current_app.config.get('JOURNAL_BATCH_MAX_ENTRIES', 5000)
+        if len(items) > max_entries:
+            return jsonify({'error': f'A batch may contain at most {max_entries} entries'}), 413
+        
+        results = []
+        valid = []  # (result index, entry document)
+        account_ids = get_tenant_account_ids(refresh=True)
+        for index, (data, error) in enumerate(items):
+            entry = None
+            if not error:
+                entry, error = build_journal_entry(data, user, account_ids)
+            if error:
+                results.append({'index': index, 'status': 'error', 'error': error})
+            else:
+                results.append({'index': index, 'status': 'created'})
+                valid.append((index, entry))
+        
+        journal_coll = get_journal_entries_collection()
+        chunk_size = current_app.config.get('JOURNAL_BATCH_CHUNK_SIZE', 1000)
+        balance_changes = {}
+        for start in range(0, len(valid), chunk_size):
+            chunk = valid[start:start + chunk_size]
+            failed = {}
+            try:
+                journal_coll.insert_many([entry for _, entry in chunk], ordered=False)
+            except BulkWriteError as e:
+                failed = {err['index']: err.get('errmsg', 'Insert failed') for err in e.details.get('writeErrors', [])}
+            
+            for position, (index, entry) in enumerate(chunk):
+                if position in failed:
+                    results[index] = {'index': index, 'status': 'error', 'error': failed[position]}
+                    continue
+                results[index]['id'] = str(entry['_id'])
+                add_balance_changes(balance_changes, entry['lines'])
+        
+        apply_balance_changes(balance_changes)
+        
+        created = sum(1 for r in results if r['status'] == 'created')
+        elapsed = time.perf_counter() - started
+        return jsonify({
+            'total': len(results),
+            'created': created,
+            'failed': len(results) - created,
+            'accounts_updated': len(balance_changes),
+            'elapsed_ms': round(elapsed * 1000, 1),
+            'entries_per_second': round(created / elapsed, 1) if elapsed > 0 else None,
+            'results': results
+        }), 201 if created else 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -148,12 +339,14 @@ def get_journal_entry(entry_id):
         entry = get_journal_entries_collection().find_one({
             '_id': ObjectId(entry_id),
             **get_tenant_filter()
-        })
+        }, get_projection('journal_entries'))
         
         if not entry:
             return jsonify({'error': 'Journal entry not found'}), 404
             
-        return jsonify(serialize_doc(entry)), 200
+        return jsonify(entry), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -188,6 +381,10 @@ def update_journal_entry(entry_id):
         if abs(total_debit - total_credit) > 0.01:
             return jsonify({'error': f'Debits ({total_debit}) do not equal Credits ({total_credit})'}), 400
         
+        error = check_line_accounts(lines)
+        if error:
+            return jsonify({'error': error}), 400
+        
         # Reverse old account balances
         for line in existing.get('lines', []):
             account_id = line.get('account_id')
@@ -196,7 +393,7 @@ def update_journal_entry(entry_id):
                 credit = float(line.get('credit', 0))
                 change = -(debit - credit)  # Reverse the change
                 get_accounts_collection().update_one(
-                    {'_id': ObjectId(account_id)},
+                    {'_id': ObjectId(account_id), **get_tenant_filter()},
                     {'$inc': {'balance': change}}
                 )
         
@@ -208,7 +405,7 @@ def update_journal_entry(entry_id):
                 credit = float(line.get('credit', 0))
                 change = debit - credit
                 get_accounts_collection().update_one(
-                    {'_id': ObjectId(account_id)},
+                    {'_id': ObjectId(account_id), **get_tenant_filter()},
                     {'$inc': {'balance': change}}
                 )
         
@@ -229,7 +426,7 @@ def update_journal_entry(entry_id):
         )
         
         updated_entry = get_journal_entries_collection().find_one({'_id': ObjectId(entry_id)})
-        return jsonify(serialize_doc(updated_entry)), 200
+        return jsonify(updated_entry), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -258,7 +455,7 @@ def delete_journal_entry(entry_id):
                 credit = float(line.get('credit', 0))
                 change = -(debit - credit)  # Reverse the change
                 get_accounts_collection().update_one(
-                    {'_id': ObjectId(account_id)},
+                    {'_id': ObjectId(account_id), **get_tenant_filter()},
                     {'$inc': {'balance': change}}
                 )
         
@@ -388,18 +585,10 @@ def get_profit_loss():
         total_expenses = sum(abs(a.get('balance', 0)) for a in expense_accounts)
         net_profit = total_revenue - total_expenses
         
-        # Get sales data for the period
-        sales_filter = {
-            **get_tenant_filter(),
-            'created_at': {'$gte': start_date, '$lte': end_date}
-        }
-        sales = list(get_sales_collection().find(sales_filter))
-        
-        gross_sales = sum(s.get('total_amount', 0) for s in sales)
-        total_cogs = sum(
-            sum(item.get('cost', 0) * item.get('quantity', 0) for item in s.get('items', []))
-            for s in sales
-        )
+        # Sales of the period (hourly rollups)
+        sales = get_sales_totals(start_date, end_date)
+        gross_sales = sales['total']
+        total_cogs = sales['cost_total']
         gross_profit = gross_sales - total_cogs
         
         return jsonify({
@@ -471,68 +660,73 @@ def get_balance_sheet():
         return jsonify({'error': str(e)}), 500
 
 
+def _aging_report(collection, report, parties_key):
+    """
+    Aging summary with the first page of each bucket's rows
+    ?buckets=30,60,90 sets the bucket edges in days, ?as_of= the date ages are
+    counted at, ?subtotals=true adds per-party totals, ?limit= the rows per
+    bucket and ?items=false leaves the rows out (summary only)
+    """
+    edges, as_of = get_aging_args()
+    _, limit = get_page_args()
+    with_items = request.args.get('items', 'true').lower() != 'false'
+    subtotals = request.args.get('subtotals', 'false').lower() == 'true'
+    
+    summary = age_summary(collection, get_tenant_filter(), report, edges, as_of, subtotals=subtotals)
+    
+    result = {'as_of': as_of, 'bucket_keys': list(summary['buckets'])}
+    for key, bucket in summary['buckets'].items():
+        result[key] = bucket
+        if with_items:
+            # Further rows: GET .../items?bucket=<key>&cursor=<next_cursor> with the same as_of and buckets
+            page = {'items': [], 'next_cursor': None}
+            if bucket['count']:
+                page = age_bucket_page(collection, get_tenant_filter(), report, key, edges, as_of, limit=limit)
+            bucket['items'] = page['items']
+            bucket['next_cursor'] = page['next_cursor']
+    result['grand_total'] = summary['grand_total']
+    result['count'] = summary['count']
+    if subtotals:
+        result[parties_key] = summary['parties']
+    return jsonify(result), 200
+
+
+def _aging_items(collection, report):
+    """One page of an aging bucket's rows (?bucket=, ?cursor=, ?limit=, ?as_of=, ?buckets=)"""
+    edges, as_of = get_aging_args()
+    cursor, limit = get_page_args()
+    bucket = request.args.get('bucket')
+    if not bucket:
+        raise ValueError('bucket is required')
+    
+    page = age_bucket_page(collection, get_tenant_filter(), report, bucket, edges, as_of, limit=limit, cursor=cursor)
+    return page_response(page, key='items', bucket=bucket, as_of=as_of, next_cursor=page['next_cursor'], has_more=page['has_more'])
+
+
 @accounting_bp.route('/reports/aged-receivables', methods=['GET'])
 @tenant_required
 @module_required('accounting')
 def get_aged_receivables():
     """Get Aged Receivables Report (Customer dues by age)"""
     try:
-        from datetime import datetime, timedelta
-        
-        today = datetime.utcnow()
-        
-        # Get unpaid credit sales
-        filter_query = {
-            **get_tenant_filter(),
-            'payment_type': 'credit',
-            'payment_status': {'$in': ['unpaid', 'partial']}
-        }
-        
-        credit_sales = list(get_sales_collection().find(filter_query))
+        return _aging_report(get_sales_collection(), 'receivables', 'customers')
         
-        # Age buckets
-        current = []      # 0-30 days
-        days_31_60 = []   # 31-60 days
-        days_61_90 = []   # 61-90 days
-        over_90 = []      # 90+ days
-        
-        for sale in credit_sales:
-            sale_date = sale.get('created_at', today)
-            if isinstance(sale_date, str):
-                sale_date = datetime.fromisoformat(sale_date.replace('Z', '+00:00'))
-            
-            days_old = (today - sale_date).days
-            amount_due = sale.get('amount_due', 0)
-            
-            entry = {
-                'receipt_number': sale.get('receipt_number'),
-                'customer_name': sale.get('customer_name', 'Unknown'),
-                'customer_id': str(sale.get('customer_id', '')),
-                'date': sale_date.isoformat(),
-                'total': sale.get('total_amount', 0),
-                'paid': sale.get('amount_paid', 0),
-                'due': amount_due,
-                'days_old': days_old,
-                'due_date': sale.get('due_date')
-            }
-            
-            if days_old <= 30:
-                current.append(entry)
-            elif days_old <= 60:
-                days_31_60.append(entry)
-            elif days_old <= 90:
-                days_61_90.append(entry)
-            else:
-                over_90.append(entry)
-        
-        return jsonify({
-            'current': {'items': current, 'total': round(sum(e['due'] for e in current), 2)},
-            'days_31_60': {'items': days_31_60, 'total': round(sum(e['due'] for e in days_31_60), 2)},
-            'days_61_90': {'items': days_61_90, 'total': round(sum(e['due'] for e in days_61_90), 2)},
-            'over_90': {'items': over_90, 'total': round(sum(e['due'] for e in over_90), 2)},
-            'grand_total': round(sum(e['due'] for e in current + days_31_60 + days_61_90 + over_90), 2)
-        }), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@accounting_bp.route('/reports/aged-receivables/items', methods=['GET'])
+@tenant_required
+@module_required('accounting')
+def get_aged_receivables_items():
+    """Get one page of an aged receivables bucket"""
+    try:
+        return _aging_items(get_sales_collection(), 'receivables')
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -543,61 +737,24 @@ def get_aged_receivables():
 def get_aged_payables():
     """Get Aged Payables Report (Vendor dues by age)"""
     try:
-        from datetime import datetime, timedelta
+        return _aging_report(get_purchase_orders_collection(), 'payables', 'suppliers')
         
-        today = datetime.utcnow()
-        
-        # Get unpaid purchase orders
-        filter_query = {
-            **get_tenant_filter(),
-            'payment_status': {'$in': ['unpaid', 'partial']}
-        }
-        
-        payables = list(get_purchase_orders_collection().find(filter_query))
-        
-        # Age buckets
-        current = []      # 0-30 days
-        days_31_60 = []   # 31-60 days
-        days_61_90 = []   # 61-90 days
-        over_90 = []      # 90+ days
-        
-        for po in payables:
-            po_date = po.get('created_at', today)
-            if isinstance(po_date, str):
-                po_date = datetime.fromisoformat(po_date.replace('Z', '+00:00'))
-            
-            days_old = (today - po_date).days
-            amount_due = po.get('amount_due', po.get('total', 0))
-            
-            entry = {
-                'po_number': po.get('po_number'),
-                'supplier_name': po.get('supplier_name', 'Unknown'),
-                'supplier_id': str(po.get('supplier_id', '')),
-                'date': po_date.isoformat(),
-                'total': po.get('total', 0),
-                'paid': po.get('amount_paid', 0),
-                'due': amount_due,
-                'days_old': days_old,
-                'due_date': po.get('due_date')
-            }
-            
-            if days_old <= 30:
-                current.append(entry)
-            elif days_old <= 60:
-                days_31_60.append(entry)
-            elif days_old <= 90:
-                days_61_90.append(entry)
-            else:
-                over_90.append(entry)
-        
-        return jsonify({
-            'current': {'items': current, 'total': round(sum(e['due'] for e in current), 2)},
-            'days_31_60': {'items': days_31_60, 'total': round(sum(e['due'] for e in days_31_60), 2)},
-            'days_61_90': {'items': days_61_90, 'total': round(sum(e['due'] for e in days_61_90), 2)},
-            'over_90': {'items': over_90, 'total': round(sum(e['due'] for e in over_90), 2)},
-            'grand_total': round(sum(e['due'] for e in current + days_31_60 + days_61_90 + over_90), 2)
-        }), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@accounting_bp.route('/reports/aged-payables/items', methods=['GET'])
+@tenant_required
+@module_required('accounting')
+def get_aged_payables_items():
+    """Get one page of an aged payables bucket"""
+    try:
+        return _aging_items(get_purchase_orders_collection(), 'payables')
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -620,20 +777,12 @@ def get_financial_summary():
         cash_accounts = [a for a in accounts if 'cash' in a.get('name', '').lower() or 'bank' in a.get('name', '').lower()]
         total_cash = sum(a.get('balance', 0) for a in cash_accounts)
         
-        # Receivables
-        ar_filter = {**get_tenant_filter(), 'payment_type': 'credit', 'payment_status': {'$in': ['unpaid', 'partial']}}
-        receivables = list(get_sales_collection().find(ar_filter))
-        total_receivables = sum(s.get('amount_due', 0) for s in receivables)
-        
-        # Payables
-        ap_filter = {**get_tenant_filter(), 'payment_status': {'$in': ['unpaid', 'partial']}}
-        payables = list(get_purchase_orders_collection().find(ap_filter))
-        total_payables = sum(p.get('amount_due', p.get('total', 0)) for p in payables)
+        # Receivables & Payables (aging totals, summed by the database)
+        total_receivables = age_summary(get_sales_collection(), get_tenant_filter(), 'receivables')['grand_total']
+        total_payables = age_summary(get_purchase_orders_collection(), get_tenant_filter(), 'payables')['grand_total']
         
-        # Month sales
-        sales_filter = {**get_tenant_filter(), 'created_at': {'$gte': month_start}}
-        month_sales = list(get_sales_collection().find(sales_filter))
-        total_month_sales = sum(s.get('total_amount', 0) for s in month_sales)
+        # Month sales (hourly rollups)
+        total_month_sales = get_sales_totals(month_start)['total']
         
         # Revenue & Expenses (case-insensitive)
         total_revenue = sum(abs(a.get('balance', 0)) for a in accounts if a.get('type', '').lower() == 'revenue')
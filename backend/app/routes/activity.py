@@ -5,13 +5,15 @@ from flask import Blueprint, request, jsonify
 from bson import ObjectId
 from datetime import datetime, timedelta
 from app.middleware.auth import tenant_required, get_current_user
-from app.utils.helpers import serialize_doc, get_current_utc_time
+from app.utils.helpers import get_current_utc_time
+from app.utils.pagination import get_page_args, page_response
 from app.utils.activity_service import (
     get_activity_logs,
+    get_activity_log_page,
+    count_activity_logs,
+    get_activity_counts,
     get_activity_summary,
-    ACTIVITY_TYPES,
-    get_tenant_filter,
-    get_activity_logs_collection
+    ACTIVITY_TYPES
 )
 
 activity_bp = Blueprint('activity', __name__)
@@ -20,12 +22,14 @@ activity_bp = Blueprint('activity', __name__)
 @activity_bp.route('/', methods=['GET'])
 @tenant_required
 def list_activity_logs():
-    """Get paginated activity logs with filtering"""
+    """
+    Get paginated activity logs with filtering
+    Keyset pages (?limit=&cursor=) by default; ?page= keeps the numbered pages
+    """
     try:
         # Pagination
-        page = int(request.args.get('page', 1))
+        page = request.args.get('page', type=int)
         limit = min(int(request.args.get('limit', 50)), 100)
-        skip = (page - 1) * limit
         
         # Filters
         activity_type = request.args.get('type')
@@ -43,6 +47,35 @@ def list_activity_logs():
         if request.args.get('end_date'):
             end_date = datetime.fromisoformat(request.args.get('end_date').replace('Z', '+00:00'))
         
+        if not page:
+            cursor, limit = get_page_args(max_limit=100)
+            log_page = get_activity_log_page(
+                activity_type=activity_type,
+                entity_type=entity_type,
+                entity_id=entity_id,
+                user_id=user_id,
+                start_date=start_date,
+                end_date=end_date,
+                limit=limit,
+                cursor=cursor
+            )
+            pagination = {
+                'limit': limit,
+                'next_cursor': log_page['next_cursor'],
+                'has_more': log_page['has_more']
+            }
+            # The total costs a full count - only on the first page
+            if not cursor:
+                pagination['total'] = count_activity_logs(
+                    activity_type=activity_type,
+                    entity_type=entity_type,
+                    entity_id=entity_id,
+                    user_id=user_id,
+                    start_date=start_date,
+                    end_date=end_date
+                )
+            return page_response(log_page, key='logs', pagination=pagination), 200
+        
         logs = get_activity_logs(
             activity_type=activity_type,
             entity_type=entity_type,
@@ -51,20 +84,21 @@ def list_activity_logs():
             start_date=start_date,
             end_date=end_date,
             limit=limit,
-            skip=skip
+            skip=(page - 1) * limit
         )
         
-        # Get total count for pagination
-        filter_query = get_tenant_filter()
-        if activity_type:
-            filter_query['activity_type'] = activity_type
-        if entity_type:
-            filter_query['entity_type'] = entity_type
-        
-        total = get_activity_logs_collection().count_documents(filter_query)
+        # Get total count for pagination (same filters, including archived ranges)
+        total = count_activity_logs(
+            activity_type=activity_type,
+            entity_type=entity_type,
+            entity_id=entity_id,
+            user_id=user_id,
+            start_date=start_date,
+            end_date=end_date
+        )
         
         return jsonify({
-            'logs': [serialize_doc(log) for log in logs],
+            'logs': logs,
             'pagination': {
                 'page': page,
                 'limit': limit,
@@ -73,6 +107,8 @@ def list_activity_logs():
             }
         }), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -85,9 +121,6 @@ def activity_summary():
         days = int(request.args.get('days', 7))
         summary = get_activity_summary(days=days)
         
-        # Serialize recent logs
-        summary['recent'] = [serialize_doc(log) for log in summary.get('recent', [])]
-        
         return jsonify(summary), 200
         
     except Exception as e:
@@ -117,7 +150,7 @@ def entity_history(entity_type, entity_id):
         return jsonify({
             'entity_type': entity_type,
             'entity_id': entity_id,
-            'history': [serialize_doc(log) for log in logs]
+            'history': logs
         }), 200
         
     except Exception as e:
@@ -141,7 +174,7 @@ def user_activity(user_id):
         
         return jsonify({
             'user_id': user_id,
-            'logs': [serialize_doc(log) for log in logs]
+            'logs': logs
         }), 200
         
     except Exception as e:
@@ -156,25 +189,19 @@ def today_activity():
         now = get_current_utc_time()
         start_of_day = now.replace(hour=0, minute=0, second=0, microsecond=0)
         
+        # Counts from the daily counters; only the latest entries are loaded
+        by_type = get_activity_counts(start_of_day)
         logs = get_activity_logs(
             start_date=start_of_day,
             end_date=now,
-            limit=100
+            limit=20
         )
         
-        # Group by type
-        by_type = {}
-        for log in logs:
-            t = log.get('activity_type', 'OTHER')
-            if t not in by_type:
-                by_type[t] = []
-            by_type[t].append(serialize_doc(log))
-        
         return jsonify({
             'date': start_of_day.isoformat(),
-            'total': len(logs),
+            'total': sum(by_type.values()),
             'by_type': by_type,
-            'logs': [serialize_doc(log) for log in logs[:20]]  # Last 20
+            'logs': logs  # Last 20
         }), 200
         
     except Exception as e:
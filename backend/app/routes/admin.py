@@ -5,7 +5,10 @@ from flask import Blueprint, request, jsonify
 from app.middleware.auth import super_admin_required
 from app.models.tenant import Tenant
 from app.models.user import User
-from app.utils.helpers import serialize_doc, paginate
+from bson import ObjectId
+from app.utils.helpers import paginate
+from app.utils.projection import get_projection
+from app.utils.pagination import keyset_paginate, get_page_args, page_response
 from flask import current_app
 
 admin_bp = Blueprint('admin', __name__)
@@ -44,17 +47,46 @@ def dashboard():
         return jsonify({'error': str(e)}), 500
 
 
+@admin_bp.route('/metrics', methods=['GET'])
+@super_admin_required
+def metrics():
+    """Get in-process performance metrics for this worker"""
+    try:
+        from app.utils.stock_service import get_reservation_stats
+        from app.utils.cache import get_cache_stats
+        from app.utils.password_service import get_password_stats
+        from app.utils.product_index import get_product_index_stats
+        from app.utils.outbox_service import get_outbox_stats
+        from app.utils.activity_service import get_activity_writer_stats
+        
+        return jsonify({
+            'stock_reservations': get_reservation_stats(),
+            'caches': get_cache_stats(),
+            'password_hashing': get_password_stats(),
+            'product_index': get_product_index_stats(),
+            'outbox': get_outbox_stats(),
+            'activity_log': get_activity_writer_stats()
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @admin_bp.route('/tenants', methods=['GET'])
 @super_admin_required
 def get_tenants():
-    """Get all tenants"""
+    """
+    Get all tenants, newest first
+    Keyset pages (?per_page=&cursor=) by default; ?page= keeps the numbered pages
+    """
     try:
-        page = int(request.args.get('page', 1))
+        page = request.args.get('page', type=int)
         per_page = int(request.args.get('per_page', 20))
         search = request.args.get('search', '')
         
         db = current_app.db
         query = {}
+        projection = get_projection('tenants')
         
         # Search filter
         if search:
@@ -64,15 +96,23 @@ def get_tenants():
                 {'tenant_id': {'$regex': search, '$options': 'i'}}
             ]
         
-        # Get tenants with pagination
-        tenants_cursor = db.tenants.find(query).sort('created_at', -1)
-        result = paginate(tenants_cursor, page, per_page)
+        if not page:
+            cursor, limit = get_page_args(default_limit=per_page)
+            tenant_page = keyset_paginate(db.tenants, query, 'created_at', limit=limit, cursor=cursor, projection=projection)
+            extra = {'per_page': limit, 'next_cursor': tenant_page['next_cursor'], 'has_more': tenant_page['has_more']}
+            # The total costs a full count - only on the first page
+            if not cursor:
+                extra['total'] = db.tenants.count_documents(query)
+            return page_response(tenant_page, key='items', **extra), 200
         
-        # Serialize
-        result['items'] = [serialize_doc(t) for t in result['items']]
+        # Numbered pages
+        tenants_cursor = db.tenants.find(query, projection).sort([('created_at', -1), ('_id', -1)])
+        result = paginate(tenants_cursor, page, per_page, total=db.tenants.count_documents(query))
         
         return jsonify(result), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -82,13 +122,19 @@ def get_tenants():
 def get_tenant(tenant_id):
     """Get tenant details"""
     try:
-        tenant = Tenant.find_by_id(tenant_id)
+        projection = get_projection('tenants')
+        if projection:
+            tenant = current_app.db.tenants.find_one({'_id': ObjectId(tenant_id)}, projection)
+        else:
+            tenant = Tenant.find_by_id(tenant_id)
         
         if not tenant:
             return jsonify({'error': 'Tenant not found'}), 404
         
-        return jsonify(serialize_doc(tenant)), 200
+        return jsonify(tenant), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -116,7 +162,7 @@ def create_tenant():
         
         return jsonify({
             'message': 'Tenant created successfully',
-            'tenant': serialize_doc(tenant)
+            'tenant': tenant
         }), 201
         
     except Exception as e:
@@ -139,7 +185,7 @@ def update_tenant(tenant_id):
         
         return jsonify({
             'message': 'Tenant updated successfully',
-            'tenant': serialize_doc(updated_tenant)
+            'tenant': updated_tenant
         }), 200
         
     except Exception as e:
@@ -163,7 +209,7 @@ def update_license(tenant_id):
         
         return jsonify({
             'message': 'License updated successfully',
-            'tenant': serialize_doc(updated_tenant)
+            'tenant': updated_tenant
         }), 200
         
     except Exception as e:
@@ -187,7 +233,7 @@ def update_modules(tenant_id):
         
         return jsonify({
             'message': 'Modules updated successfully',
-            'tenant': serialize_doc(updated_tenant)
+            'tenant': updated_tenant
         }), 200
         
     except Exception as e:
@@ -203,7 +249,7 @@ def get_packages():
         packages = list(db.packages.find().sort('price', 1))
         
         return jsonify({
-            'packages': [serialize_doc(p) for p in packages]
+            'packages': packages
         }), 200
         
     except Exception as e:
@@ -229,7 +275,7 @@ def create_package():
         
         return jsonify({
             'message': 'Package created successfully',
-            'package': serialize_doc(package)
+            'package': package
         }), 201
         
     except Exception as e:
@@ -260,7 +306,7 @@ def update_package(package_id):
         
         return jsonify({
             'message': 'Package updated successfully',
-            'package': serialize_doc(updated_package)
+            'package': updated_package
         }), 200
         
     except Exception as e:
@@ -300,12 +346,14 @@ def get_bookings():
     """Get all bookings"""
     try:
         db = current_app.db
-        bookings = list(db.bookings.find().sort('created_at', -1))
+        bookings = list(db.bookings.find({}, get_projection('bookings')).sort('created_at', -1))
         
         return jsonify({
-            'bookings': [serialize_doc(b) for b in bookings]
+            'bookings': bookings
         }), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -413,7 +461,7 @@ def approve_booking(booking_id):
         
         return jsonify({
             'message': 'Booking approved and tenant created successfully',
-            'tenant': serialize_doc(tenant),
+            'tenant': tenant,
             'user': {
                 'username': username,
                 'email': user['email'],
@@ -487,10 +535,12 @@ def update_booking_status(booking_id):
             # Delete the user that was created
             if booking.get('user_id'):
                 db.users.delete_one({'_id': booking['user_id']})
+                User.invalidate_access(booking['user_id'], booking.get('tenant_id'))
             
             # Delete the tenant that was created
             if booking.get('tenant_id'):
                 db.tenants.delete_one({'_id': booking['tenant_id']})
+                Tenant.invalidate_access(booking['tenant_id'])
         
         # Update booking status and clear tenant/user references if reverting
         update_data = {
@@ -4,7 +4,8 @@ Assets Module Routes
 from flask import Blueprint, request, jsonify, current_app
 from app.middleware.auth import tenant_required, get_current_user
 from app.middleware.modules import module_required
-from app.utils.helpers import get_current_utc_time, serialize_doc, validate_required_fields, is_demo_request, get_collection_name
+from app.utils.helpers import get_current_utc_time, validate_required_fields, is_demo_request, get_collection_name
+from app.utils.projection import get_projection
 from bson import ObjectId
 
 assets_bp = Blueprint('assets', __name__)
@@ -28,8 +29,10 @@ def get_assets_collection():
 def get_assets():
     """Get all assets"""
     try:
-        assets = list(get_assets_collection().find(get_tenant_filter()))
-        return jsonify(serialize_doc(assets)), 200
+        assets = list(get_assets_collection().find(get_tenant_filter(), get_projection('assets')))
+        return jsonify(assets), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -63,7 +66,7 @@ def create_asset():
         result = get_assets_collection().insert_one(asset)
         asset['_id'] = result.inserted_id
         
-        return jsonify(serialize_doc(asset)), 201
+        return jsonify(asset), 201
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -8,6 +8,8 @@ from app.models.tenant import Tenant
 from app.utils.helpers import is_valid_email
 from app.middleware.auth import get_current_user
 from app.utils.activity_service import log_activity
+from app.utils.authz_service import build_authz_claims
+from app.utils.password_service import PasswordServiceBusy
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -60,11 +62,17 @@ def login():
                 if not tenant or not tenant.get('is_active', True):  # Default to True if not set
                     return jsonify({'error': 'Account is suspended'}), 403
         
+        # Upgrade the hash if the cost factor changed since it was made (off the request)
+        User.rehash_password_if_needed(user, password)
+        
         # Update last login
         User.update_last_login(user['_id'])
         
         # Create tokens
-        access_token = create_access_token(identity=str(user['_id']))
+        access_token = create_access_token(
+            identity=str(user['_id']),
+            additional_claims=build_authz_claims(user['_id'])
+        )
         refresh_token = create_refresh_token(identity=str(user['_id']))
         
         # Return user info and tokens
@@ -86,6 +94,8 @@ def login():
             'refresh_token': refresh_token
         }), 200
         
+    except PasswordServiceBusy as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -96,7 +106,10 @@ def refresh():
     """Refresh access token"""
     try:
         user_id = get_jwt_identity()
-        access_token = create_access_token(identity=user_id)
+        access_token = create_access_token(
+            identity=user_id,
+            additional_claims=build_authz_claims(user_id)
+        )
         
         return jsonify({
             'access_token': access_token
@@ -4,12 +4,21 @@ Customer/Tenant Routes
 from flask import Blueprint, request, jsonify, g
 from app.middleware.auth import tenant_required, get_current_user
 from flask import current_app
-from app.utils.helpers import serialize_doc, get_current_utc_time, is_demo_request, get_collection_name
+from app.utils.helpers import get_current_utc_time, is_demo_request, get_collection_name
+from app.utils.projection import get_projection
+from app.utils.cache import get_cache
 from app.models.tenant import Tenant
+from app.utils.stock_service import aggregate_quantities, reserve_stock, restock, InsufficientStockError, StockReservationError
+from app.utils import product_events
+from app.utils.rollup_service import get_sales_rollups_collection, get_sales_totals, find_sales_rollups, sum_sales_rollups
 from bson import ObjectId
+from datetime import timedelta
 
 customer_bp = Blueprint('customer', __name__)
 
+# (sales collection, owner field, owner) -> /stats response
+dashboard_cache = get_cache('dashboard_stats', ttl=30)
+
 
 def get_tenant_filter():
     """Get the filter for tenant/demo data isolation"""
@@ -37,7 +46,6 @@ def get_dashboard():
     """Get customer dashboard statistics"""
     try:
         products_coll = get_products_collection()
-        sales_coll = get_sales_collection()
         
         # Get statistics
         total_products = products_coll.count_documents(get_tenant_filter())
@@ -45,18 +53,9 @@ def get_dashboard():
         low_stock_filter['stock'] = {'$lt': 10}
         low_stock = products_coll.count_documents(low_stock_filter)
         
-        # Today's sales
-        from datetime import datetime, timezone
-        today_start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
-        sales_filter = get_tenant_filter()
-        sales_filter['created_at'] = {'$gte': today_start}
-        
-        today_pipeline = [
-            {'$match': sales_filter},
-            {'$group': {'_id': None, 'total': {'$sum': '$total_amount'}}}
-        ]
-        today_sales_amount = list(sales_coll.aggregate(today_pipeline))
-        today_sales_total = today_sales_amount[0]['total'] if today_sales_amount else 0
+        # Today's sales (hourly rollups)
+        today_start = get_current_utc_time().replace(hour=0, minute=0, second=0, microsecond=0)
+        today_sales_total = get_sales_totals(today_start)['total']
         
         return jsonify({
             'today_sales': today_sales_total,
@@ -84,12 +83,14 @@ def get_products():
                 {'barcode': {'$regex': search, '$options': 'i'}}
             ]
         
-        products = list(get_products_collection().find(query).sort('name', 1))
+        products = list(get_products_collection().find(query, get_projection('products')).sort('name', 1))
         
         return jsonify({
-            'products': [serialize_doc(p) for p in products]
+            'products': products
         }), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -124,10 +125,11 @@ def create_product():
         
         result = get_products_collection().insert_one(product)
         product['_id'] = result.inserted_id
+        product_events.product_saved(get_products_collection(), get_tenant_filter(), product)
         
         return jsonify({
             'message': 'Product created successfully',
-            'product': serialize_doc(product)
+            'product': product
         }), 201
         
     except Exception as e:
@@ -168,12 +170,13 @@ def update_product(product_id):
             {'_id': ObjectId(product_id)},
             {'$set': update_data}
         )
+        product_events.product_updated(db.products, {'tenant_id': tenant_id}, product_id, update_data)
         
         updated_product = db.products.find_one({'_id': ObjectId(product_id)})
         
         return jsonify({
             'message': 'Product updated successfully',
-            'product': serialize_doc(updated_product)
+            'product': updated_product
         }), 200
         
     except Exception as e:
@@ -197,6 +200,8 @@ def delete_product(product_id):
         if result.deleted_count == 0:
             return jsonify({'error': 'Product not found'}), 404
         
+        product_events.product_deleted(db.products, {'tenant_id': tenant_id}, product_id)
+        
         return jsonify({'message': 'Product deleted successfully'}), 200
         
     except Exception as e:
@@ -231,19 +236,25 @@ def create_transaction():
             'created_at': get_current_utc_time()
         }
         
-        result = db.transactions.insert_one(transaction)
+        # Reserve stock - all lines or none
+        quantities = aggregate_quantities(items, id_key='product_id')
+        try:
+            reserve_stock(db.products, {'tenant_id': tenant_id}, quantities)
+        except InsufficientStockError as stock_error:
+            return jsonify({'error': str(stock_error)}), 400
+        except StockReservationError as stock_error:
+            return jsonify({'error': str(stock_error)}), 409
+        
+        try:
+            result = db.transactions.insert_one(transaction)
+        except Exception:
+            restock(db.products, {'tenant_id': tenant_id}, quantities)
+            raise
         transaction['_id'] = result.inserted_id
         
-        # Update stock
-        for item in items:
-            db.products.update_one(
-                {'_id': ObjectId(item['product_id']), 'tenant_id': tenant_id},
-                {'$inc': {'stock': -item['quantity']}}
-            )
-        
         return jsonify({
             'message': 'Transaction completed successfully',
-            'transaction': serialize_doc(transaction)
+            'transaction': transaction
         }), 201
         
     except Exception as e:
@@ -286,130 +297,130 @@ def get_subscription():
         if not tenant:
             return jsonify({'error': 'Tenant not found'}), 404
         
-        tenant_data = serialize_doc(tenant)
-        
         # Get enabled modules from tenant's package
-        enabled_modules = tenant_data.get('enabled_modules', [])
+        enabled_modules = tenant.get('enabled_modules', [])
         
         return jsonify({
-            'package': tenant_data.get('license', {}).get('package_name', 'N/A'),
-            'status': tenant_data.get('license', {}).get('status', 'N/A'),
-            'start_date': tenant_data.get('license', {}).get('start_date'),
-            'expiry_date': tenant_data.get('license', {}).get('expiry_date'),
+            'package': tenant.get('license', {}).get('package_name', 'N/A'),
+            'status': tenant.get('license', {}).get('status', 'N/A'),
+            'start_date': tenant.get('license', {}).get('start_date'),
+            'expiry_date': tenant.get('license', {}).get('expiry_date'),
             'enabled_modules': enabled_modules,
-            'limits': tenant_data.get('limits', {}),
-            'company_name': tenant_data.get('company_name'),
-            'email': tenant_data.get('email')
+            'limits': tenant.get('limits', {}),
+            'company_name': tenant.get('company_name'),
+            'email': tenant.get('email')
         }), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+def _sales_stats(sales_coll, base_filter, start_of_day):
+    """
+    Sales figures of the dashboard from the hourly rollups: the 30-day window
+    is one rollup read that is split into the today/week/month totals and the
+    7-day chart; only the recent sales come from the sales themselves
+    """
+    start_of_week = start_of_day - timedelta(days=7)
+    start_of_month = start_of_day - timedelta(days=30)
+    chart_start = start_of_day - timedelta(days=6)
+    
+    rollups = find_sales_rollups(get_sales_rollups_collection(), base_filter, start_of_month)
+    
+    # Rollup days come back naive (UTC)
+    def since(start):
+        start = start.replace(tzinfo=None)
+        return [rollup for rollup in rollups if rollup['day'] >= start]
+    
+    today = sum_sales_rollups(since(start_of_day))
+    week = sum_sales_rollups(since(start_of_week))
+    month = sum_sales_rollups(rollups)
+    
+    by_day = {}
+    for rollup in since(chart_start):
+        day = rollup['day'].strftime('%Y-%m-%d')
+        by_day[day] = by_day.get(day, 0) + rollup.get('total', 0)
+    daily_sales = []
+    for offset in range(6, -1, -1):
+        day_start = start_of_day - timedelta(days=offset)
+        daily_sales.append({
+            'date': day_start.strftime('%a'),
+            'amount': round(by_day.get(day_start.strftime('%Y-%m-%d'), 0), 2)
+        })
+    
+    recent_sales = list(sales_coll.find(base_filter).sort([('created_at', -1), ('_id', -1)]).limit(5))
+    
+    return {
+        'todaySales': today['total'],
+        'todayTransactions': today['count'],
+        'weekSales': week['total'],
+        'weekTransactions': week['count'],
+        'monthSales': month['total'],
+        'recentSales': recent_sales,
+        'dailySales': daily_sales
+    }
+
+
+def _product_stats(products_coll, base_filter):
+    """Product, low stock (stock <= min_stock or < 10) and out of stock counts in one pass"""
+    has_stock = {'$gt': ['$stock', None]}
+    pipeline = [
+        {'$match': base_filter},
+        {'$group': {
+            '_id': None,
+            'total': {'$sum': 1},
+            'low_stock': {'$sum': {'$cond': [
+                {'$or': [
+                    {'$lte': ['$stock', {'$ifNull': ['$min_stock', 10]}]},
+                    {'$and': [has_stock, {'$lt': ['$stock', 10]}]}
+                ]}, 1, 0
+            ]}},
+            'out_of_stock': {'$sum': {'$cond': [{'$and': [has_stock, {'$lte': ['$stock', 0]}]}, 1, 0]}}
+        }}
+    ]
+    result = next(products_coll.aggregate(pipeline), None) or {}
+    return {
+        'totalProducts': result.get('total', 0),
+        'lowStock': result.get('low_stock', 0),
+        'outOfStock': result.get('out_of_stock', 0)
+    }
+
+
 @customer_bp.route('/stats', methods=['GET'])
 @tenant_required
 def get_dashboard_stats():
-    """Get dashboard statistics"""
+    """
+    Get dashboard statistics
+    Served from a short-TTL per-tenant cache (DASHBOARD_CACHE_TTL seconds)
+    """
     try:
-        from datetime import timedelta
-        
         # Get the appropriate collections using helper functions
         # These handle both regular tenants and demo users
         products_coll = get_products_collection()
         sales_coll = get_sales_collection()
         customers_coll = get_customers_collection()
+        invoices_coll = current_app.db[get_collection_name('invoices')]
         
         # Get base filter for tenant/demo isolation
         base_filter = get_tenant_filter()
         
-        # Calculate time ranges
-        now = get_current_utc_time()
-        start_of_day = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        start_of_week = start_of_day - timedelta(days=7)
-        start_of_month = start_of_day - timedelta(days=30)
-        
-        # 1. Today's Sales
-        today_pipeline = [
-            {'$match': {**base_filter, 'created_at': {'$gte': start_of_day}}},
-            {'$group': {'_id': None, 'total': {'$sum': '$total_amount'}, 'count': {'$sum': 1}}}
-        ]
-        pos_today = list(sales_coll.aggregate(today_pipeline))
-        today_sales = pos_today[0]['total'] if pos_today else 0
-        today_transactions = pos_today[0]['count'] if pos_today else 0
-        
-        # 2. This Week's Sales
-        week_pipeline = [
-            {'$match': {**base_filter, 'created_at': {'$gte': start_of_week}}},
-            {'$group': {'_id': None, 'total': {'$sum': '$total_amount'}, 'count': {'$sum': 1}}}
-        ]
-        pos_week = list(sales_coll.aggregate(week_pipeline))
-        week_sales = pos_week[0]['total'] if pos_week else 0
-        week_transactions = pos_week[0]['count'] if pos_week else 0
-        
-        # 3. This Month's Sales
-        month_pipeline = [
-            {'$match': {**base_filter, 'created_at': {'$gte': start_of_month}}},
-            {'$group': {'_id': None, 'total': {'$sum': '$total_amount'}}}
-        ]
-        pos_month = list(sales_coll.aggregate(month_pipeline))
-        month_sales = pos_month[0]['total'] if pos_month else 0
-        
-        # 4. Total Products
-        total_products = products_coll.count_documents(base_filter)
-        
-        # 5. Low Stock (stock <= min_stock or < 10)
-        low_stock_filter = {**base_filter, '$or': [
-            {'$expr': {'$lte': ['$stock', {'$ifNull': ['$min_stock', 10]}]}},
-            {'stock': {'$lt': 10}}
-        ]}
-        low_stock = products_coll.count_documents(low_stock_filter)
+        owner_field, owner = next(iter(base_filter.items()))
+        cache_key = (sales_coll.name, owner_field, str(owner))
+        stats = dashboard_cache.get(cache_key)
+        if stats is not None:
+            return jsonify(stats), 200
         
-        # 6. Out of Stock
-        out_of_stock_filter = {**base_filter, 'stock': {'$lte': 0}}
-        out_of_stock = products_coll.count_documents(out_of_stock_filter)
+        start_of_day = get_current_utc_time().replace(hour=0, minute=0, second=0, microsecond=0)
         
-        # 7. Pending Invoices - use db directly with appropriate collection
-        db = current_app.db
-        invoices_coll = db[get_collection_name('invoices')]
-        pending_filter = {**base_filter, 'status': 'pending'}
-        pending_orders = invoices_coll.count_documents(pending_filter)
-        
-        # 8. Recent Sales (last 5)
-        recent_sales = list(sales_coll.find(base_filter).sort('created_at', -1).limit(5))
-        
-        # 9. Daily sales for last 7 days (for chart)
-        daily_sales = []
-        for i in range(7):
-            day_start = start_of_day - timedelta(days=i)
-            day_end = day_start + timedelta(days=1)
-            day_pipeline = [
-                {'$match': {**base_filter, 'created_at': {'$gte': day_start, '$lt': day_end}}},
-                {'$group': {'_id': None, 'total': {'$sum': '$total_amount'}}}
-            ]
-            day_result = list(sales_coll.aggregate(day_pipeline))
-            daily_sales.append({
-                'date': day_start.strftime('%a'),
-                'amount': day_result[0]['total'] if day_result else 0
-            })
-        daily_sales.reverse()
-        
-        # 10. Total customers
-        total_customers = customers_coll.count_documents(base_filter)
+        stats = {
+            **_sales_stats(sales_coll, base_filter, start_of_day),
+            **_product_stats(products_coll, base_filter),
+            'pendingOrders': invoices_coll.count_documents({**base_filter, 'status': 'pending'}),
+            'totalCustomers': customers_coll.count_documents(base_filter)
+        }
+        dashboard_cache.set(cache_key, stats)
         
-        return jsonify({
-            'todaySales': round(today_sales, 2),
-            'todayTransactions': today_transactions,
-            'weekSales': round(week_sales, 2),
-            'weekTransactions': week_transactions,
-            'monthSales': round(month_sales, 2),
-            'totalProducts': total_products,
-            'lowStock': low_stock,
-            'outOfStock': out_of_stock,
-            'pendingOrders': pending_orders,
-            'totalCustomers': total_customers,
-            'recentSales': serialize_doc(recent_sales),
-            'dailySales': daily_sales
-        }), 200
+        return jsonify(stats), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -1,8 +1,13 @@
 """
 Demo Portal Routes - Full Feature Demo System
 """
-from flask import Blueprint, request, jsonify, current_app
-from app.utils.helpers import serialize_doc, get_current_utc_time
+from flask import Blueprint, request, jsonify, current_app, g
+from app.utils.helpers import get_current_utc_time
+from app.utils import product_events
+from app.utils.stock_service import aggregate_quantities, reserve_stock, restock, InsufficientStockError, StockReservationError
+from app.utils.rollup_service import sale_rollup, find_sales_rollups, sum_sales_rollups
+from app.utils.outbox_service import outbox_record, enqueue_record, rollup_effect, PENDING_FIELD
+from app.utils.projection import get_projection
 from bson import ObjectId
 from datetime import datetime, timezone, timedelta
 import secrets
@@ -155,30 +160,8 @@ def demo_login():
 
 def get_demo_user():
     """Get current demo user from token"""
-    from flask import request
-    auth_header = request.headers.get('Authorization', '')
-    if not auth_header.startswith('Bearer '):
-        return None
-    
-    token = auth_header.split(' ')[1]
-    try:
-        payload = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
-        if not payload.get('is_demo'):
-            return None
-        
-        db = current_app.db
-        demo_user = db.demo_users.find_one({'_id': ObjectId(payload['demo_user_id'])})
-        
-        if demo_user:
-            expires_at = demo_user.get('expires_at')
-            if expires_at:
-                if expires_at.tzinfo is None:
-                    expires_at = expires_at.replace(tzinfo=timezone.utc)
-                if expires_at > get_utc_now():
-                    return demo_user
-        return None
-    except:
-        return None
+    from app.middleware.auth import get_demo_user_from_token
+    return get_demo_user_from_token()
 
 
 def demo_required(f):
@@ -208,14 +191,10 @@ def get_demo_dashboard():
         start_of_day = now.replace(hour=0, minute=0, second=0, microsecond=0)
         start_of_week = start_of_day - timedelta(days=7)
         
-        # Today's sales
-        today_pipeline = [
-            {'$match': {'demo_user_id': demo_user_id, 'created_at': {'$gte': start_of_day}}},
-            {'$group': {'_id': None, 'total': {'$sum': '$total_amount'}, 'count': {'$sum': 1}}}
-        ]
-        today_result = list(db.demo_sales.aggregate(today_pipeline))
-        today_sales = today_result[0]['total'] if today_result else 0
-        today_transactions = today_result[0]['count'] if today_result else 0
+        # Today's sales (hourly rollups)
+        today = sum_sales_rollups(find_sales_rollups(db.demo_sales_rollups, {'demo_user_id': demo_user_id}, start_of_day))
+        today_sales = today['total']
+        today_transactions = today['count']
         
         # Products count
         total_products = db.demo_products.count_documents({'demo_user_id': demo_user_id})
@@ -232,7 +211,7 @@ def get_demo_dashboard():
         # Recent sales
         recent_sales = list(db.demo_sales.find({
             'demo_user_id': demo_user_id
-        }).sort('created_at', -1).limit(5))
+        }, {PENDING_FIELD: 0}).sort('created_at', -1).limit(5))
         
         # Time remaining - handle timezone
         expires_at = demo_user.get('expires_at')
@@ -250,7 +229,7 @@ def get_demo_dashboard():
             'totalProducts': total_products,
             'lowStock': low_stock,
             'totalCustomers': total_customers,
-            'recentSales': serialize_doc(recent_sales),
+            'recentSales': recent_sales,
             'expiresAt': expires_at.isoformat() if expires_at else None,
             'hoursRemaining': round(hours_remaining, 1)
         }), 200
@@ -272,9 +251,11 @@ def get_demo_products():
         
         products = list(db.demo_products.find({
             'demo_user_id': demo_user['_id']
-        }).sort('name', 1))
+        }, get_projection('products')).sort('name', 1))
         
-        return jsonify(serialize_doc(products)), 200
+        return jsonify(products), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -298,13 +279,15 @@ def create_demo_product():
             'stock': int(data.get('stock', 0)),
             'barcode': data.get('barcode', ''),
             'is_seed': False,
-            'created_at': get_current_utc_time()
+            'created_at': get_current_utc_time(),
+            'updated_at': get_current_utc_time()
         }
         
         result = db.demo_products.insert_one(product)
         product['_id'] = result.inserted_id
+        product_events.product_saved(db.demo_products, {'demo_user_id': demo_user['_id']}, product)
         
-        return jsonify(serialize_doc(product)), 201
+        return jsonify(product), 201
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -336,6 +319,8 @@ def update_demo_product(product_id):
         if result.modified_count == 0:
             return jsonify({'error': 'Product not found'}), 404
         
+        product_events.product_updated(db.demo_products, {'demo_user_id': demo_user['_id']}, product_id, update_data)
+        
         return jsonify({'message': 'Product updated'}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -357,6 +342,8 @@ def delete_demo_product(product_id):
         if result.deleted_count == 0:
             return jsonify({'error': 'Product not found'}), 404
         
+        product_events.product_deleted(db.demo_products, {'demo_user_id': demo_user['_id']}, product_id)
+        
         return jsonify({'message': 'Product deleted'}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -374,9 +361,11 @@ def get_demo_categories():
         
         categories = list(db.demo_categories.find({
             'demo_user_id': demo_user['_id']
-        }).sort('name', 1))
+        }, get_projection('categories')).sort('name', 1))
         
-        return jsonify({'categories': serialize_doc(categories)}), 200
+        return jsonify({'categories': categories}), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -401,7 +390,7 @@ def create_demo_category():
         result = db.demo_categories.insert_one(category)
         category['_id'] = result.inserted_id
         
-        return jsonify({'category': serialize_doc(category)}), 201
+        return jsonify({'category': category}), 201
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -418,9 +407,11 @@ def get_demo_customers():
         
         customers = list(db.demo_customers_crm.find({
             'demo_user_id': demo_user['_id']
-        }).sort('name', 1))
+        }, get_projection('customers')).sort('name', 1))
         
-        return jsonify({'customers': serialize_doc(customers)}), 200
+        return jsonify({'customers': customers}), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -447,7 +438,7 @@ def create_demo_customer():
         result = db.demo_customers_crm.insert_one(customer)
         customer['_id'] = result.inserted_id
         
-        return jsonify({'customer': serialize_doc(customer)}), 201
+        return jsonify({'customer': customer}), 201
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -489,19 +480,43 @@ def create_demo_sale():
             'created_at': get_current_utc_time()
         }
         
-        result = db.demo_sales.insert_one(sale)
-        sale['_id'] = result.inserted_id
+        # Reserve stock - all lines or none
+        owner_filter = {'demo_user_id': demo_user['_id']}
+        quantities = aggregate_quantities(items)
+        try:
+            reserve_stock(db.demo_products, owner_filter, quantities)
+        except InsufficientStockError as stock_error:
+            return jsonify({'error': str(stock_error)}), 400
+        except StockReservationError as stock_error:
+            return jsonify({'error': str(stock_error)}), 409
+        
+        # Reporting rollup - run by the outbox workers, written with the sale
+        # (the record's actor is the request user, as in the regular routes)
+        g.demo_user = demo_user
+        g.is_demo = True
+        sale['_id'] = ObjectId()
+        side_effects = outbox_record(
+            f"sale:{sale['_id']}",
+            [rollup_effect(sale_rollup(db.demo_sales.name, sale))],
+            source=(db.demo_sales.name, sale['_id'])
+        )
+        sale[PENDING_FIELD] = [side_effects]
+        
+        try:
+            db.demo_sales.insert_one(sale)
+        except Exception:
+            restock(db.demo_products, owner_filter, quantities)
+            raise
+        sale.pop(PENDING_FIELD)
         
-        # Update stock
-        for item in items:
-            db.demo_products.update_one(
-                {'_id': ObjectId(item['id']), 'demo_user_id': demo_user['_id']},
-                {'$inc': {'stock': -item['quantity']}}
-            )
+        try:
+            enqueue_record(side_effects)
+        except Exception as outbox_error:
+            print(f"Sale side effects error: {outbox_error} (left for the outbox sweep)")
         
         return jsonify({
             'message': 'Sale completed',
-            'sale': serialize_doc(sale)
+            'sale': sale
         }), 201
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -517,9 +532,11 @@ def get_demo_sales():
         
         sales = list(db.demo_sales.find({
             'demo_user_id': demo_user['_id']
-        }).sort('created_at', -1).limit(50))
+        }, get_projection('sales')).sort('created_at', -1).limit(50))
         
-        return jsonify(serialize_doc(sales)), 200
+        return jsonify(sales), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -536,9 +553,11 @@ def get_demo_invoices():
         
         invoices = list(db.demo_invoices.find({
             'demo_user_id': demo_user['_id']
-        }).sort('created_at', -1))
+        }, get_projection('invoices')).sort('created_at', -1))
         
-        return jsonify({'invoices': serialize_doc(invoices)}), 200
+        return jsonify({'invoices': invoices}), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -572,7 +591,7 @@ def create_demo_invoice():
         result = db.demo_invoices.insert_one(invoice)
         invoice['_id'] = result.inserted_id
         
-        return jsonify({'invoice': serialize_doc(invoice)}), 201
+        return jsonify({'invoice': invoice}), 201
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -639,6 +658,8 @@ def cleanup_expired_demos():
         db.demo_categories.delete_many({'demo_user_id': user_id})
         db.demo_customers_crm.delete_many({'demo_user_id': user_id})
         db.demo_invoices.delete_many({'demo_user_id': user_id})
+        db.demo_activity_counters.delete_many({'demo_user_id': user_id})
+        db.demo_sales_rollups.delete_many({'demo_user_id': user_id})
         
         # Delete the demo user
         db.demo_users.delete_one({'_id': user_id})
@@ -4,7 +4,12 @@ HR & Payroll Module Routes
 from flask import Blueprint, request, jsonify, current_app
 from app.middleware.auth import tenant_required, get_current_user
 from app.middleware.modules import module_required
-from app.utils.helpers import serialize_doc, get_current_utc_time, is_demo_request, get_collection_name
+from app.utils.helpers import get_current_utc_time, is_demo_request, get_collection_name
+from app.utils.projection import get_projection
+from app.utils.json_provider import stream_documents
+from app.utils.sequence_service import next_number
+from app.models.user import User
+from app.utils.password_service import hash_password, PasswordServiceBusy
 from bson import ObjectId
 
 hr_bp = Blueprint('hr', __name__)
@@ -32,7 +37,7 @@ def get_attendance_collection():
 def get_employees():
     """Get all employees with their user account info"""
     try:
-        employees = list(get_employees_collection().find(get_tenant_filter()))
+        employees = list(get_employees_collection().find(get_tenant_filter(), get_projection('employees')))
         
         # Get user details for employees with accounts
         db = current_app.db
@@ -47,9 +52,11 @@ def get_employees():
                     }
         
         return jsonify({
-            'employees': [serialize_doc(e) for e in employees]
+            'employees': employees
         }), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -63,8 +70,7 @@ def create_employee():
         data = request.get_json()
         
         # Generate employee ID
-        count = get_employees_collection().count_documents(get_tenant_filter())
-        employee_id = f"EMP-{count + 1:04d}"
+        employee_id = next_number('employee')
         
         employee_data = {
             **get_tenant_filter(),
@@ -86,7 +92,7 @@ def create_employee():
         
         return jsonify({
             'message': 'Employee created successfully',
-            'employee': serialize_doc(employee_data)
+            'employee': employee_data
         }), 201
         
     except Exception as e:
@@ -138,6 +144,7 @@ def delete_employee(employee_id):
         # Delete associated user account if exists
         if employee.get('user_id'):
             current_app.db.users.delete_one({'_id': employee['user_id']})
+            User.invalidate_access(employee['user_id'], employee.get('tenant_id'))
         
         result = get_employees_collection().delete_one(delete_filter)
         
@@ -151,14 +158,12 @@ def delete_employee(employee_id):
 @tenant_required
 @module_required('hr')
 def get_attendance():
-    """Get attendance records"""
+    """Get attendance records (streamed; ?format=ndjson for one record per line)"""
     try:
-        attendance = list(get_attendance_collection().find(get_tenant_filter()))
-        
-        return jsonify({
-            'attendance': [serialize_doc(a) for a in attendance]
-        }), 200
+        return stream_documents(get_attendance_collection().find(get_tenant_filter(), get_projection('attendance')), key='attendance')
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -186,7 +191,7 @@ def mark_attendance():
         
         return jsonify({
             'message': 'Attendance marked successfully',
-            'attendance': serialize_doc(attendance_data)
+            'attendance': attendance_data
         }), 201
         
     except Exception as e:
@@ -201,7 +206,6 @@ def mark_attendance():
 def create_user_from_employee(employee_id):
     """Create a user account for an employee with role-based permissions"""
     try:
-        import bcrypt
         from app.routes.roles import ROLE_DEFINITIONS
         
         user = get_current_user()
@@ -257,7 +261,7 @@ def create_user_from_employee(employee_id):
             'employee_id': ObjectId(employee_id),
             'email': data['email'].lower().strip(),
             'username': data['username'].lower().strip(),
-            'password_hash': bcrypt.hashpw(data['password'].encode('utf-8'), bcrypt.gensalt()).decode('utf-8'),
+            'password_hash': hash_password(data['password']),
             'first_name': employee.get('first_name', ''),
             'last_name': employee.get('last_name', ''),
             'role': role,
@@ -279,15 +283,17 @@ def create_user_from_employee(employee_id):
         
         return jsonify({
             'message': 'User account created successfully',
-            'user': serialize_doc({
+            'user': {
                 '_id': new_user['_id'],
                 'email': new_user['email'],
                 'username': new_user['username'],
                 'role': new_user['role'],
                 'allowed_modules': new_user['allowed_modules']
-            })
+            }
         }), 201
         
+    except PasswordServiceBusy as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -316,7 +322,7 @@ def get_employee_user(employee_id):
             return jsonify({'error': 'User account not found'}), 404
         
         return jsonify({
-            'user': serialize_doc({
+            'user': {
                 '_id': user['_id'],
                 'email': user['email'],
                 'username': user['username'],
@@ -324,7 +330,7 @@ def get_employee_user(employee_id):
                 'allowed_modules': user.get('allowed_modules', []),
                 'is_active': user.get('is_active', True),
                 'created_at': user.get('created_at')
-            })
+            }
         }), 200
         
     except Exception as e:
@@ -337,7 +343,6 @@ def get_employee_user(employee_id):
 def update_employee_user(employee_id):
     """Update user account details for an employee"""
     try:
-        import bcrypt
         from app.routes.roles import ROLE_DEFINITIONS
         
         data = request.get_json()
@@ -370,7 +375,7 @@ def update_employee_user(employee_id):
         if data.get('password'):
             if data.get('password') != data.get('confirm_password'):
                 return jsonify({'error': 'Passwords do not match'}), 400
-            update_data['password_hash'] = bcrypt.hashpw(data['password'].encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+            update_data['password_hash'] = hash_password(data['password'])
         
         # Update role if provided
         if data.get('role'):
@@ -387,8 +392,11 @@ def update_employee_user(employee_id):
         if update_data:
             update_data['updated_at'] = get_current_utc_time()
             db.users.update_one({'_id': user['_id']}, {'$set': update_data})
+            User.invalidate_access(user['_id'], user.get('tenant_id'))
         
         return jsonify({'message': 'User account updated successfully'}), 200
         
+    except PasswordServiceBusy as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
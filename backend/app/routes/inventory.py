@@ -4,7 +4,11 @@ Inventory Module Routes
 from flask import Blueprint, request, jsonify, current_app, g
 from app.middleware.auth import tenant_required, get_current_user
 from app.middleware.modules import module_required
-from app.utils.helpers import serialize_doc, get_current_utc_time, validate_required_fields, is_demo_request, get_collection_name, get_user_id_field
+from app.utils.helpers import get_current_utc_time, validate_required_fields, is_demo_request, get_collection_name, get_user_id_field
+from app.utils.projection import get_projection
+from app.utils.json_provider import stream_documents
+from app.utils import product_events
+from app.utils.product_search import search_products
 from bson import ObjectId
 
 inventory_bp = Blueprint('inventory', __name__)
@@ -34,10 +38,32 @@ def get_categories_collection():
 @tenant_required
 @module_required('inventory')
 def get_products():
-    """Get all products"""
+    """Get all products (streamed; ?format=ndjson for one product per line)"""
     try:
-        products = list(get_products_collection().find(get_tenant_filter()).sort('name', 1))
-        return jsonify(serialize_doc(products)), 200
+        return stream_documents(get_products_collection().find(get_tenant_filter(), get_projection('products')).sort('name', 1))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@inventory_bp.route('/products/search', methods=['GET'])
+@tenant_required
+@module_required('inventory')
+def search_products_route():
+    """Ranked product search with prefix and typo-tolerant matching"""
+    try:
+        query = request.args.get('q', '').strip()
+        page = max(1, int(request.args.get('page', 1)))
+        per_page = min(100, max(1, int(request.args.get('per_page', 20))))
+        
+        if not query:
+            return jsonify({'error': 'Search query (q) is required'}), 400
+        
+        result = search_products(get_products_collection(), get_tenant_filter(), query, page, per_page)
+        result['query'] = query
+        
+        return jsonify(result), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -52,13 +78,15 @@ def get_low_stock_products():
         filter_query = get_tenant_filter()
         filter_query['stock'] = {'$lte': threshold}
         
-        products = list(get_products_collection().find(filter_query).sort('stock', 1))
+        products = list(get_products_collection().find(filter_query, get_projection('products')).sort('stock', 1))
         
         return jsonify({
-            'products': serialize_doc(products),
+            'products': products,
             'count': len(products),
             'threshold': threshold
         }), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -102,8 +130,9 @@ def create_product():
         
         result = get_products_collection().insert_one(product)
         product['_id'] = result.inserted_id
+        product_events.product_saved(get_products_collection(), get_tenant_filter(), product)
         
-        return jsonify(serialize_doc(product)), 201
+        return jsonify(product), 201
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -120,12 +149,14 @@ def get_product(product_id):
         product = db.products.find_one({
             '_id': ObjectId(product_id),
             'tenant_id': ObjectId(user['tenant_id'])
-        })
+        }, get_projection('products'))
         
         if not product:
             return jsonify({'error': 'Product not found'}), 404
         
-        return jsonify(serialize_doc(product)), 200
+        return jsonify(product), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -164,6 +195,8 @@ def update_product(product_id):
         
         if result.modified_count == 0:
              return jsonify({'error': 'Product not found'}), 404
+        
+        product_events.product_updated(db.products, {'tenant_id': ObjectId(user['tenant_id'])}, product_id, update_data)
              
         return jsonify({'message': 'Product updated'}), 200
     except Exception as e:
@@ -185,6 +218,8 @@ def delete_product(product_id):
         
         if result.deleted_count == 0:
              return jsonify({'error': 'Product not found'}), 404
+        
+        product_events.product_deleted(db.products, {'tenant_id': ObjectId(user['tenant_id'])}, product_id)
              
         return jsonify({'message': 'Product deleted'}), 200
     except Exception as e:
@@ -227,6 +262,7 @@ def adjust_stock(product_id):
             {'_id': ObjectId(product_id)},
             {'$set': {'stock': new_stock, 'updated_at': get_current_utc_time()}}
         )
+        product_events.product_updated(db.products, {'tenant_id': ObjectId(user['tenant_id'])}, product_id, {'stock': new_stock})
         
         # Record adjustment history
         adjustment_record = {
@@ -263,11 +299,13 @@ def get_stock_adjustments():
         
         adjustments = list(db.stock_adjustments.find({
             'tenant_id': ObjectId(user['tenant_id'])
-        }).sort('created_at', -1).limit(100))
+        }, get_projection('stock_adjustments')).sort('created_at', -1).limit(100))
         
         return jsonify({
-            'adjustments': serialize_doc(adjustments)
+            'adjustments': adjustments
         }), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -280,11 +318,13 @@ def get_stock_adjustments():
 def get_categories():
     """Get all categories"""
     try:
-        categories = list(get_categories_collection().find(get_tenant_filter()).sort('name', 1))
+        categories = list(get_categories_collection().find(get_tenant_filter(), get_projection('categories')).sort('name', 1))
         
         return jsonify({
-            'categories': serialize_doc(categories)
+            'categories': categories
         }), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -321,7 +361,7 @@ def create_category():
         
         return jsonify({
             'message': 'Category created',
-            'category': serialize_doc(category)
+            'category': category
         }), 201
     except Exception as e:
         return jsonify({'error': str(e)}), 500
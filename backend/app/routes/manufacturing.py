@@ -4,7 +4,8 @@ Manufacturing Module Routes
 from flask import Blueprint, request, jsonify, current_app
 from app.middleware.auth import tenant_required, get_current_user
 from app.middleware.modules import module_required
-from app.utils.helpers import get_current_utc_time, serialize_doc, validate_required_fields, is_demo_request, get_collection_name
+from app.utils.helpers import get_current_utc_time, validate_required_fields, is_demo_request, get_collection_name
+from app.utils.projection import get_projection
 from bson import ObjectId
 
 manufacturing_bp = Blueprint('manufacturing', __name__)
@@ -34,8 +35,10 @@ def get_work_orders_collection():
 def get_boms():
     """Get all BOMs"""
     try:
-        boms = list(get_boms_collection().find(get_tenant_filter()))
-        return jsonify(serialize_doc(boms)), 200
+        boms = list(get_boms_collection().find(get_tenant_filter(), get_projection('boms')))
+        return jsonify(boms), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -65,7 +68,7 @@ def create_bom():
         result = get_boms_collection().insert_one(bom)
         bom['_id'] = result.inserted_id
         
-        return jsonify(serialize_doc(bom)), 201
+        return jsonify(bom), 201
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -77,8 +80,10 @@ def create_bom():
 def get_work_orders():
     """Get all work orders"""
     try:
-        orders = list(get_work_orders_collection().find(get_tenant_filter()).sort('created_at', -1))
-        return jsonify(serialize_doc(orders)), 200
+        orders = list(get_work_orders_collection().find(get_tenant_filter(), get_projection('work_orders')).sort('created_at', -1))
+        return jsonify(orders), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -125,6 +130,6 @@ def create_work_order():
         result = get_work_orders_collection().insert_one(order)
         order['_id'] = result.inserted_id
         
-        return jsonify(serialize_doc(order)), 201
+        return jsonify(order), 201
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -4,10 +4,19 @@ POS Module Routes - With Credit Sales and Ledger Integration
 from flask import Blueprint, request, jsonify, current_app, g
 from app.middleware.auth import tenant_required, get_current_user
 from app.middleware.modules import module_required
-from app.utils.helpers import serialize_doc, get_current_utc_time, validate_required_fields, is_demo_request, get_collection_name
-from app.utils.activity_service import log_activity
+from app.utils.helpers import get_current_utc_time, validate_required_fields, is_demo_request, get_collection_name
+from app.utils.projection import get_projection, with_fields
+from app.utils.pagination import keyset_paginate, get_page_args, is_page_request, page_response
+from app.utils.outbox_service import outbox_record, enqueue_record, ledger_effect, activity_effect, rollup_effect, PENDING_FIELD
+from app.utils.sequence_service import next_number
+from app.utils.rollup_service import sale_rollup, payment_rollup
+from app.utils.stock_service import reserve_stock, restock, InsufficientStockError, StockReservationError
+from app.utils.catalog_service import build_catalog
+from app.utils.product_index import lookup_product
 from bson import ObjectId
 from datetime import datetime, timedelta
+import hashlib
+import json
 
 pos_bp = Blueprint('pos', __name__)
 
@@ -52,17 +61,23 @@ def create_sale():
         cost_total = 0
         products_coll = get_products_collection()
         
+        # Resolve the whole cart with a single query
+        product_filter = get_tenant_filter()
+        product_filter['_id'] = {'$in': list({ObjectId(item['id']) for item in items})}
+        products = {p['_id']: p for p in products_coll.find(product_filter)}
+        
         # Validate stock and calculate subtotal + cost
-        for item in items:
-            product_filter = get_tenant_filter()
-            product_filter['_id'] = ObjectId(item['id'])
-            product = products_coll.find_one(product_filter)
+        requested = {}
+        for index, item in enumerate(items):
+            product = products.get(ObjectId(item['id']))
             
             if not product:
-                return jsonify({'error': f"Product {item['name']} not found"}), 404
-                
-            if product['stock'] < item['quantity']:
-                return jsonify({'error': f"Insufficient stock for {product['name']}. Available: {product['stock']}"}), 400
+                return jsonify({'error': f"Product {item['name']} not found", 'line': index}), 404
+            
+            # Lines for the same product draw from the same stock
+            requested[product['_id']] = requested.get(product['_id'], 0) + item['quantity']
+            if product['stock'] < requested[product['_id']]:
+                return jsonify({'error': f"Insufficient stock for {product['name']}. Available: {product['stock']}", 'line': index}), 400
                 
             subtotal += product['price'] * item['quantity']
             cost_total += product.get('cost', 0) * item['quantity']
@@ -122,8 +137,7 @@ def create_sale():
 
         # Generate receipt number
         sales_coll = get_sales_collection()
-        receipt_count = sales_coll.count_documents(get_tenant_filter())
-        receipt_number = f"REC-{receipt_count + 1:06d}"
+        receipt_number = next_number('receipt')
 
         # Payment status
         if payment_type == 'credit':
@@ -164,55 +178,63 @@ def create_sale():
             'status': 'completed'
         }
         
-        # Deduct Stock
-        for item in items:
-            product_filter = get_tenant_filter()
-            product_filter['_id'] = ObjectId(item['id'])
-            products_coll.update_one(
-                product_filter,
-                {'$inc': {'stock': -item['quantity']}}
-            )
-            
-        result = sales_coll.insert_one(sale)
-        sale['_id'] = result.inserted_id
+        # Double-Entry Accounting, activity log and reporting rollups - run after the response
+        # by the outbox workers; the record is written with the sale, so a crash cannot lose it
+        sale['_id'] = ObjectId()
+        sale_data = {
+            '_id': sale['_id'],
+            'receipt_number': receipt_number,
+            'total_amount': round(total_amount, 2),
+            'cost_amount': round(cost_total, 2)
+        }
         
-        # Double-Entry Accounting - Post to Ledger
+        if payment_type == 'cash':
+            ledger = ledger_effect('post_cash_sale', sale_data=sale_data)
+        else:
+            ledger = ledger_effect('post_credit_sale', sale_data=sale_data, customer_id=customer_id, customer_name=customer_name)
+        
+        side_effects = outbox_record(f"sale:{sale['_id']}", [
+            ledger,
+            activity_effect(
+                'SALE_CREATED',
+                description=f'Sale {receipt_number} - PKR {round(total_amount, 2)} ({payment_type})',
+                entity_type='sale',
+                entity_id=str(sale['_id']),
+                entity_name=receipt_number,
+                metadata={
+                    'total_amount': round(total_amount, 2),
+                    'payment_type': payment_type,
+                    'items_count': len(items),
+                    'customer_name': customer_name if customer_id else 'Walk-in'
+                }
+            ),
+            rollup_effect(sale_rollup(sales_coll.name, sale))
+        ], source=(sales_coll.name, sale['_id']))
+        sale[PENDING_FIELD] = [side_effects]
+        
+        # Reserve stock - all lines or none, safe against concurrent terminals
         try:
-            from app.utils.ledger_service import post_cash_sale, post_credit_sale
-            
-            sale_data = {
-                '_id': sale['_id'],
-                'receipt_number': receipt_number,
-                'total_amount': round(total_amount, 2),
-                'cost_amount': round(cost_total, 2)
-            }
-            
-            if payment_type == 'cash':
-                post_cash_sale(sale_data)
-            else:
-                post_credit_sale(sale_data, customer_id, customer_name)
-                
-        except Exception as ledger_error:
-            print(f"Ledger posting error: {ledger_error}")
-        
-        # Log the sale activity
-        log_activity(
-            activity_type='SALE_CREATED',
-            description=f'Sale {receipt_number} - PKR {round(total_amount, 2)} ({payment_type})',
-            entity_type='sale',
-            entity_id=str(sale['_id']),
-            entity_name=receipt_number,
-            metadata={
-                'total_amount': round(total_amount, 2),
-                'payment_type': payment_type,
-                'items_count': len(items),
-                'customer_name': customer_name if customer_id else 'Walk-in'
-            }
-        )
+            reserve_stock(products_coll, get_tenant_filter(), requested)
+        except InsufficientStockError as stock_error:
+            return jsonify({'error': str(stock_error)}), 400
+        except StockReservationError as stock_error:
+            return jsonify({'error': str(stock_error)}), 409
+        
+        try:
+            sales_coll.insert_one(sale)
+        except Exception:
+            restock(products_coll, get_tenant_filter(), requested)
+            raise
+        sale.pop(PENDING_FIELD)
+        
+        try:
+            enqueue_record(side_effects)
+        except Exception as outbox_error:
+            print(f"Sale side effects error: {outbox_error} (left for the outbox sweep)")
         
         return jsonify({
             'message': 'Sale completed' if payment_type == 'cash' else 'Credit sale recorded',
-            'sale': serialize_doc(sale),
+            'sale': sale,
             'receipt': {
                 'receipt_number': receipt_number,
                 'subtotal': round(subtotal, 2),
@@ -261,44 +283,48 @@ def record_payment(sale_id):
         new_amount_due = max(0, current_due - amount)
         new_status = 'paid' if new_amount_due == 0 else 'partial'
         
-        # Update sale
-        sales_coll.update_one(
-            sale_filter,
-            {
-                '$set': {
-                    'amount_paid': round(new_amount_paid, 2),
-                    'amount_due': round(new_amount_due, 2),
-                    'payment_status': new_status,
-                    'updated_at': get_current_utc_time()
-                },
-                '$push': {
-                    'payments': {
-                        'amount': round(amount, 2),
-                        'method': payment_method,
-                        'date': get_current_utc_time()
-                    }
+        # Update sale, with its side effects (outbox) in the same write
+        payment_id = ObjectId()
+        paid_at = get_current_utc_time()
+        update = {
+            '$set': {
+                'amount_paid': round(new_amount_paid, 2),
+                'amount_due': round(new_amount_due, 2),
+                'payment_status': new_status,
+                'updated_at': paid_at
+            },
+            '$push': {
+                'payments': {
+                    '_id': payment_id,
+                    'amount': round(amount, 2),
+                    'method': payment_method,
+                    'date': paid_at
                 }
             }
-        )
-        
-        # Post payment to ledger
-        try:
-            from app.utils.ledger_service import post_payment_received
-            
+        }
+        # Ledger posting for customer sales, and the reporting rollup (outbox)
+        effects = []
+        if sale.get('customer_id'):
             payment_data = {
                 '_id': sale_id,
                 'amount': amount,
                 'payment_method': payment_method
             }
-            
-            if sale.get('customer_id'):
-                post_payment_received(
-                    payment_data, 
-                    str(sale['customer_id']), 
-                    sale.get('customer_name', 'Customer')
-                )
-        except Exception as ledger_error:
-            print(f"Payment ledger error: {ledger_error}")
+            effects.append(ledger_effect(
+                'post_payment_received',
+                payment_data=payment_data,
+                customer_id=str(sale['customer_id']),
+                customer_name=sale.get('customer_name', 'Customer')
+            ))
+        effects.append(rollup_effect(payment_rollup(sales_coll.name, sale, round(amount, 2), paid_at)))
+        side_effects = outbox_record(f"customer_payment:{payment_id}", effects, source=(sales_coll.name, sale['_id']))
+        update['$push'][PENDING_FIELD] = side_effects
+        sales_coll.update_one(sale_filter, update)
+        
+        try:
+            enqueue_record(side_effects)
+        except Exception as outbox_error:
+            print(f"Payment side effects error: {outbox_error} (left for the outbox sweep)")
         
         return jsonify({
             'message': 'Payment recorded',
@@ -311,14 +337,61 @@ def record_payment(sale_id):
         return jsonify({'error': str(e)}), 500
 
 
+@pos_bp.route('/catalog', methods=['GET'])
+@tenant_required
+@module_required('pos')
+def get_catalog():
+    """
+    Compact product catalog for POS terminals
+    Full catalog, or changes and deletes since a version with ?since=<version>
+    Answers 304 when If-None-Match matches the ETag
+    """
+    try:
+        since = request.args.get('since', type=int)
+        payload = build_catalog(get_products_collection(), get_tenant_filter(), since)
+        
+        response = current_app.response_class(
+            json.dumps(payload, separators=(',', ':')),
+            mimetype='application/json'
+        )
+        response.set_etag(hashlib.sha1(response.get_data()).hexdigest())
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@pos_bp.route('/lookup/<path:code>', methods=['GET'])
+@tenant_required
+@module_required('pos')
+def lookup_by_code(code):
+    """Scan-to-cart lookup by barcode or SKU"""
+    try:
+        product, source = lookup_product(get_products_collection(), get_tenant_filter(), code)
+        
+        if not product:
+            return jsonify({'error': 'Product not found'}), 404
+        
+        return jsonify({
+            'product': product,
+            'source': source
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @pos_bp.route('/history', methods=['GET'])
 @tenant_required
 @module_required('pos')
 def get_sales_history():
-    """Get recent sales"""
+    """Get recent sales, newest first (keyset pages: ?limit=&cursor=)"""
     try:
-        sales = list(get_sales_collection().find(get_tenant_filter()).sort('created_at', -1).limit(50))
-        return jsonify(serialize_doc(sales)), 200
+        cursor, limit = get_page_args()
+        page = keyset_paginate(get_sales_collection(), get_tenant_filter(), 'created_at', limit=limit, cursor=cursor,
+                               projection=get_projection('sales'))
+        return page_response(page), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -333,11 +406,13 @@ def get_pos_customers():
         if not is_demo_request():
             customer_filter['is_active'] = True
         
-        customers = list(get_customers_collection().find(customer_filter).sort('name', 1))
+        customers = list(get_customers_collection().find(customer_filter, get_projection('customers')).sort('name', 1))
         
         return jsonify({
-            'customers': serialize_doc(customers)
+            'customers': customers
         }), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -351,12 +426,14 @@ def get_sale(sale_id):
         sale_filter = get_tenant_filter()
         sale_filter['_id'] = ObjectId(sale_id)
         
-        sale = get_sales_collection().find_one(sale_filter)
+        sale = get_sales_collection().find_one(sale_filter, get_projection('sales'))
         
         if not sale:
             return jsonify({'error': 'Sale not found'}), 404
         
-        return jsonify(serialize_doc(sale)), 200
+        return jsonify(sale), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -365,17 +442,37 @@ def get_sale(sale_id):
 @tenant_required
 @module_required('pos')
 def get_credit_sales():
-    """Get all credit sales with outstanding balances"""
+    """Get all credit sales with outstanding balances (keyset pages with ?limit=&cursor=)"""
     try:
         filter_query = get_tenant_filter()
         filter_query['payment_type'] = 'credit'
         filter_query['payment_status'] = {'$in': ['unpaid', 'partial']}
+        projection = get_projection('sales')
+        
+        if is_page_request():
+            cursor, limit = get_page_args()
+            page = keyset_paginate(get_sales_collection(), filter_query, 'created_at', limit=limit, cursor=cursor, projection=projection)
+            totals = list(get_sales_collection().aggregate([
+                {'$match': filter_query},
+                {'$group': {'_id': None, 'total': {'$sum': '$amount_due'}}}
+            ]))
+            return page_response(
+                page,
+                key='credit_sales',
+                total_outstanding=totals[0]['total'] if totals else 0
+            ), 200
         
-        sales = list(get_sales_collection().find(filter_query).sort('created_at', -1))
+        # amount_due is needed for the total
+        sales = list(get_sales_collection().find(
+            filter_query,
+            with_fields(projection, 'amount_due')
+        ).sort('created_at', -1))
         
         return jsonify({
-            'credit_sales': serialize_doc(sales),
+            'credit_sales': sales,
             'total_outstanding': sum(s.get('amount_due', 0) for s in sales)
         }), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -2,7 +2,6 @@
 Public Routes (No authentication required)
 """
 from flask import Blueprint, request, jsonify
-from app.utils.helpers import serialize_doc
 from flask import current_app
 
 public_bp = Blueprint('public', __name__)
@@ -18,7 +17,7 @@ def get_packages():
         packages = list(db.packages.find({'is_active': True}).sort('price', 1))
         
         return jsonify({
-            'packages': [serialize_doc(p) for p in packages]
+            'packages': packages
         }), 200
         
     except Exception as e:
@@ -38,7 +37,7 @@ def get_package(package_id):
             return jsonify({'error': 'Package not found'}), 404
         
         return jsonify({
-            'package': serialize_doc(package)
+            'package': package
         }), 200
         
     except Exception as e:
@@ -118,7 +117,7 @@ def get_booking(booking_id):
         if not booking:
             return jsonify({'error': 'Booking not found'}), 404
         
-        return jsonify(serialize_doc(booking)), 200
+        return jsonify(booking), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
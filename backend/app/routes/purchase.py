@@ -4,8 +4,14 @@ Purchase Module Routes - With Ledger Integration and Stock Updates
 from flask import Blueprint, request, jsonify, current_app
 from app.middleware.auth import tenant_required, get_current_user
 from app.middleware.modules import module_required
-from app.utils.helpers import serialize_doc, get_current_utc_time, is_demo_request, get_collection_name
+from app.utils.helpers import get_current_utc_time, is_demo_request, get_collection_name
+from app.utils.projection import get_projection, with_fields
+from app.utils.json_provider import stream_documents
+from app.utils.pagination import keyset_paginate, get_page_args, is_page_request, page_response
 from app.utils.activity_service import log_activity
+from app.utils import product_events
+from app.utils.outbox_service import outbox_record, enqueue_record, ledger_effect, PENDING_FIELD
+from app.utils.sequence_service import next_number
 from bson import ObjectId
 from datetime import datetime, timedelta
 
@@ -38,12 +44,14 @@ def get_products_collection():
 def get_suppliers():
     """Get all suppliers for tenant"""
     try:
-        suppliers = list(get_suppliers_collection().find(get_tenant_filter()))
+        suppliers = list(get_suppliers_collection().find(get_tenant_filter(), get_projection('suppliers')))
         
         return jsonify({
-            'suppliers': [serialize_doc(s) for s in suppliers]
+            'suppliers': suppliers
         }), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -74,7 +82,7 @@ def create_supplier():
         
         return jsonify({
             'message': 'Supplier created successfully',
-            'supplier': serialize_doc(supplier_data)
+            'supplier': supplier_data
         }), 201
         
     except Exception as e:
@@ -133,14 +141,21 @@ def delete_supplier(supplier_id):
 @tenant_required
 @module_required('purchase')
 def get_purchase_orders():
-    """Get all purchase orders"""
+    """Get all purchase orders (streamed; ?format=ndjson for one order per line, ?limit=&cursor= for keyset pages)"""
     try:
-        orders = list(get_purchase_orders_collection().find(get_tenant_filter()).sort('created_at', -1))
-        
-        return jsonify({
-            'purchase_orders': [serialize_doc(o) for o in orders]
-        }), 200
+        if is_page_request():
+            cursor, limit = get_page_args()
+            page = keyset_paginate(get_purchase_orders_collection(), get_tenant_filter(), 'created_at', limit=limit, cursor=cursor,
+                                   projection=get_projection('purchase_orders'))
+            return page_response(page, key='purchase_orders'), 200
+        
+        return stream_documents(
+            get_purchase_orders_collection().find(get_tenant_filter(), get_projection('purchase_orders')).sort('created_at', -1),
+            key='purchase_orders'
+        )
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -155,8 +170,7 @@ def create_purchase_order():
         data = request.get_json()
         
         # Generate PO number
-        count = get_purchase_orders_collection().count_documents(get_tenant_filter())
-        po_number = f"PO-{count + 1:05d}"
+        po_number = next_number('purchase_order')
         
         # Payment type (cash or credit)
         payment_type = data.get('payment_type', 'credit')
@@ -204,7 +218,7 @@ def create_purchase_order():
         
         return jsonify({
             'message': 'Purchase order created successfully',
-            'purchase_order': serialize_doc(po_data)
+            'purchase_order': po_data
         }), 201
         
     except Exception as e:
@@ -233,52 +247,66 @@ def receive_purchase_order(po_id):
         
         # Update stock for each item
         received_items = data.get('items', po['items'])
+        stock_deltas = {}
+        cost_updates = {}
         for item in received_items:
             product_filter = get_tenant_filter()
             product_filter['_id'] = ObjectId(item['product_id'])
             
             quantity_received = item.get('quantity_received', item.get('quantity', 0))
+            cost_update = {
+                'cost': item.get('unit_price', 0),  # Update cost price
+                'updated_at': get_current_utc_time()
+            }
             
             # Update product stock
             products_coll.update_one(
                 product_filter,
                 {
                     '$inc': {'stock': quantity_received},
-                    '$set': {
-                        'cost': item.get('unit_price', 0),  # Update cost price
-                        'updated_at': get_current_utc_time()
-                    }
+                    '$set': cost_update
                 }
             )
-        
-        # Update PO status
+            product_id = str(item['product_id'])
+            stock_deltas[product_id] = stock_deltas.get(product_id, 0) + quantity_received
+            cost_updates[product_id] = cost_update
+        
+        # Keep the search and SKU/barcode indexes in step with the receipt
+        product_events.stock_changed(products_coll, get_tenant_filter(), stock_deltas)
+        for product_id, cost_update in cost_updates.items():
+            product_events.product_updated(products_coll, get_tenant_filter(), product_id, cost_update)
+        
+        # Update PO status, with the ledger posting (outbox) in the same write
+        purchase_data = {
+            '_id': po['_id'],
+            'po_number': po['po_number'],
+            'total': po['total']
+        }
+        side_effects = outbox_record(f"purchase_received:{po['_id']}", [
+            ledger_effect(
+                'post_purchase',
+                purchase_data=purchase_data,
+                vendor_id=str(po['supplier_id']),
+                vendor_name=po['supplier_name'],
+                payment_type=po.get('payment_type', 'credit')
+            )
+        ], source=(po_coll.name, po['_id']))
         po_coll.update_one(
             po_filter,
-            {'$set': {
-                'status': 'received',
-                'received_at': get_current_utc_time(),
-                'received_items': received_items
-            }}
+            {
+                '$set': {
+                    'status': 'received',
+                    'received_at': get_current_utc_time(),
+                    'received_items': received_items
+                },
+                '$push': {PENDING_FIELD: side_effects}
+            }
         )
         
-        # Post to ledger
         try:
-            from app.utils.ledger_service import post_purchase
-            
-            purchase_data = {
-                '_id': po['_id'],
-                'po_number': po['po_number'],
-                'total': po['total']
-            }
-            
-            post_purchase(
-                purchase_data,
-                str(po['supplier_id']),
-                po['supplier_name'],
-                po.get('payment_type', 'credit')
-            )
+            enqueue_record(side_effects)
         except Exception as ledger_error:
-            print(f"Purchase ledger error: {ledger_error}")
+            print(f"Purchase ledger error: {ledger_error} (left for the outbox sweep)")
         
         return jsonify({
             'message': 'Purchase order received - stock updated',
@@ -319,7 +347,21 @@ def record_vendor_payment(po_id):
         new_amount_due = max(0, current_due - amount)
         new_status = 'paid' if new_amount_due == 0 else 'partial'
         
-        # Update PO
+        # Update PO, with the ledger posting (outbox) in the same write
+        payment_id = ObjectId()
+        payment_data = {
+            '_id': po_id,
+            'amount': amount,
+            'payment_method': payment_method
+        }
+        side_effects = outbox_record(f"vendor_payment:{payment_id}", [
+            ledger_effect(
+                'post_payment_made',
+                payment_data=payment_data,
+                vendor_id=str(po['supplier_id']),
+                vendor_name=po['supplier_name']
+            )
+        ], source=(po_coll.name, po['_id']))
         po_coll.update_one(
             po_filter,
             {
@@ -331,31 +373,20 @@ def record_vendor_payment(po_id):
                 },
                 '$push': {
                     'payments': {
+                        '_id': payment_id,
                         'amount': round(amount, 2),
                         'method': payment_method,
                         'date': get_current_utc_time()
-                    }
+                    },
+                    PENDING_FIELD: side_effects
                 }
             }
         )
         
-        # Post payment to ledger
         try:
-            from app.utils.ledger_service import post_payment_made
-            
-            payment_data = {
-                '_id': po_id,
-                'amount': amount,
-                'payment_method': payment_method
-            }
-            
-            post_payment_made(
-                payment_data,
-                str(po['supplier_id']),
-                po['supplier_name']
-            )
+            enqueue_record(side_effects)
         except Exception as ledger_error:
-            print(f"Payment ledger error: {ledger_error}")
+            print(f"Payment ledger error: {ledger_error} (left for the outbox sweep)")
         
         return jsonify({
             'message': 'Payment recorded',
@@ -377,13 +408,15 @@ def get_purchase_order(po_id):
         po_filter = get_tenant_filter()
         po_filter['_id'] = ObjectId(po_id)
         
-        po = get_purchase_orders_collection().find_one(po_filter)
+        po = get_purchase_orders_collection().find_one(po_filter, get_projection('purchase_orders'))
         
         if not po:
             return jsonify({'error': 'Purchase order not found'}), 404
         
-        return jsonify(serialize_doc(po)), 200
+        return jsonify(po), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -396,15 +429,22 @@ def get_payables():
     try:
         filter_query = get_tenant_filter()
         filter_query['payment_status'] = {'$in': ['unpaid', 'partial']}
+        projection = get_projection('purchase_orders')
         
-        pos = list(get_purchase_orders_collection().find(filter_query).sort('created_at', -1))
+        # amount_due is needed for the total
+        pos = list(get_purchase_orders_collection().find(
+            filter_query,
+            with_fields(projection, 'amount_due')
+        ).sort('created_at', -1))
         
         total_payable = sum(po.get('amount_due', 0) for po in pos)
         
         return jsonify({
-            'payables': serialize_doc(pos),
+            'payables': pos,
             'total_payable': round(total_payable, 2)
         }), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
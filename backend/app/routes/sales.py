@@ -4,7 +4,11 @@ Sales & CRM Module Routes
 from flask import Blueprint, request, jsonify, current_app
 from app.middleware.auth import tenant_required, get_current_user
 from app.middleware.modules import module_required
-from app.utils.helpers import serialize_doc, get_current_utc_time, is_demo_request, get_collection_name
+from app.utils.helpers import get_current_utc_time, is_demo_request, get_collection_name
+from app.utils.projection import get_projection
+from app.utils.json_provider import stream_documents
+from app.utils.pagination import keyset_paginate, get_page_args, is_page_request, page_response
+from app.utils.sequence_service import next_number
 from bson import ObjectId
 
 sales_bp = Blueprint('sales', __name__)
@@ -32,12 +36,14 @@ def get_invoices_collection():
 def get_customers():
     """Get all customers for tenant"""
     try:
-        customers = list(get_customers_collection().find(get_tenant_filter()))
+        customers = list(get_customers_collection().find(get_tenant_filter(), get_projection('customers')))
         
         return jsonify({
-            'customers': [serialize_doc(c) for c in customers]
+            'customers': customers
         }), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -74,7 +80,7 @@ def create_customer():
         
         return jsonify({
             'message': 'Customer created successfully',
-            'customer': serialize_doc(customer_data)
+            'customer': customer_data
         }), 201
         
     except Exception as e:
@@ -138,14 +144,18 @@ def delete_customer(customer_id):
 @tenant_required
 @module_required('sales')
 def get_invoices():
-    """Get all invoices for tenant"""
+    """Get all invoices for tenant (streamed; ?format=ndjson for one invoice per line, ?limit=&cursor= for keyset pages)"""
     try:
-        invoices = list(get_invoices_collection().find(get_tenant_filter()))
+        if is_page_request():
+            cursor, limit = get_page_args()
+            page = keyset_paginate(get_invoices_collection(), get_tenant_filter(), 'created_at', limit=limit, cursor=cursor,
+                                   projection=get_projection('invoices'))
+            return page_response(page, key='invoices'), 200
         
-        return jsonify({
-            'invoices': [serialize_doc(i) for i in invoices]
-        }), 200
+        return stream_documents(get_invoices_collection().find(get_tenant_filter(), get_projection('invoices')), key='invoices')
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -160,8 +170,7 @@ def create_invoice():
         data = request.get_json()
         
         # Generate invoice number
-        count = get_invoices_collection().count_documents(get_tenant_filter())
-        invoice_number = f"INV-{count + 1:05d}"
+        invoice_number = next_number('invoice')
         
         invoice_data = {
             **get_tenant_filter(),
@@ -184,7 +193,7 @@ def create_invoice():
         
         return jsonify({
             'message': 'Invoice created successfully',
-            'invoice': serialize_doc(invoice_data)
+            'invoice': invoice_data
         }), 201
         
     except Exception as e:
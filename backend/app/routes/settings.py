@@ -1,17 +1,18 @@
 """
 Settings Routes - System Configuration API
 """
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from app.middleware.auth import tenant_required, get_current_user
-from app.utils.helpers import serialize_doc
 from app.utils.settings_service import (
     get_settings,
     update_settings,
     get_tax_settings,
     get_currency_settings,
+    get_tenant_filter,
     DEFAULT_SETTINGS
 )
 from app.utils.activity_service import log_activity
+from app.utils.retention_service import get_retention_days, apply_retention_change
 
 settings_bp = Blueprint('settings', __name__)
 
@@ -36,6 +37,7 @@ def get_all_settings():
                 # Don't expose API keys
             },
             'invoice': settings.get('invoice', DEFAULT_SETTINGS['invoice']),
+            'retention': settings.get('retention', DEFAULT_SETTINGS['retention']),
         }
         
         return jsonify(result), 200
@@ -232,3 +234,52 @@ def update_invoice():
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+
+MIN_RETENTION_DAYS = 7
+MAX_RETENTION_DAYS = 3650
+
+
+@settings_bp.route('/retention', methods=['GET'])
+@tenant_required
+def get_retention():
+    """Get activity log retention (days kept before archiving)"""
+    try:
+        return jsonify({
+            'activity_log_days': get_retention_days(get_tenant_filter()),
+            'default_days': current_app.config.get('ACTIVITY_RETENTION_DAYS', 90)
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@settings_bp.route('/retention', methods=['PUT'])
+@tenant_required
+def update_retention():
+    """Update activity log retention (null = platform default)"""
+    try:
+        data = request.get_json() or {}
+        days = data.get('activity_log_days')
+        
+        if days is not None:
+            if not isinstance(days, int) or not MIN_RETENTION_DAYS <= days <= MAX_RETENTION_DAYS:
+                return jsonify({'error': f'activity_log_days must be between {MIN_RETENTION_DAYS} and {MAX_RETENTION_DAYS}'}), 400
+        
+        update_settings('retention', {'activity_log_days': days})
+        apply_retention_change(get_tenant_filter(), days or current_app.config.get('ACTIVITY_RETENTION_DAYS', 90))
+        
+        log_activity(
+            activity_type='SETTINGS_UPDATED',
+            description=f'Activity log retention set to {days or "default"} days',
+            entity_type='settings',
+            entity_name='retention'
+        )
+        
+        return jsonify({
+            'message': 'Retention settings updated successfully',
+            'activity_log_days': get_retention_days(get_tenant_filter()),
+            'default_days': current_app.config.get('ACTIVITY_RETENTION_DAYS', 90)
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -4,7 +4,9 @@ User Management Routes - For tenant-level user management
 from flask import Blueprint, request, jsonify, current_app
 from app.middleware.auth import tenant_required, get_current_user
 from app.models.user import User
-from app.utils.helpers import serialize_doc, get_current_utc_time
+from app.utils.helpers import get_current_utc_time
+from app.utils.projection import get_projection
+from app.utils.password_service import PasswordServiceBusy
 from bson import ObjectId
 
 users_bp = Blueprint('users', __name__)
@@ -28,18 +30,14 @@ def get_users():
         if user.get('role') not in ['admin', None]:  # None for backwards compatibility
             return jsonify({'error': 'Only admins can view users'}), 403
         
+        # Password hashes are never projected (HIDDEN_FIELDS)
         db = current_app.db
-        users = list(db.users.find({'tenant_id': ObjectId(tenant_id)}))
+        users = list(db.users.find({'tenant_id': ObjectId(tenant_id)}, get_projection('users')))
         
-        # Serialize and remove password hashes
-        serialized_users = []
-        for u in users:
-            user_data = serialize_doc(u)
-            user_data.pop('password_hash', None)
-            serialized_users.append(user_data)
-        
-        return jsonify({'users': serialized_users}), 200
+        return jsonify({'users': users}), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -95,15 +93,16 @@ def create_user():
             'created_at': get_current_utc_time()
         }
         
+        # User.create returns the cached document - respond with a copy without the hash
         new_user = User.create(user_data)
-        user_response = serialize_doc(new_user)
-        user_response.pop('password_hash', None)
         
         return jsonify({
             'message': 'User created successfully',
-            'user': user_response
+            'user': User.to_dict(new_user)
         }), 201
         
+    except PasswordServiceBusy as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -120,16 +119,15 @@ def get_user(user_id):
         user = db.users.find_one({
             '_id': ObjectId(user_id),
             'tenant_id': ObjectId(tenant_id)
-        })
+        }, get_projection('users'))
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
-        user_data = serialize_doc(user)
-        user_data.pop('password_hash', None)
-        
-        return jsonify({'user': user_data}), 200
+        return jsonify({'user': user}), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -181,14 +179,13 @@ def update_user_role(user_id):
             {'_id': ObjectId(user_id)},
             {'$set': update_data}
         )
+        User.invalidate_access(user_id, tenant_id)
         
-        updated_user = db.users.find_one({'_id': ObjectId(user_id)})
-        user_response = serialize_doc(updated_user)
-        user_response.pop('password_hash', None)
+        updated_user = db.users.find_one({'_id': ObjectId(user_id)}, {'password_hash': 0})
         
         return jsonify({
             'message': 'User role updated successfully',
-            'user': user_response
+            'user': updated_user
         }), 200
         
     except Exception as e:
@@ -235,14 +232,13 @@ def update_user_modules(user_id):
             {'_id': ObjectId(user_id)},
             {'$set': {'allowed_modules': modules}}
         )
+        User.invalidate_access(user_id, tenant_id)
         
-        updated_user = db.users.find_one({'_id': ObjectId(user_id)})
-        user_response = serialize_doc(updated_user)
-        user_response.pop('password_hash', None)
+        updated_user = db.users.find_one({'_id': ObjectId(user_id)}, {'password_hash': 0})
         
         return jsonify({
             'message': 'User modules updated successfully',
-            'user': user_response
+            'user': updated_user
         }), 200
         
     except Exception as e:
@@ -283,6 +279,7 @@ def update_user_status(user_id):
             {'_id': ObjectId(user_id)},
             {'$set': {'is_active': is_active}}
         )
+        User.invalidate_access(user_id, tenant_id)
         
         return jsonify({
             'message': f"User {'activated' if is_active else 'deactivated'} successfully"
@@ -319,6 +316,8 @@ def delete_user(user_id):
         if result.deleted_count == 0:
             return jsonify({'error': 'User not found'}), 404
         
+        User.invalidate_access(user_id, tenant_id)
+        
         return jsonify({'message': 'User deleted successfully'}), 200
         
     except Exception as e:
@@ -1,12 +1,26 @@
 """
 Activity Logging Service - Comprehensive Audit Trail
 Tracks all user actions for accountability and compliance
+
+log_activity builds the entry in the request and hands it to an in-process
+buffer; a flusher thread writes the buffer with insert_many once
+ACTIVITY_BATCH_SIZE entries are queued or every ACTIVITY_FLUSH_INTERVAL
+seconds, and once more at exit. When the buffer (ACTIVITY_BUFFER_SIZE) is
+full the entry is written directly, so nothing is dropped.
 """
+import atexit
+import threading
+from collections import deque
 from flask import current_app, request, g
 from bson import ObjectId
-from datetime import datetime
-from app.utils.helpers import get_current_utc_time, is_demo_request, get_collection_name
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError, BulkWriteError
+from datetime import datetime, timezone
+from itertools import islice
+from app.utils.helpers import get_current_utc_time, is_demo_request, get_collection_name, get_demo_collection_name
 from app.middleware.auth import get_current_user
+from app.utils.retention_service import get_retention_days, get_hot_cutoff, get_expire_at, read_archived_logs, count_archived_logs
+from app.utils.pagination import keyset_paginate, encode_cursor, decode_cursor
 
 
 # Activity Types
@@ -74,6 +88,341 @@ def get_tenant_filter():
         return {}
 
 
+def build_activity_entry(
+    activity_type,
+    description=None,
+    entity_type=None,
+    entity_id=None,
+    entity_name=None,
+    old_values=None,
+    new_values=None,
+    metadata=None,
+    user_id=None,
+    user_name=None,
+    tenant_id=None
+):
+    """
+    Build an activity log entry from the current request (see log_activity for the arguments)
+    The entry gets its _id here, so writing it more than once stores it once.
+    """
+    # Look the current user up once, only when the caller did not provide the details
+    user = None
+    if not user_id or not tenant_id:
+        try:
+            user = get_current_user()
+        except:
+            user = None
+    
+    # Get current user info if not provided
+    if not user_id:
+        if user:
+            user_id = user.get('_id')
+            user_name = user.get('name') or user.get('email', 'Unknown')
+            tenant_id = user.get('tenant_id')
+        else:
+            user_id = None
+            user_name = 'System'
+    
+    # Get IP address
+    ip_address = None
+    try:
+        ip_address = request.remote_addr
+    except:
+        pass
+    
+    # Get user agent
+    user_agent = None
+    try:
+        user_agent = request.headers.get('User-Agent', '')[:200]  # Limit length
+    except:
+        pass
+    
+    # Build log entry
+    log_entry = {
+        '_id': ObjectId(),
+        'activity_type': activity_type,
+        'description': description or ACTIVITY_TYPES.get(activity_type, activity_type),
+        'entity_type': entity_type,
+        'entity_id': ObjectId(entity_id) if entity_id and ObjectId.is_valid(str(entity_id)) else str(entity_id) if entity_id else None,
+        'entity_name': entity_name,
+        'user_id': ObjectId(user_id) if user_id and ObjectId.is_valid(str(user_id)) else user_id,
+        'user_name': user_name,
+        'ip_address': ip_address,
+        'user_agent': user_agent,
+        'old_values': old_values,
+        'new_values': new_values,
+        'metadata': metadata or {},
+        'timestamp': get_current_utc_time()
+    }
+    
+    # Add tenant info
+    if tenant_id:
+        log_entry['tenant_id'] = ObjectId(tenant_id) if ObjectId.is_valid(str(tenant_id)) else tenant_id
+    elif user and is_demo_request():
+        log_entry['demo_user_id'] = user['_id']
+    elif user:
+        try:
+            log_entry['tenant_id'] = ObjectId(user['tenant_id'])
+        except:
+            pass
+    
+    # TTL backstop - the archive job moves the entry out before this
+    owner_filter = {key: log_entry[key] for key in ('tenant_id', 'demo_user_id') if key in log_entry}
+    log_entry['expire_at'] = get_expire_at(log_entry['timestamp'], get_retention_days(owner_filter))
+    
+    return log_entry
+
+
+def write_activity_entry(log_entry):
+    """Insert a built activity entry now (a no-op if it was already written)"""
+    collection = get_activity_logs_collection()
+    try:
+        collection.insert_one(log_entry)
+    except DuplicateKeyError:
+        return
+    increment_activity_counters(current_app.db, collection.name, [log_entry])
+
+
+# =================== DAILY COUNTERS ===================
+# activity_counters holds one document per tenant, UTC day and activity type
+# ({tenant_id, day, activity_type, count}), incremented for every entry the
+# writers insert, so dashboards read days x types documents instead of logs.
+
+def get_activity_counters_collection():
+    return current_app.db[get_collection_name('activity_counters')]
+
+
+def _counters_collection_name(logs_collection_name):
+    """activity_logs -> activity_counters, for the regular or demo collection"""
+    if logs_collection_name == get_demo_collection_name('activity_logs'):
+        return get_demo_collection_name('activity_counters')
+    return 'activity_counters'
+
+
+def _start_of_day(timestamp):
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def increment_activity_counters(db, logs_collection_name, entries):
+    """Add newly written entries to their daily counters (one bulk upsert)"""
+    counts = {}
+    for log_entry in entries:
+        for owner_field in ('tenant_id', 'demo_user_id'):
+            if log_entry.get(owner_field) is not None:
+                key = (owner_field, log_entry[owner_field], _start_of_day(log_entry['timestamp']), log_entry['activity_type'])
+                counts[key] = counts.get(key, 0) + 1
+                break
+    if not counts:
+        return
+    
+    db[_counters_collection_name(logs_collection_name)].bulk_write([
+        UpdateOne(
+            {owner_field: owner, 'day': day, 'activity_type': activity_type},
+            {'$inc': {'count': count}},
+            upsert=True
+        )
+        for (owner_field, owner, day, activity_type), count in counts.items()
+    ], ordered=False)
+
+
+def get_activity_counts(start_day, end_day=None):
+    """
+    Activity counts of the current tenant per type between two days (inclusive)
+
+    Returns:
+        Dict of {activity_type: count}
+    """
+    day_range = {'$gte': _start_of_day(start_day)}
+    if end_day:
+        day_range['$lte'] = _start_of_day(end_day)
+    
+    counts = {}
+    for counter in get_activity_counters_collection().find(
+        {**get_tenant_filter(), 'day': day_range},
+        {'activity_type': 1, 'count': 1}
+    ):
+        counts[counter['activity_type']] = counts.get(counter['activity_type'], 0) + counter['count']
+    return counts
+
+
+def rebuild_activity_counters(since=None):
+    """
+    Recompute the daily counters from the logs still in the hot collections
+    Counters for days before `since` (default: all days present in the logs) are
+    left alone, so counts of days that were already archived survive.
+
+    Returns:
+        Dict of {counters collection name: counter documents written}
+    """
+    db = current_app.db
+    rebuilt = {}
+    
+    for logs_name, owner_field in (('activity_logs', 'tenant_id'), (get_demo_collection_name('activity_logs'), 'demo_user_id')):
+        logs = db[logs_name]
+        counters = db[_counters_collection_name(logs_name)]
+        
+        start = since
+        if start is None:
+            oldest = logs.find_one({'timestamp': {'$ne': None}}, {'timestamp': 1}, sort=[('timestamp', 1)])
+            if not oldest:
+                rebuilt[counters.name] = 0
+                continue
+            start = oldest['timestamp']
+        start = _start_of_day(start)
+        
+        counters.delete_many({'day': {'$gte': start}})
+        pipeline = [
+            {'$match': {owner_field: {'$ne': None}, 'timestamp': {'$gte': start}}},
+            {'$group': {
+                '_id': {
+                    'owner': f'${owner_field}',
+                    'day': {'$dateFromString': {'dateString': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$timestamp'}}}},
+                    'activity_type': '$activity_type'
+                },
+                'count': {'$sum': 1}
+            }}
+        ]
+        operations = [
+            UpdateOne(
+                {owner_field: row['_id']['owner'], 'day': row['_id']['day'], 'activity_type': row['_id']['activity_type']},
+                {'$set': {'count': row['count']}},
+                upsert=True
+            )
+            for row in logs.aggregate(pipeline, allowDiskUse=True)
+        ]
+        for offset in range(0, len(operations), 1000):
+            counters.bulk_write(operations[offset:offset + 1000], ordered=False)
+        rebuilt[counters.name] = len(operations)
+    
+    return rebuilt
+
+
+# =================== BUFFERED WRITER ===================
+
+_writer_settings = {
+    'buffer_size': 10000,
+    'batch_size': 500,
+    'flush_interval': 1.0
+}
+_buffer = deque()
+_buffer_lock = threading.Lock()
+_flush_now = threading.Event()
+_flusher = None
+_db = None
+
+_writer_stats = {
+    'buffered': 0,
+    'written': 0,
+    'batches': 0,
+    'overflows': 0,
+    'failed': 0
+}
+
+
+def configure_activity_writer(app):
+    """Apply buffer settings and register the exit flush (called once at startup; buffer size 0 = write directly)"""
+    global _db
+    with _buffer_lock:
+        _db = app.db
+        _writer_settings['buffer_size'] = app.config.get('ACTIVITY_BUFFER_SIZE', 10000)
+        _writer_settings['batch_size'] = max(1, app.config.get('ACTIVITY_BATCH_SIZE', 500))
+        _writer_settings['flush_interval'] = app.config.get('ACTIVITY_FLUSH_INTERVAL', 1.0)
+    atexit.unregister(flush_activity_logs)
+    atexit.register(flush_activity_logs)
+
+
+def buffer_activity_entry(collection_name, log_entry):
+    """
+    Queue an entry for the next batch insert
+
+    Returns:
+        False when buffering is off or the buffer is full (the caller writes it directly)
+    """
+    with _buffer_lock:
+        if _db is None or _writer_settings['buffer_size'] <= 0:
+            return False
+        if len(_buffer) >= _writer_settings['buffer_size']:
+            _writer_stats['overflows'] += 1
+            return False
+        _buffer.append((collection_name, log_entry))
+        _writer_stats['buffered'] += 1
+        full_batch = len(_buffer) >= _writer_settings['batch_size']
+    _start_flusher()
+    if full_batch:
+        _flush_now.set()
+    return True
+
+
+def _start_flusher():
+    global _flusher
+    if _flusher is not None:
+        return
+    with _buffer_lock:
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_loop, name='activity-flusher', daemon=True)
+            _flusher.start()
+
+
+def _flush_loop():
+    while True:
+        _flush_now.wait(_writer_settings['flush_interval'])
+        _flush_now.clear()
+        try:
+            flush_activity_logs()
+        except Exception as e:
+            print(f"Activity flush error: {e}")
+
+
+def flush_activity_logs():
+    """Write everything buffered so far, one insert_many per batch and collection"""
+    while True:
+        with _buffer_lock:
+            count = min(len(_buffer), _writer_settings['batch_size'])
+            batch = [_buffer.popleft() for _ in range(count)]
+        if not batch:
+            return
+        _write_batch(batch)
+
+
+def _write_batch(batch):
+    by_collection = {}
+    for collection_name, log_entry in batch:
+        by_collection.setdefault(collection_name, []).append(log_entry)
+
+    for collection_name, entries in by_collection.items():
+        written, failed = len(entries), 0
+        inserted = entries
+        try:
+            _db[collection_name].insert_many(entries, ordered=False)
+        except BulkWriteError as e:
+            # Duplicate _ids were already written; anything else is lost
+            errors = e.details.get('writeErrors', [])
+            failed = sum(1 for error in errors if error.get('code') != 11000)
+            written = e.details.get('nInserted', 0)
+            rejected = {error['index'] for error in errors}
+            inserted = [entry for index, entry in enumerate(entries) if index not in rejected]
+        except Exception as e:
+            written, failed, inserted = 0, len(entries), []
+            print(f"Activity log batch error ({len(entries)} entries): {e}")
+        try:
+            increment_activity_counters(_db, collection_name, inserted)
+        except Exception as e:
+            print(f"Activity counter update error: {e}")
+        with _buffer_lock:
+            _writer_stats['written'] += written
+            _writer_stats['failed'] += failed
+            _writer_stats['batches'] += 1
+
+
+def get_activity_writer_stats():
+    """Buffered writer counters for this worker"""
+    with _buffer_lock:
+        stats = dict(_writer_stats)
+        stats['pending'] = len(_buffer)
+        stats.update(_writer_settings)
+    return stats
+
+
 def log_activity(
     activity_type,
     description=None,
@@ -104,66 +453,23 @@ def log_activity(
         tenant_id: Override tenant ID (for auth events)
     """
     try:
-        # Get current user info if not provided
-        if not user_id:
-            try:
-                user = get_current_user()
-                user_id = user.get('_id')
-                user_name = user.get('name') or user.get('email', 'Unknown')
-                tenant_id = user.get('tenant_id')
-            except:
-                user_id = None
-                user_name = 'System'
-        
-        # Get IP address
-        ip_address = None
-        try:
-            ip_address = request.remote_addr
-        except:
-            pass
-        
-        # Get user agent
-        user_agent = None
-        try:
-            user_agent = request.headers.get('User-Agent', '')[:200]  # Limit length
-        except:
-            pass
-        
-        # Build log entry
-        log_entry = {
-            'activity_type': activity_type,
-            'description': description or ACTIVITY_TYPES.get(activity_type, activity_type),
-            'entity_type': entity_type,
-            'entity_id': ObjectId(entity_id) if entity_id and ObjectId.is_valid(str(entity_id)) else str(entity_id) if entity_id else None,
-            'entity_name': entity_name,
-            'user_id': ObjectId(user_id) if user_id and ObjectId.is_valid(str(user_id)) else user_id,
-            'user_name': user_name,
-            'ip_address': ip_address,
-            'user_agent': user_agent,
-            'old_values': old_values,
-            'new_values': new_values,
-            'metadata': metadata or {},
-            'timestamp': get_current_utc_time()
-        }
-        
-        # Add tenant info
-        if tenant_id:
-            log_entry['tenant_id'] = ObjectId(tenant_id) if ObjectId.is_valid(str(tenant_id)) else tenant_id
-        elif is_demo_request():
-            try:
-                user = get_current_user()
-                log_entry['demo_user_id'] = user['_id']
-            except:
-                pass
-        else:
-            try:
-                user = get_current_user()
-                log_entry['tenant_id'] = ObjectId(user['tenant_id'])
-            except:
-                pass
+        log_entry = build_activity_entry(
+            activity_type,
+            description=description,
+            entity_type=entity_type,
+            entity_id=entity_id,
+            entity_name=entity_name,
+            old_values=old_values,
+            new_values=new_values,
+            metadata=metadata,
+            user_id=user_id,
+            user_name=user_name,
+            tenant_id=tenant_id
+        )
         
-        # Insert log
-        get_activity_logs_collection().insert_one(log_entry)
+        # Queue for the next batch insert (written directly when the buffer is full)
+        if not buffer_activity_entry(get_collection_name('activity_logs'), log_entry):
+            write_activity_entry(log_entry)
         
         return True
         
@@ -173,6 +479,56 @@ def log_activity(
         return False
 
 
+def _build_log_filter(activity_type=None, entity_type=None, entity_id=None, user_id=None, start_date=None, end_date=None):
+    """Activity log query for the current tenant"""
+    filter_query = get_tenant_filter()
+    
+    if activity_type:
+        filter_query['activity_type'] = activity_type
+    
+    if entity_type:
+        filter_query['entity_type'] = entity_type
+    
+    if entity_id:
+        filter_query['entity_id'] = ObjectId(entity_id) if ObjectId.is_valid(str(entity_id)) else entity_id
+    
+    if user_id:
+        filter_query['user_id'] = ObjectId(user_id) if ObjectId.is_valid(str(user_id)) else user_id
+    
+    if start_date or end_date:
+        filter_query['timestamp'] = {}
+        if start_date:
+            filter_query['timestamp']['$gte'] = start_date
+        if end_date:
+            filter_query['timestamp']['$lte'] = end_date
+    
+    return filter_query
+
+
+def _archive_args(filter_query, start_date):
+    """
+    (owner filter, match) to look a log query up in the archive, or None
+    None unless the range starts before the tenant's hot window (demo logs are never archived)
+    """
+    if not start_date or filter_query.get('tenant_id') is None:
+        return None
+    owner_filter = {'tenant_id': filter_query['tenant_id']}
+    cutoff = get_hot_cutoff(get_retention_days(owner_filter))
+    if start_date.replace(tzinfo=start_date.tzinfo or timezone.utc) >= cutoff:
+        return None
+    match = {key: value for key, value in filter_query.items() if key not in ('tenant_id', 'timestamp')}
+    return owner_filter, match
+
+
+def _archived_logs(filter_query, start_date, end_date, skip=0):
+    """Archived entries matching a log query, newest first, after the first skip"""
+    archive_args = _archive_args(filter_query, start_date)
+    if archive_args is None:
+        return iter(())
+    owner_filter, match = archive_args
+    return read_archived_logs('activity_logs', owner_filter, start_date, end_date, match, skip=skip)
+
+
 def get_activity_logs(
     activity_type=None,
     entity_type=None,
@@ -185,40 +541,29 @@ def get_activity_logs(
 ):
     """
     Retrieve activity logs with filtering
+    Ranges that start before the retention window continue into the archives.
     
     Returns:
         List of activity log entries
     """
     try:
-        filter_query = get_tenant_filter()
-        
-        if activity_type:
-            filter_query['activity_type'] = activity_type
-        
-        if entity_type:
-            filter_query['entity_type'] = entity_type
-        
-        if entity_id:
-            filter_query['entity_id'] = ObjectId(entity_id) if ObjectId.is_valid(str(entity_id)) else entity_id
-        
-        if user_id:
-            filter_query['user_id'] = ObjectId(user_id) if ObjectId.is_valid(str(user_id)) else user_id
-        
-        if start_date or end_date:
-            filter_query['timestamp'] = {}
-            if start_date:
-                filter_query['timestamp']['$gte'] = start_date
-            if end_date:
-                filter_query['timestamp']['$lte'] = end_date
+        filter_query = _build_log_filter(activity_type, entity_type, entity_id, user_id, start_date, end_date)
+        collection = get_activity_logs_collection()
         
         logs = list(
-            get_activity_logs_collection()
+            collection
             .find(filter_query)
             .sort('timestamp', -1)
             .skip(skip)
             .limit(limit)
         )
         
+        # Hot entries are all newer than archived ones - page on into the archive
+        if len(logs) < limit:
+            hot_total = skip + len(logs) if logs else collection.count_documents(filter_query)
+            archived = _archived_logs(filter_query, start_date, end_date, skip=max(0, skip - hot_total))
+            logs.extend(islice(archived, limit - len(logs)))
+        
         return logs
         
     except Exception as e:
@@ -226,9 +571,82 @@ def get_activity_logs(
         return []
 
 
+def _utc(value):
+    """Hot entries and cursors hold naive UTC datetimes, archived entries aware ones"""
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def get_activity_log_page(
+    activity_type=None,
+    entity_type=None,
+    entity_id=None,
+    user_id=None,
+    start_date=None,
+    end_date=None,
+    limit=50,
+    cursor=None
+):
+    """
+    One keyset page of activity logs, newest first (see app.utils.pagination)
+    Like get_activity_logs, ranges that start before the retention window
+    continue into the archives once the hot entries run out.
+    
+    Returns:
+        Dict with items, next_cursor (None on the last page) and has_more
+    """
+    filter_query = _build_log_filter(activity_type, entity_type, entity_id, user_id, start_date, end_date)
+    page = keyset_paginate(get_activity_logs_collection(), filter_query, 'timestamp', limit=limit, cursor=cursor)
+    if page['has_more']:
+        return page
+    
+    # Continue after the last hot entry (or the cursor, when it already points into the archive)
+    if page['items']:
+        position = (page['items'][-1]['timestamp'], page['items'][-1]['_id'])
+    elif cursor:
+        position = decode_cursor(cursor)
+    else:
+        position = None
+    
+    archive_end = end_date
+    if position:
+        position = (_utc(position[0]), position[1])
+        archive_end = min(_utc(end_date), position[0]) if end_date else position[0]
+    archived = _archived_logs(filter_query, start_date, archive_end)
+    if position:
+        archived = (entry for entry in archived if (entry['timestamp'], entry['_id']) < position)
+    
+    missing = limit - len(page['items'])
+    extra = list(islice(archived, missing + 1))
+    page['items'].extend(extra[:missing])
+    page['has_more'] = len(extra) > missing
+    if page['has_more']:
+        last = page['items'][-1]
+        page['next_cursor'] = encode_cursor(last['timestamp'], last['_id'])
+    return page
+
+
+def count_activity_logs(
+    activity_type=None,
+    entity_type=None,
+    entity_id=None,
+    user_id=None,
+    start_date=None,
+    end_date=None
+):
+    """Count the entries get_activity_logs pages through (hot plus archived)"""
+    filter_query = _build_log_filter(activity_type, entity_type, entity_id, user_id, start_date, end_date)
+    total = get_activity_logs_collection().count_documents(filter_query)
+    archive_args = _archive_args(filter_query, start_date)
+    if archive_args is not None:
+        owner_filter, match = archive_args
+        total += count_archived_logs('activity_logs', owner_filter, start_date, end_date, match)
+    return total
+
+
 def get_activity_summary(days=7):
     """
     Get summary statistics of activity logs
+    Counts come from the daily counters and cover the last `days` calendar days (UTC), today included.
     
     Args:
         days: Number of days to look back
@@ -240,41 +658,23 @@ def get_activity_summary(days=7):
         from datetime import timedelta
         
         end_date = get_current_utc_time()
-        start_date = end_date - timedelta(days=days)
-        
-        filter_query = {
-            **get_tenant_filter(),
-            'timestamp': {'$gte': start_date, '$lte': end_date}
-        }
-        
-        collection = get_activity_logs_collection()
+        start_day = _start_of_day(end_date) - timedelta(days=max(days, 1) - 1)
         
         # Get counts by type
-        pipeline = [
-            {'$match': filter_query},
-            {'$group': {
-                '_id': '$activity_type',
-                'count': {'$sum': 1}
-            }},
-            {'$sort': {'count': -1}}
-        ]
-        
-        type_counts = list(collection.aggregate(pipeline))
+        counts = get_activity_counts(start_day, end_date)
+        by_type = dict(sorted(counts.items(), key=lambda item: item[1], reverse=True))
         
         # Get recent activity
         recent = list(
-            collection
-            .find(filter_query)
+            get_activity_logs_collection()
+            .find({**get_tenant_filter(), 'timestamp': {'$gte': start_day, '$lte': end_date}})
             .sort('timestamp', -1)
             .limit(10)
         )
         
-        # Total count
-        total = collection.count_documents(filter_query)
-        
         return {
-            'total': total,
-            'by_type': {item['_id']: item['count'] for item in type_counts},
+            'total': sum(by_type.values()),
+            'by_type': by_type,
             'recent': recent,
             'period_days': days
         }
@@ -0,0 +1,253 @@
+"""
+Aging Service - Aged receivables and payables, computed by the database
+Open documents are bucketed by age in days with one $bucket aggregation, so
+the summary costs one pass over the matching index entries and returns a
+handful of totals however many documents are open. Detail rows of a bucket
+are a created_at range and are read a keyset page at a time.
+
+Buckets are given by their upper edges in days, e.g. (30, 60, 90):
+current (0-30), days_31_60, days_61_90 and over_90. Ages are counted at an
+as-of date (default now); documents created after it are left out. Amounts
+due are the documents' current ones - payments made after the as-of date
+are not reversed.
+"""
+from datetime import datetime, timedelta, timezone
+from flask import request
+from pymongo import DESCENDING
+from app.utils.helpers import get_current_utc_time
+from app.utils.pagination import keyset_paginate
+
+
+DEFAULT_AGING_EDGES = (30, 60, 90)
+MAX_AGING_EDGES = 12
+
+DAY_MS = 24 * 3600 * 1000
+
+OPEN_STATUSES = ['unpaid', 'partial']
+
+# What is aged in each report
+AGING_REPORTS = {
+    'receivables': {
+        'filter': {'payment_type': 'credit', 'payment_status': {'$in': OPEN_STATUSES}},
+        'number': 'receipt_number',
+        'party_id': 'customer_id',
+        'party_name': 'customer_name',
+        'total': 'total_amount',
+        'due': '$amount_due',
+        'due_defaults_to_total': False,
+    },
+    'payables': {
+        'filter': {'payment_status': {'$in': OPEN_STATUSES}},
+        'number': 'po_number',
+        'party_id': 'supplier_id',
+        'party_name': 'supplier_name',
+        'total': 'total',
+        # POs saved before payment tracking have no amount_due
+        'due': {'$ifNull': ['$amount_due', '$total']},
+        'due_defaults_to_total': True,
+    },
+}
+
+
+# =================== PARAMETERS ===================
+
+def bucket_keys(edges):
+    """Bucket names for upper edges (30, 60, 90) -> current, days_31_60, days_61_90, over_90"""
+    keys = ['current']
+    for lower, upper in zip(edges, edges[1:]):
+        keys.append(f'days_{lower + 1}_{upper}')
+    keys.append(f'over_{edges[-1]}')
+    return keys
+
+
+def parse_edges(value):
+    """Bucket edges from '30,60,90'; raises ValueError unless they are increasing positive days"""
+    try:
+        edges = tuple(int(edge) for edge in value.split(','))
+    except ValueError:
+        raise ValueError('buckets must be a comma-separated list of days, e.g. 30,60,90')
+    if not edges or len(edges) > MAX_AGING_EDGES:
+        raise ValueError(f'buckets takes 1 to {MAX_AGING_EDGES} edges')
+    if edges[0] < 1 or any(lower >= upper for lower, upper in zip(edges, edges[1:])):
+        raise ValueError('bucket edges must be positive and increasing')
+    return edges
+
+
+def parse_as_of(value):
+    """As-of time from a date (the end of that day) or ISO timestamp; raises ValueError"""
+    try:
+        if len(value) == 10:
+            return datetime.strptime(value, '%Y-%m-%d').replace(tzinfo=timezone.utc) + timedelta(days=1, microseconds=-1)
+        as_of = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError('as_of must be a date (YYYY-MM-DD) or an ISO timestamp')
+    return as_of if as_of.tzinfo else as_of.replace(tzinfo=timezone.utc)
+
+
+def get_aging_args():
+    """(edges, as_of) from the query string (?buckets=30,60,90&as_of=2026-01-31)"""
+    edges = parse_edges(request.args['buckets']) if request.args.get('buckets') else DEFAULT_AGING_EDGES
+    as_of = parse_as_of(request.args['as_of']) if request.args.get('as_of') else get_current_utc_time()
+    return edges, as_of
+
+
+# =================== SUMMARY ===================
+
+def _age_expression(as_of):
+    """Whole days between created_at and the as-of time"""
+    return {'$floor': {'$divide': [{'$subtract': [as_of, '$created_at']}, DAY_MS]}}
+
+
+def _bucket_ranges(edges):
+    """[(key, min days, max days or None)] for the edges"""
+    lowers = [0] + [edge + 1 for edge in edges]
+    uppers = list(edges) + [None]
+    return list(zip(bucket_keys(edges), lowers, uppers))
+
+
+def age_summary(collection, owner_filter, report, edges=DEFAULT_AGING_EDGES, as_of=None, subtotals=False):
+    """
+    Totals per age bucket of one owner's open documents
+
+    Args:
+        collection: Sales (receivables) or purchase orders (payables) collection
+        owner_filter: {'tenant_id': ...} or {'demo_user_id': ...}
+        report: Key of AGING_REPORTS
+        edges: Upper bucket edges in days
+        as_of: Time ages are counted at (default now)
+        subtotals: Also total per customer / supplier
+
+    Returns:
+        Dict with buckets ({key: {min_days, max_days, total, count}} in age order), grand_total, count and,
+        with subtotals, parties ([{party id, party name, total, count, <bucket key>: amount}]
+        largest first)
+    """
+    config = AGING_REPORTS[report]
+    as_of = as_of or get_current_utc_time()
+    ranges = _bucket_ranges(edges)
+    keys = [key for key, _, _ in ranges]
+
+    project = {'age': _age_expression(as_of), 'due': config['due']}
+    by_bucket = [{'$bucket': {
+        'groupBy': '$age',
+        'boundaries': [lower for _, lower, _ in ranges],
+        # Everything past the last edge
+        'default': keys[-1],
+        'output': {'total': {'$sum': '$due'}, 'count': {'$sum': 1}}
+    }}]
+    pipeline = [{'$match': {**owner_filter, **config['filter'], 'created_at': {'$lte': as_of}}}]
+
+    if subtotals:
+        project['party_id'] = f"${config['party_id']}"
+        project['party_name'] = f"${config['party_name']}"
+        by_party = {
+            '_id': '$party_id',
+            'name': {'$first': '$party_name'},
+            'total': {'$sum': '$due'},
+            'count': {'$sum': 1}
+        }
+        for key, lower, upper in ranges:
+            in_bucket = [{'$gte': ['$age', lower]}] + ([{'$lte': ['$age', upper]}] if upper is not None else [])
+            by_party[key] = {'$sum': {'$cond': [{'$and': in_bucket}, '$due', 0]}}
+        pipeline += [
+            {'$project': project},
+            {'$facet': {
+                'buckets': by_bucket,
+                'parties': [{'$group': by_party}, {'$sort': {'total': -1, '_id': 1}}]
+            }}
+        ]
+        result = next(collection.aggregate(pipeline))
+        rows, party_rows = result['buckets'], result['parties']
+    else:
+        pipeline += [{'$project': project}] + by_bucket
+        rows, party_rows = list(collection.aggregate(pipeline)), None
+
+    # $bucket leaves out empty buckets and names the others by their lower edge
+    key_of = {lower: key for key, lower, _ in ranges}
+    buckets = {key: {'min_days': lower, 'max_days': upper, 'total': 0, 'count': 0} for key, lower, upper in ranges}
+    for row in rows:
+        buckets[key_of.get(row['_id'], row['_id'])].update(total=round(row['total'], 2), count=row['count'])
+
+    summary = {
+        'buckets': buckets,
+        'grand_total': round(sum(bucket['total'] for bucket in buckets.values()), 2),
+        'count': sum(bucket['count'] for bucket in buckets.values())
+    }
+    if party_rows is not None:
+        summary['parties'] = [
+            {
+                config['party_id']: row['_id'],
+                config['party_name']: row.get('name') or 'Unknown',
+                'total': round(row['total'], 2),
+                'count': row['count'],
+                **{key: round(row[key], 2) for key in keys}
+            }
+            for row in party_rows
+        ]
+    return summary
+
+
+# =================== DETAIL ===================
+
+def _detail_row(config, document, as_of):
+    created_at = document['created_at']
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    total = document.get(config['total'], 0)
+    due = document.get('amount_due')
+    if due is None:
+        due = total if config['due_defaults_to_total'] else 0
+    return {
+        '_id': document['_id'],
+        config['number']: document.get(config['number']),
+        config['party_name']: document.get(config['party_name'], 'Unknown'),
+        config['party_id']: document.get(config['party_id']),
+        'date': created_at,
+        'total': total,
+        'paid': document.get('amount_paid', 0),
+        'due': due,
+        'days_old': (as_of - created_at).days,
+        'due_date': document.get('due_date')
+    }
+
+
+def age_bucket_page(collection, owner_filter, report, bucket, edges=DEFAULT_AGING_EDGES, as_of=None, limit=50, cursor=None):
+    """
+    One keyset page (newest first) of the open documents in an age bucket
+
+    Args:
+        bucket: Key from bucket_keys(edges)
+        limit, cursor: As for keyset_paginate
+        (other arguments as for age_summary)
+
+    Returns:
+        Dict with items (detail rows), next_cursor and has_more
+
+    Raises:
+        ValueError: For a bucket that is not one of the edges' buckets
+    """
+    config = AGING_REPORTS[report]
+    as_of = as_of or get_current_utc_time()
+    ranges = {key: (lower, upper) for key, lower, upper in _bucket_ranges(edges)}
+    if bucket not in ranges:
+        raise ValueError(f"Unknown bucket: {bucket} (expected one of {', '.join(ranges)})")
+    lower, upper = ranges[bucket]
+
+    # age >= lower and age <= upper, as a created_at range the index can serve
+    created_at = {'$lte': as_of - timedelta(days=lower)}
+    if upper is not None:
+        created_at['$gt'] = as_of - timedelta(days=upper + 1)
+
+    fields = (config['number'], config['party_id'], config['party_name'], config['total'],
+              'amount_paid', 'amount_due', 'due_date', 'created_at')
+    page = keyset_paginate(
+        collection,
+        {**owner_filter, **config['filter'], 'created_at': created_at},
+        'created_at',
+        DESCENDING,
+        limit=limit,
+        cursor=cursor,
+        projection={field: 1 for field in fields}
+    )
+    page['items'] = [_detail_row(config, document, as_of) for document in page['items']]
+    return page
@@ -0,0 +1,138 @@
+"""
+Authorization Service - Claims-embedded authorization (AUTH_CLAIMS_MODE)
+Access tokens carry the user's tenant, role and modules plus the tenant's
+enabled modules, so tenant_required/module_required can authorize without
+reading users or tenants.
+
+Revocation is versioned: every change to a tenant's modules/license or to
+one of its users' role/status bumps the tenant's version in authz_versions.
+Tokens minted with an older version stop being trusted and the request falls
+back to the database checks until the client refreshes its token. Versions
+are read through a short-TTL cache (AUTHZ_VERSION_CACHE_TTL seconds), which
+bounds how long another worker keeps trusting revoked claims.
+"""
+from flask import current_app
+from bson import ObjectId
+from pymongo import ReturnDocument
+from app.utils.helpers import get_current_utc_time
+from app.utils.cache import get_cache
+
+
+AUTHZ_COLLECTION = 'authz_versions'
+
+# tenant _id (str) -> current authz version
+authz_version_cache = get_cache('authz_versions', ttl=5)
+
+
+def get_authz_collection():
+    return current_app.db[AUTHZ_COLLECTION]
+
+
+def is_claims_mode():
+    """Check if access tokens carry authorization claims"""
+    return current_app.config.get('AUTH_CLAIMS_MODE', False)
+
+
+def get_authz_version(tenant_id, fresh=False):
+    """
+    Get the current authz version of a tenant
+
+    Args:
+        tenant_id: Tenant _id
+        fresh: Skip the cache (used when minting tokens)
+    """
+    key = str(tenant_id)
+    if not fresh:
+        cached = authz_version_cache.get(key)
+        if cached is not None:
+            return cached
+
+    doc = get_authz_collection().find_one({'_id': key}, {'version': 1})
+    version = doc.get('version', 0) if doc else 0
+    authz_version_cache.set(key, version)
+    return version
+
+
+def bump_authz_version(tenant_id):
+    """Invalidate authorization claims in every token issued for a tenant"""
+    if not tenant_id:
+        return
+    key = str(tenant_id)
+    try:
+        doc = get_authz_collection().find_one_and_update(
+            {'_id': key},
+            {
+                '$inc': {'version': 1},
+                '$set': {'updated_at': get_current_utc_time()}
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        authz_version_cache.set(key, doc['version'])
+    except Exception as e:
+        authz_version_cache.invalidate(key)
+        print(f"Error bumping authz version for tenant {key}: {str(e)}")
+
+
+def build_authz_claims(user_id):
+    """
+    Build the additional access token claims for a tenant user
+
+    The version is read before the user and tenant, so a change that lands
+    in between makes the new token stale instead of trusted.
+
+    Returns:
+        Dict of claims (empty when claims mode is off or the user has no tenant)
+    """
+    if not is_claims_mode():
+        return {}
+
+    db = current_app.db
+    user = db.users.find_one({'_id': ObjectId(user_id)})
+    if not user or user.get('is_super_admin') or not user.get('tenant_id'):
+        return {}
+
+    version = get_authz_version(user['tenant_id'], fresh=True)
+    user = db.users.find_one({'_id': user['_id']})
+    tenant = db.tenants.find_one({'_id': ObjectId(user['tenant_id'])}) if user else None
+    if not user or not tenant:
+        return {}
+
+    claims = {
+        'tenant_id': str(user['tenant_id']),
+        'allowed_modules': user.get('allowed_modules', []),
+        'enabled_modules': tenant.get('enabled_modules', []),
+        'authz_ver': version,
+        'email': user.get('email'),
+        'username': user.get('username'),
+        'name': user.get('name')
+    }
+    if user.get('role'):
+        claims['role'] = user['role']
+    return claims
+
+
+def user_from_claims(user_id, claims):
+    """
+    Build a user-like document from verified token claims
+
+    Returns:
+        User dict, or None when the token has no claims or they were revoked
+    """
+    if not is_claims_mode() or 'authz_ver' not in claims or not claims.get('tenant_id'):
+        return None
+
+    if claims['authz_ver'] != get_authz_version(claims['tenant_id']):
+        return None
+
+    user = {
+        '_id': ObjectId(user_id),
+        'tenant_id': ObjectId(claims['tenant_id']),
+        'allowed_modules': claims.get('allowed_modules', []),
+        'is_super_admin': False,
+        'is_active': True
+    }
+    for field in ('role', 'email', 'username', 'name'):
+        if claims.get(field) is not None:
+            user[field] = claims[field]
+    return user
@@ -0,0 +1,113 @@
+"""
+In-process Cache - TTL + LRU caches shared by the request handlers of a worker
+Used for documents that are read on every request (users, tenants) and are
+invalidated explicitly by the code paths that write them
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries expire after a fixed time-to-live
+
+    Values are deep-copied in and out so callers can mutate what they get back
+    (request handlers routinely add keys to user documents) without corrupting
+    the cached copy. A ttl of 0 disables the cache.
+    """
+
+    def __init__(self, name, maxsize=1024, ttl=30):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    def configure(self, maxsize=None, ttl=None):
+        """Change size/ttl (called once at startup from app config)"""
+        with self._lock:
+            if maxsize is not None:
+                self.maxsize = maxsize
+            if ttl is not None:
+                self.ttl = ttl
+            self._data.clear()
+
+    def get(self, key):
+        """Return a copy of the cached value, or None when missing or expired"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._data[key]
+                self._misses += 1
+                return None
+            self._data.move_to_end(key)
+            self._hits += 1
+            value = entry[1]
+        return copy.deepcopy(value)
+
+    def set(self, key, value, ttl=None):
+        """Cache a value for ttl seconds (defaults to the cache ttl)"""
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0 or value is None:
+            return
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._evictions += 1
+
+    def invalidate(self, *keys):
+        """Drop entries so the next read goes to the database"""
+        with self._lock:
+            for key in keys:
+                if self._data.pop(key, None) is not None:
+                    self._invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._invalidations += len(self._data)
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': round(self._hits / lookups, 4) if lookups else 0,
+                'evictions': self._evictions,
+                'invalidations': self._invalidations
+            }
+
+
+_caches = {}
+_registry_lock = threading.Lock()
+
+
+def get_cache(name, maxsize=1024, ttl=30):
+    """Get (or create) the named cache for this worker"""
+    with _registry_lock:
+        cache = _caches.get(name)
+        if cache is None:
+            cache = _caches[name] = TTLCache(name, maxsize=maxsize, ttl=ttl)
+        return cache
+
+
+def get_cache_stats():
+    """Hit/miss statistics of every cache in this worker"""
+    with _registry_lock:
+        caches = list(_caches.values())
+    return {cache.name: cache.stats() for cache in caches}
@@ -0,0 +1,109 @@
+"""
+Catalog Service - Compact, delta-syncable product catalog for POS terminals
+Terminals keep a local copy of the catalog and poll with the version of
+their last sync. Products are sent as columns (one list per field) and
+deletes as tombstones, so a quiet poll costs a few hundred bytes.
+
+Versions are millisecond timestamps derived from the data (max updated_at /
+deleted_at), so the same catalog always encodes to the same bytes and can be
+served with a strong ETag. Deltas re-read a small overlap window before the
+client's version to cover writes that committed out of timestamp order;
+clients apply rows as upserts, so repeats are harmless.
+"""
+from datetime import datetime, timezone, timedelta
+from app.utils.helpers import get_current_utc_time, get_demo_collection_name
+
+
+CATALOG_FIELDS = ('sku', 'barcode', 'name', 'price', 'stock', 'category')
+CATALOG_COLUMNS = ('id',) + CATALOG_FIELDS
+
+TOMBSTONES_COLLECTION = 'product_tombstones'
+TOMBSTONE_RETENTION_DAYS = 30
+SYNC_OVERLAP_MS = 5000
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def to_version(value):
+    """datetime -> catalog version (ms since epoch)"""
+    if not value:
+        return 0
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int((value - _EPOCH).total_seconds() * 1000)
+
+
+def from_version(version):
+    """catalog version (ms since epoch) -> datetime"""
+    return _EPOCH + timedelta(milliseconds=version)
+
+
+def get_tombstones_collection(products_collection):
+    """Tombstones live next to the products collection they belong to"""
+    name = TOMBSTONES_COLLECTION
+    if products_collection.name == get_demo_collection_name('products'):
+        name = get_demo_collection_name(TOMBSTONES_COLLECTION)
+    return products_collection.database[name]
+
+
+def record_product_deleted(products_collection, owner_filter, product_id):
+    """Leave a tombstone so syncing terminals drop the product"""
+    get_tombstones_collection(products_collection).insert_one({
+        **owner_filter,
+        'product_id': str(product_id),
+        'deleted_at': get_current_utc_time()
+    })
+
+
+def build_catalog(products_collection, owner_filter, since=None):
+    """
+    Build the columnar catalog payload
+
+    Args:
+        products_collection: Products collection (regular or demo)
+        owner_filter: tenant_id / demo_user_id filter
+        since: Version of the client's last sync (None for a full catalog)
+
+    Returns:
+        Dict with version, full flag, columns, products (column -> values) and deleted ids
+    """
+    oldest_delta = to_version(get_current_utc_time() - timedelta(days=TOMBSTONE_RETENTION_DAYS))
+    full = not since or since < oldest_delta
+
+    query = dict(owner_filter)
+    deleted = []
+    version = 0 if full else since
+    if not full:
+        changed_after = from_version(max(0, since - SYNC_OVERLAP_MS))
+        query['updated_at'] = {'$gte': changed_after}
+
+        tombstones = get_tombstones_collection(products_collection).find(
+            {**owner_filter, 'deleted_at': {'$gte': changed_after}},
+            {'product_id': 1, 'deleted_at': 1}
+        ).sort('deleted_at', 1)
+        for tombstone in tombstones:
+            deleted.append(tombstone['product_id'])
+            version = max(version, to_version(tombstone['deleted_at']))
+
+    projection = {field: 1 for field in CATALOG_FIELDS}
+    projection.update({'updated_at': 1, 'created_at': 1})
+
+    columns = {column: [] for column in CATALOG_COLUMNS}
+    for product in products_collection.find(query, projection).sort('_id', 1):
+        columns['id'].append(str(product['_id']))
+        columns['sku'].append(product.get('sku') or '')
+        columns['barcode'].append(product.get('barcode') or '')
+        columns['name'].append(product.get('name') or '')
+        columns['price'].append(float(product.get('price') or 0))
+        columns['stock'].append(int(product.get('stock') or 0))
+        columns['category'].append(product.get('category') or '')
+        version = max(version, to_version(product.get('updated_at') or product.get('created_at')))
+
+    return {
+        'version': version,
+        'full': full,
+        'columns': list(CATALOG_COLUMNS),
+        'products': columns,
+        'count': len(columns['id']),
+        'deleted': deleted
+    }
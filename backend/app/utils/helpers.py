@@ -18,39 +18,46 @@ def is_demo_request():
     return hasattr(g, 'is_demo') and g.is_demo
 
 
+# Regular collection names mapped to their demo equivalents
+DEMO_COLLECTION_MAPPINGS = {
+    # Inventory
+    'products': 'demo_products',
+    'categories': 'demo_categories',
+    'stock_adjustments': 'demo_stock_adjustments',
+    # POS & Sales
+    'sales_pos': 'demo_sales',
+    'transactions': 'demo_sales',
+    'invoices': 'demo_invoices',
+    'customers': 'demo_customers_crm',
+    # Purchase
+    'suppliers': 'demo_suppliers',
+    'purchase_orders': 'demo_purchase_orders',
+    # HR
+    'employees': 'demo_employees',
+    'attendance': 'demo_attendance',
+    # Accounting
+    'accounts': 'demo_accounts',
+    'journal_entries': 'demo_journal_entries',
+    # Manufacturing
+    'boms': 'demo_boms',
+    'work_orders': 'demo_work_orders',
+    # Assets
+    'assets': 'demo_assets',
+}
+
+
+def get_demo_collection_name(base_name):
+    """Get the demo equivalent of a regular collection name"""
+    return DEMO_COLLECTION_MAPPINGS.get(base_name, f'demo_{base_name}')
+
+
 def get_collection_name(base_name):
     """Get the appropriate collection name based on demo status.
     For demo users, returns 'demo_' prefixed collection.
     For regular users, returns the original collection name.
     """
     if is_demo_request():
-        # Map regular collection names to demo equivalents
-        demo_mappings = {
-            # Inventory
-            'products': 'demo_products',
-            'categories': 'demo_categories',
-            'stock_adjustments': 'demo_stock_adjustments',
-            # POS & Sales
-            'sales_pos': 'demo_sales',
-            'transactions': 'demo_sales',
-            'invoices': 'demo_invoices',
-            'customers': 'demo_customers_crm',
-            # Purchase
-            'suppliers': 'demo_suppliers',
-            'purchase_orders': 'demo_purchase_orders',
-            # HR
-            'employees': 'demo_employees',
-            'attendance': 'demo_attendance',
-            # Accounting
-            'accounts': 'demo_accounts',
-            'journal_entries': 'demo_journal_entries',
-            # Manufacturing
-            'boms': 'demo_boms',
-            'work_orders': 'demo_work_orders',
-            # Assets
-            'assets': 'demo_assets',
-        }
-        return demo_mappings.get(base_name, f'demo_{base_name}')
+        return get_demo_collection_name(base_name)
     return base_name
 
 
@@ -62,7 +69,10 @@ def get_user_id_field():
 
 
 def serialize_doc(doc):
-    """Convert MongoDB document to JSON-serializable dict"""
+    """
+    Convert MongoDB document to JSON-serializable dict
+    Not needed for responses - jsonify encodes ObjectId/datetime itself (app.utils.json_provider)
+    """
     if doc is None:
         return None
     
@@ -100,18 +110,26 @@ def is_valid_email(email):
     return re.match(pattern, email) is not None
 
 
-def paginate(query_result, page=1, per_page=10):
-    """Paginate query results"""
+def paginate(query_result, page=1, per_page=10, total=None):
+    """
+    Paginate query results
+    A cursor passed with its total (count_documents) only fetches the page;
+    anything else is materialized and sliced. Numbered pages still skip -
+    large listings use keyset pages (app.utils.pagination).
+    """
     skip = (page - 1) * per_page
     
-    # Convert cursor to list first to avoid exhaustion issues
-    if hasattr(query_result, '__iter__') and not isinstance(query_result, list):
-        all_items = list(query_result)
+    if total is not None and hasattr(query_result, 'skip'):
+        items = list(query_result.skip(skip).limit(per_page))
     else:
-        all_items = query_result
-    
-    total = len(all_items)
-    items = all_items[skip:skip + per_page]
+        # Convert cursor to list first to avoid exhaustion issues
+        if hasattr(query_result, '__iter__') and not isinstance(query_result, list):
+            all_items = list(query_result)
+        else:
+            all_items = query_result
+        
+        total = len(all_items)
+        items = all_items[skip:skip + per_page]
     
     return {
         'items': items,
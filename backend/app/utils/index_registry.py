@@ -0,0 +1,363 @@
+"""
+Index Registry - Declares the MongoDB indexes every route and service relies on
+Indexes are built by manage_indexes.py (and at startup when AUTO_CREATE_INDEXES is true)
+"""
+from flask import current_app
+from pymongo import IndexModel, ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+from app.utils.helpers import get_demo_collection_name
+from app.utils.catalog_service import TOMBSTONE_RETENTION_DAYS
+
+
+# Tenant-scoped indexes, keyed by regular collection name.
+# Each is declared on 'tenant_id' and mirrored on the demo collection with 'demo_user_id'.
+# Listings paged by keyset (app.utils.pagination) end their sort index with _id.
+TENANT_INDEXES = {
+    # Inventory
+    'products': [
+        [('tenant_id', ASCENDING), ('name', ASCENDING)],
+        [('tenant_id', ASCENDING), ('updated_at', ASCENDING)],
+        [('tenant_id', ASCENDING), ('sku', ASCENDING)],
+        [('tenant_id', ASCENDING), ('barcode', ASCENDING)],
+        [('tenant_id', ASCENDING), ('stock', ASCENDING)],
+        [('tenant_id', ASCENDING), ('category_id', ASCENDING)],
+    ],
+    'categories': [
+        [('tenant_id', ASCENDING), ('name', ASCENDING)],
+    ],
+    'product_tombstones': [
+        [('tenant_id', ASCENDING), ('deleted_at', ASCENDING)],
+    ],
+    'stock_adjustments': [
+        [('tenant_id', ASCENDING), ('created_at', DESCENDING)],
+    ],
+    # POS & Sales
+    'sales_pos': [
+        [('tenant_id', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)],
+        [('tenant_id', ASCENDING), ('payment_type', ASCENDING), ('payment_status', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)],
+        [('tenant_id', ASCENDING), ('receipt_number', ASCENDING)],
+    ],
+    'sales_rollups': [
+        [('tenant_id', ASCENDING), ('day', ASCENDING), ('hour', ASCENDING)],
+    ],
+    'invoices': [
+        [('tenant_id', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)],
+        [('tenant_id', ASCENDING), ('status', ASCENDING)],
+        [('tenant_id', ASCENDING), ('invoice_number', ASCENDING)],
+    ],
+    'customers': [
+        [('tenant_id', ASCENDING), ('name', ASCENDING)],
+    ],
+    'customer_ledger': [
+        [('tenant_id', ASCENDING), ('customer_id', ASCENDING), ('date', DESCENDING)],
+        [('tenant_id', ASCENDING), ('idempotency_key', ASCENDING)],
+    ],
+    # Purchase
+    'suppliers': [
+        [('tenant_id', ASCENDING), ('name', ASCENDING)],
+    ],
+    'purchase_orders': [
+        [('tenant_id', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)],
+        [('tenant_id', ASCENDING), ('payment_status', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)],
+        [('tenant_id', ASCENDING), ('po_number', ASCENDING)],
+    ],
+    'vendor_ledger': [
+        [('tenant_id', ASCENDING), ('vendor_id', ASCENDING), ('date', DESCENDING)],
+        [('tenant_id', ASCENDING), ('idempotency_key', ASCENDING)],
+    ],
+    # HR
+    'employees': [
+        [('tenant_id', ASCENDING), ('employee_id', ASCENDING)],
+    ],
+    'attendance': [
+        [('tenant_id', ASCENDING), ('date', DESCENDING)],
+    ],
+    # Accounting
+    'accounts': [
+        [('tenant_id', ASCENDING), ('code', ASCENDING)],
+    ],
+    'journal_entries': [
+        [('tenant_id', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)],
+        [('tenant_id', ASCENDING), ('entry_number', ASCENDING)],
+        [('tenant_id', ASCENDING), ('idempotency_key', ASCENDING)],
+    ],
+    # Manufacturing & Assets
+    'boms': [
+        [('tenant_id', ASCENDING)],
+    ],
+    'work_orders': [
+        [('tenant_id', ASCENDING), ('created_at', DESCENDING)],
+    ],
+    'assets': [
+        [('tenant_id', ASCENDING)],
+    ],
+    # Activity & Settings
+    'activity_logs': [
+        [('tenant_id', ASCENDING), ('timestamp', DESCENDING), ('_id', DESCENDING)],
+        [('tenant_id', ASCENDING), ('activity_type', ASCENDING), ('timestamp', DESCENDING), ('_id', DESCENDING)],
+        [('tenant_id', ASCENDING), ('entity_type', ASCENDING), ('entity_id', ASCENDING), ('timestamp', DESCENDING), ('_id', DESCENDING)],
+        [('tenant_id', ASCENDING), ('user_id', ASCENDING), ('timestamp', DESCENDING), ('_id', DESCENDING)],
+    ],
+    'activity_counters': [
+        [('tenant_id', ASCENDING), ('day', ASCENDING), ('activity_type', ASCENDING)],
+    ],
+    'settings': [
+        [('tenant_id', ASCENDING)],
+    ],
+}
+
+# Legacy POS transactions (its demo equivalent is demo_sales, covered by sales_pos)
+LEGACY_INDEXES = {
+    'transactions': [
+        [('tenant_id', ASCENDING), ('created_at', DESCENDING)],
+    ],
+}
+
+# Platform collections that are not tenant-scoped
+GLOBAL_INDEXES = {
+    'users': [
+        [('email', ASCENDING)],
+        [('username', ASCENDING)],
+        [('tenant_id', ASCENDING)],
+    ],
+    'tenants': [
+        [('tenant_id', ASCENDING)],
+        [('email', ASCENDING)],
+        [('created_at', DESCENDING), ('_id', DESCENDING)],
+        [('license.status', ASCENDING)],
+        [('license.package_id', ASCENDING)],
+    ],
+    'packages': [
+        [('is_active', ASCENDING), ('price', ASCENDING)],
+    ],
+    'bookings': [
+        [('email', ASCENDING)],
+        [('created_at', DESCENDING)],
+    ],
+    'demo_users': [
+        [('username', ASCENDING)],
+        [('email', ASCENDING)],
+        [('expires_at', ASCENDING)],
+    ],
+    'audit_logs': [
+        [('tenant_id', ASCENDING), ('timestamp', DESCENDING)],
+    ],
+    # Log archive chunks (retention_service), read per owner and day range
+    'activity_logs_archive': [
+        [('tenant_id', ASCENDING), ('day', DESCENDING)],
+    ],
+    'audit_logs_archive': [
+        [('tenant_id', ASCENDING), ('day', DESCENDING)],
+    ],
+    'outbox': [
+        [('status', ASCENDING), ('available_at', ASCENDING)],
+        [('idempotency_key', ASCENDING)],
+    ],
+    # Cross-tenant scan for stranded outbox records (outbox_service.sweep_pending)
+    'sales_pos': [
+        [('outbox_pending.created_at', ASCENDING)],
+    ],
+    get_demo_collection_name('sales_pos'): [
+        [('outbox_pending.created_at', ASCENDING)],
+    ],
+    'purchase_orders': [
+        [('outbox_pending.created_at', ASCENDING)],
+    ],
+    get_demo_collection_name('purchase_orders'): [
+        [('outbox_pending.created_at', ASCENDING)],
+    ],
+}
+
+# Indexes that must be unique {collection: [key lists]} (also declared above)
+UNIQUE_INDEXES = {
+    'outbox': [[('idempotency_key', ASCENDING)]],
+    'activity_counters': [[('tenant_id', ASCENDING), ('day', ASCENDING), ('activity_type', ASCENDING)]],
+    get_demo_collection_name('activity_counters'): [[('demo_user_id', ASCENDING), ('day', ASCENDING), ('activity_type', ASCENDING)]],
+    # One settings document per owner (settings are upserted on it)
+    'settings': [[('tenant_id', ASCENDING)]],
+    get_demo_collection_name('settings'): [[('demo_user_id', ASCENDING)]],
+    # Outbox postings (ledger_service._post_once): a second writer of a key gets DuplicateKeyError
+    'journal_entries': [[('tenant_id', ASCENDING), ('idempotency_key', ASCENDING)]],
+    get_demo_collection_name('journal_entries'): [[('demo_user_id', ASCENDING), ('idempotency_key', ASCENDING)]],
+    'customer_ledger': [[('tenant_id', ASCENDING), ('idempotency_key', ASCENDING)]],
+    get_demo_collection_name('customer_ledger'): [[('demo_user_id', ASCENDING), ('idempotency_key', ASCENDING)]],
+    'vendor_ledger': [[('tenant_id', ASCENDING), ('idempotency_key', ASCENDING)]],
+    get_demo_collection_name('vendor_ledger'): [[('demo_user_id', ASCENDING), ('idempotency_key', ASCENDING)]],
+}
+
+# Fields unique indexes only cover where present (entries posted outside the outbox have no key)
+PARTIAL_UNIQUE_FIELDS = ('idempotency_key',)
+
+# TTL indexes {collection: [(field, expire after seconds)]}, mirrored on demo collections
+TTL_INDEXES = {
+    'product_tombstones': [('deleted_at', TOMBSTONE_RETENTION_DAYS * 24 * 3600)],
+    # expire_at holds the expiry time itself (retention_service)
+    'activity_logs': [('expire_at', 0)],
+}
+
+# TTL indexes on platform collections (not mirrored)
+GLOBAL_TTL_INDEXES = {
+    'audit_logs': [('expire_at', 0)],
+}
+
+
+def _to_demo_keys(keys):
+    """Swap the tenant_id key for demo_user_id"""
+    return [('demo_user_id' if field == 'tenant_id' else field, direction) for field, direction in keys]
+
+
+def get_index_registry():
+    """
+    Expand the declarations into {collection name: [key lists]}
+    including the demo collections mapped in helpers.get_collection_name
+    """
+    registry = {}
+
+    def declare(collection_name, keys):
+        declared = registry.setdefault(collection_name, [])
+        if keys not in declared:
+            declared.append(keys)
+
+    for base_name, index_list in TENANT_INDEXES.items():
+        demo_name = get_demo_collection_name(base_name)
+        for keys in index_list:
+            declare(base_name, keys)
+            declare(demo_name, _to_demo_keys(keys))
+
+    for index_map in (LEGACY_INDEXES, GLOBAL_INDEXES):
+        for collection_name, index_list in index_map.items():
+            for keys in index_list:
+                declare(collection_name, keys)
+
+    for collection_name, field, _ in _ttl_declarations():
+        declare(collection_name, [(field, ASCENDING)])
+
+    return registry
+
+
+def _ttl_declarations():
+    """Expand TTL_INDEXES into (collection name, field, seconds) including demo collections"""
+    for base_name, ttl_list in TTL_INDEXES.items():
+        for field, seconds in ttl_list:
+            for name in (base_name, get_demo_collection_name(base_name)):
+                yield name, field, seconds
+    for collection_name, ttl_list in GLOBAL_TTL_INDEXES.items():
+        for field, seconds in ttl_list:
+            yield collection_name, field, seconds
+
+
+def _index_options(collection_name, keys):
+    """Index options for a declared key list (expireAfterSeconds for TTL indexes, unique)"""
+    for name, field, seconds in _ttl_declarations():
+        if name == collection_name and keys == [(field, ASCENDING)]:
+            return {'expireAfterSeconds': seconds}
+    if keys in UNIQUE_INDEXES.get(collection_name, []):
+        options = {'unique': True}
+        partial = {field: {'$exists': True} for field, _ in keys if field in PARTIAL_UNIQUE_FIELDS}
+        if partial:
+            options['partialFilterExpression'] = partial
+        return options
+    return {}
+
+
+def ensure_indexes(db=None):
+    """
+    Build every declared index that does not exist yet (in the background)
+    An index built before it was declared unique is dropped and rebuilt unique;
+    that fails (OperationFailure) while the collection holds duplicates.
+
+    Returns:
+        Dict of {collection name: [created index names]}
+    """
+    db = db if db is not None else current_app.db
+    created = {}
+
+    for collection_name, index_list in get_index_registry().items():
+        existing = _existing_indexes(db, collection_name)
+        missing = []
+        for keys in index_list:
+            options = _index_options(collection_name, keys)
+            built = existing.get(tuple(keys))
+            if built is None:
+                missing.append(keys)
+            elif options.get('unique') and not built.get('unique'):
+                db[collection_name].drop_index(built['name'])
+                missing.append(keys)
+        if not missing:
+            continue
+        names = db[collection_name].create_indexes([
+            IndexModel(keys, background=True, **_index_options(collection_name, keys))
+            for keys in missing
+        ])
+        created[collection_name] = names
+
+    return created
+
+
+def _existing_indexes(db, collection_name):
+    """{key tuple: {'name', 'unique'}} of the indexes that exist on a collection"""
+    try:
+        info = db[collection_name].index_information()
+    except OperationFailure:
+        return {}
+    return {
+        tuple(_normalize_keys(index['key'])): {'name': name, 'unique': index.get('unique', False)}
+        for name, index in info.items()
+    }
+
+
+def _normalize_keys(keys):
+    """Index keys as reported by the server -> registry format (1.0 -> 1)"""
+    return [(field, int(direction) if isinstance(direction, (int, float)) else direction) for field, direction in keys]
+
+
+def report_indexes(db=None):
+    """
+    Compare the registry with the database
+
+    Returns:
+        Dict of {collection name: {'missing': [...], 'unused': [...], 'undeclared': [...]}}
+        - missing: declared but not built
+        - unused: built and declared but with no recorded accesses since the server started
+        - undeclared: built but not in the registry (candidates for removal)
+    """
+    db = db if db is not None else current_app.db
+    report = {}
+
+    for collection_name, index_list in get_index_registry().items():
+        try:
+            info = db[collection_name].index_information()
+        except OperationFailure:
+            info = {}
+
+        by_keys = {}
+        for name, index in info.items():
+            if name == '_id_':
+                continue
+            by_keys[tuple(_normalize_keys(index['key']))] = name
+
+        usage = {}
+        try:
+            for stat in db[collection_name].aggregate([{'$indexStats': {}}]):
+                usage[stat['name']] = stat.get('accesses', {}).get('ops', 0)
+        except OperationFailure:
+            pass
+
+        declared = {tuple(keys) for keys in index_list}
+        missing = [_index_name(keys) for keys in index_list if tuple(keys) not in by_keys]
+        unused = [name for keys, name in by_keys.items() if keys in declared and usage.get(name) == 0]
+        undeclared = [name for keys, name in by_keys.items() if keys not in declared]
+
+        if missing or unused or undeclared:
+            report[collection_name] = {
+                'missing': missing,
+                'unused': unused,
+                'undeclared': undeclared
+            }
+
+    return report
+
+
+def _index_name(keys):
+    """Default MongoDB index name for a key list"""
+    return '_'.join(f'{field}_{direction}' for field, direction in keys)
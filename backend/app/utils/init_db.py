@@ -1,10 +1,10 @@
 """
 Database initialization utilities
 """
-import bcrypt
 from flask import current_app
 from app.utils.constants import ROLE_SUPER_ADMIN
 from app.utils.helpers import get_current_utc_time
+from app.utils.password_service import hash_password
 
 
 def initialize_super_admin():
@@ -16,10 +16,7 @@ def initialize_super_admin():
     
     if not super_admin:
         # Hash password
-        password_hash = bcrypt.hashpw(
-            current_app.config['SUPER_ADMIN_PASSWORD'].encode('utf-8'),
-            bcrypt.gensalt()
-        ).decode('utf-8')
+        password_hash = hash_password(current_app.config['SUPER_ADMIN_PASSWORD'])
         
         # Create super admin
         super_admin_data = {
@@ -45,3 +42,18 @@ def initialize_super_admin():
         print(f"✅ Super admin created: {current_app.config['SUPER_ADMIN_EMAIL']}")
     else:
         print(f"✅ Super admin already exists")
+
+
+def initialize_indexes():
+    """Build indexes declared in the index registry that do not exist yet"""
+    from app.utils.index_registry import ensure_indexes
+    
+    try:
+        created = ensure_indexes(current_app.db)
+        total = sum(len(names) for names in created.values())
+        if total:
+            print(f"✅ Created {total} indexes across {len(created)} collections")
+        else:
+            print("✅ Indexes up to date")
+    except Exception as e:
+        print(f"⚠️ Index creation failed: {e}")
@@ -0,0 +1,159 @@
+"""
+JSON Provider - Encodes MongoDB documents directly into responses
+Routes hand find()/aggregate() results to jsonify as they are: ObjectId is
+written as its hex string and datetime in ISO 8601 (what serialize_doc used
+to produce) while the response is encoded, in a single pass over the data.
+
+orjson (C) is used when it is installed; anything it can't encode, and
+every call without it, goes through Flask's stdlib encoder with the same
+conversions.
+
+List endpoints over unbounded collections use stream_documents instead of
+jsonify: documents are encoded one at a time as the cursor yields them and
+sent in chunks, so memory stays bounded by a cursor batch and one chunk.
+The first batch is fetched before the response starts, so query errors are
+still reported with an error status.
+"""
+from datetime import datetime
+from itertools import chain, islice
+from bson import ObjectId
+from flask import current_app, request
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+# Documents fetched per cursor round trip / bytes sent per chunk when streaming
+STREAM_BATCH_SIZE = 500
+STREAM_CHUNK_BYTES = 64 * 1024
+
+
+def encode_default(value):
+    """Convert the BSON/Python types JSON has no representation for"""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return DefaultJSONProvider.default(value)
+
+
+class MongoJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that understands ObjectId/datetime (app.json)"""
+
+    default = staticmethod(encode_default)
+
+    def _orjson_option(self, indent=False):
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs:
+            try:
+                return orjson.dumps(obj, default=encode_default, option=self._orjson_option()).decode('utf-8')
+            except TypeError:
+                # e.g. integers beyond 64 bits - the stdlib encoder handles them
+                pass
+        return super().dumps(obj, **kwargs)
+
+    def dumpb(self, obj):
+        """Compact encoding straight to UTF-8 bytes (for streamed responses)"""
+        if orjson is not None:
+            try:
+                return orjson.dumps(obj, default=encode_default, option=self._orjson_option())
+            except TypeError:
+                pass
+        return super().dumps(obj, separators=(',', ':')).encode('utf-8')
+
+    def response(self, *args, **kwargs):
+        if orjson is not None:
+            obj = self._prepare_response_obj(args, kwargs)
+            indent = self.compact is False or (self.compact is None and self._app.debug)
+            try:
+                body = orjson.dumps(
+                    obj,
+                    default=encode_default,
+                    option=self._orjson_option(indent) | orjson.OPT_APPEND_NEWLINE
+                )
+                return self._app.response_class(body, mimetype=self.mimetype)
+            except TypeError:
+                pass
+        return super().response(*args, **kwargs)
+
+
+# =================== STREAMING ===================
+
+def wants_ndjson():
+    """Client asked for one document per line (?format=ndjson or Accept: application/x-ndjson)"""
+    if request.args.get('format') == 'ndjson':
+        return True
+    return request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+
+def stream_documents(cursor, key=None, status=200):
+    """
+    Stream a cursor's documents as a chunked JSON response
+
+    Args:
+        cursor: pymongo cursor (or any iterable of documents)
+        key: Wrap the array as {key: [...]}; None sends a bare array
+        status: HTTP status code
+
+    Returns:
+        Response with a JSON array, or NDJSON (one document per line, no
+        wrapper) when the client asks for it
+    """
+    provider = current_app.json
+    ndjson = wants_ndjson()
+    if hasattr(cursor, 'batch_size'):
+        cursor.batch_size(STREAM_BATCH_SIZE)
+
+    if ndjson:
+        opening, separator, closing = b'', b'\n', b'\n'
+    elif key is None:
+        opening, separator, closing = b'[', b',', b']\n'
+    else:
+        opening, separator, closing = b'{' + provider.dumpb(key) + b':[', b',', b']}\n'
+
+    # Run the query and fetch the first batch now, so a failing query still
+    # reaches the route's error handling instead of cutting off a 200 response
+    documents = iter(cursor)
+    try:
+        head = list(islice(documents, 1))
+    except Exception:
+        if hasattr(cursor, 'close'):
+            cursor.close()
+        raise
+
+    def generate():
+        chunk = bytearray(opening)
+        first = True
+        try:
+            for doc in chain(head, documents):
+                if not first:
+                    chunk += separator
+                first = False
+                chunk += provider.dumpb(doc)
+                if len(chunk) >= STREAM_CHUNK_BYTES:
+                    yield bytes(chunk)
+                    chunk.clear()
+            if not (ndjson and first):
+                chunk += closing
+            yield bytes(chunk)
+        finally:
+            if hasattr(cursor, 'close'):
+                cursor.close()
+
+    return current_app.response_class(
+        generate(),
+        status=status,
+        mimetype=NDJSON_MIMETYPE if ndjson else provider.mimetype
+    )
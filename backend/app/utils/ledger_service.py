@@ -2,10 +2,26 @@
 Ledger Service - Double Entry Accounting Automation
 Handles automatic journal entry creation for business transactions
 """
+from datetime import timedelta
 from flask import current_app, g
 from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
 from app.utils.helpers import get_current_utc_time, is_demo_request, get_collection_name
 from app.middleware.auth import get_current_user
+from app.utils.sequence_service import next_number
+from app.utils.cache import get_cache
+
+# Per-tenant chart of accounts (code -> _id/name/type); balances are never cached
+_account_cache = get_cache('chart_of_accounts', maxsize=1024, ttl=300)
+
+# A posting whose balances have not been marked applied this long after its
+# writer took them on is taken over by a retry (the writer is presumed dead)
+BALANCE_CLAIM_SECONDS = 60
+
+# Balance documents (accounts, customers, suppliers) list the keyed postings
+# whose change they hold until the posting is marked applied (see _post_once)
+APPLIED_POSTINGS_FIELD = 'applied_postings'
 
 # Ledger Account Types
 ACCOUNT_TYPES = {
@@ -100,6 +116,49 @@ def initialize_accounts_for_tenant(tenant_id, demo_user_id=None):
     
     if accounts_to_insert:
         accounts_coll.insert_many(accounts_to_insert)
+        invalidate_account_cache({filter_key: filter_value})
+
+
+def _account_cache_key(owner_filter):
+    field, value = next(iter(owner_filter.items()))
+    return (get_collection_name('accounts'), field, str(value))
+
+
+def get_account_map(owner_filter=None, refresh=False):
+    """
+    Get the tenant's chart of accounts keyed by account code
+
+    Loaded with a single query and cached per tenant, so posting a journal
+    entry does not look up each line's account separately.
+
+    Args:
+        owner_filter: Tenant/demo filter (defaults to the current request's)
+        refresh: Skip the cache and reload from the database
+
+    Returns:
+        Dict of {code: {'_id', 'name', 'type'}}
+    """
+    owner_filter = owner_filter or get_tenant_filter()
+    key = _account_cache_key(owner_filter)
+    if not refresh:
+        accounts = _account_cache.get(key)
+        if accounts is not None:
+            return accounts
+
+    accounts = {}
+    for account in get_accounts_collection().find(owner_filter, {'code': 1, 'name': 1, 'type': 1}):
+        accounts[account['code']] = {
+            '_id': account['_id'],
+            'name': account.get('name'),
+            'type': account.get('type')
+        }
+    _account_cache.set(key, accounts)
+    return accounts
+
+
+def invalidate_account_cache(owner_filter=None):
+    """Drop the cached chart of accounts after accounts are added or changed"""
+    _account_cache.invalidate(_account_cache_key(owner_filter or get_tenant_filter()))
 
 
 def get_account_by_code(code):
@@ -116,7 +175,7 @@ def get_account_by_name(name):
     return get_accounts_collection().find_one(filter_query)
 
 
-def create_journal_entry(description, entries, reference_type=None, reference_id=None):
+def create_journal_entry(description, entries, reference_type=None, reference_id=None, idempotency_key=None):
     """
     Create a double-entry journal entry
     
@@ -125,6 +184,8 @@ def create_journal_entry(description, entries, reference_type=None, reference_id
         entries: List of {account_code, account_name, debit, credit}
         reference_type: Type of source document (sale, purchase, payment, etc.)
         reference_id: ID of source document
+        idempotency_key: Posting key; if an entry with this key exists it is returned
+            instead of posting again (outbox retries), see _post_once
     
     Returns:
         The created journal entry document
@@ -138,16 +199,27 @@ def create_journal_entry(description, entries, reference_type=None, reference_id
     if round(total_debit, 2) != round(total_credit, 2):
         raise ValueError(f"Debits ({total_debit}) must equal Credits ({total_credit})")
     
-    # Generate entry number
     journal_coll = get_journal_entries_collection()
-    count = journal_coll.count_documents(get_tenant_filter())
-    entry_number = f"JE-{count + 1:06d}"
+    owner_filter = get_tenant_filter()
+    if idempotency_key:
+        existing = journal_coll.find_one({**owner_filter, 'idempotency_key': idempotency_key})
+        if existing:
+            # Posted before - completes the balances if that writer stopped short
+            return _post_once(journal_coll, existing, _apply_journal_balances)
+    
+    # Generate entry number
+    entry_number = next_number('journal_entry')
+    
+    # Resolve account IDs from the cached chart of accounts; an unknown code
+    # (e.g. an account added on another worker) forces one reload
+    accounts = get_account_map(owner_filter)
+    if any(entry['account_code'] not in accounts for entry in entries):
+        accounts = get_account_map(owner_filter, refresh=True)
     
     # Transform entries to 'lines' format for frontend compatibility
     lines = []
     for entry in entries:
-        # Get account ID from account code
-        account = get_account_by_code(entry['account_code'])
+        account = accounts.get(entry['account_code'])
         lines.append({
             'account_id': str(account['_id']) if account else None,
             'account_code': entry['account_code'],
@@ -157,10 +229,11 @@ def create_journal_entry(description, entries, reference_type=None, reference_id
         })
     
     # Create journal entry with consistent schema
+    now = get_current_utc_time()
     journal_entry = {
-        **get_tenant_filter(),
+        **owner_filter,
         'entry_number': entry_number,
-        'date': get_current_utc_time(),
+        'date': now,
         'description': description,
         'reference': entry_number,  # Use entry number as reference
         'lines': lines,  # Use 'lines' for frontend compatibility
@@ -171,34 +244,153 @@ def create_journal_entry(description, entries, reference_type=None, reference_id
         'reference_id': ObjectId(reference_id) if reference_id else None,
         'status': 'posted',
         'created_by': user['_id'],
-        'created_at': get_current_utc_time()
+        'created_at': now
     }
+    if idempotency_key:
+        journal_entry['idempotency_key'] = idempotency_key
+
+    return _post_once(journal_coll, journal_entry, _apply_journal_balances)
+
+
+def _apply_journal_balances(journal_entry):
+    """
+    Add a journal entry's lines to its accounts' balances in one round trip
+    For assets and expenses: Debit increases, Credit decreases
+    For liabilities, equity, revenue: Credit increases, Debit decreases
+    """
+    owner_filter = _owner_filter(journal_entry)
+    balance_changes = {}
+    for line in journal_entry['lines']:
+        account = (line.get('account_id'), line['account_code'])
+        balance_changes[account] = balance_changes.get(account, 0) + line.get('debit', 0) - line.get('credit', 0)
 
-    
-    result = journal_coll.insert_one(journal_entry)
-    journal_entry['_id'] = result.inserted_id
-    
-    # Update account balances
     accounts_coll = get_accounts_collection()
-    for entry in entries:
-        account_filter = get_tenant_filter()
-        account_filter['code'] = entry['account_code']
-        
-        # For assets and expenses: Debit increases, Credit decreases
-        # For liabilities, equity, revenue: Credit increases, Debit decreases
-        balance_change = entry.get('debit', 0) - entry.get('credit', 0)
-        
-        accounts_coll.update_one(
-            account_filter,
-            {'$inc': {'balance': balance_change}}
-        )
-    
-    return journal_entry
+    account_filters = []
+    operations = []
+    for (account_id, code), balance_change in balance_changes.items():
+        account_filter = {**owner_filter, '_id': ObjectId(account_id)} if account_id else {**owner_filter, 'code': code}
+        account_filters.append(account_filter)
+        operations.append(UpdateOne(*_balance_update(journal_entry, account_filter, balance_change)))
+
+    if operations:
+        accounts_coll.bulk_write(operations, ordered=False)
+    return accounts_coll, account_filters
+
+
+# =================== IDEMPOTENT POSTING ===================
+
+def _owner_filter(record):
+    return {field: record[field] for field in ('tenant_id', 'demo_user_id') if field in record}
+
+
+def _post_once(collection, record, apply_balances):
+    """
+    Insert a posting record and apply its balance changes, once per idempotency key
+
+    A keyed record is inserted with balances_applied False and marked True once
+    apply_balances(record) has run, so a retry that finds the key completes a
+    posting whose writer stopped in between instead of skipping its balances.
+    Records from before the marker have no balances_applied and count as applied.
+
+    Each balance document takes a keyed posting's change in the same update that
+    adds the posting's _id to its applied_postings, and only while the _id is not
+    there, so a retry after a writer stopped part way re-adds none of the changes
+    already made. The _ids are pulled again once the record is marked applied.
+
+    Args:
+        collection: Journal entries, customer ledger or vendor ledger collection
+        record: Document to insert (with idempotency_key when posted from the outbox)
+        apply_balances: Function applying the record's balance changes, returning
+            the balance collection and the filters of the documents it updated
+
+    Returns:
+        The inserted record, or the one already posted under its key
+
+    Raises:
+        RuntimeError: When another writer is still applying the balances (the outbox retries later)
+    """
+    idempotency_key = record.get('idempotency_key')
+    if not idempotency_key:
+        record['_id'] = collection.insert_one(record).inserted_id
+        apply_balances(record)
+        return record
+
+    key_filter = {**_owner_filter(record), 'idempotency_key': idempotency_key}
+    existing = collection.find_one(key_filter)
+    if existing is None:
+        record['balances_applied'] = False
+        record['balances_claimed_at'] = get_current_utc_time()
+        try:
+            record['_id'] = collection.insert_one(record).inserted_id
+        except DuplicateKeyError:
+            existing = collection.find_one(key_filter)
+        else:
+            _apply_claimed_balances(collection, record, apply_balances)
+            return record
+
+    if existing.get('balances_applied', True) is not True:
+        if not _claim_balances(collection, existing['_id']):
+            raise RuntimeError(f"Balances of posting {idempotency_key} are being applied by another writer")
+        _apply_claimed_balances(collection, existing, apply_balances)
+    return existing
+
+
+def _claim_balances(collection, record_id):
+    """Take over a record whose balances were left unapplied (False while another writer holds it)"""
+    now = get_current_utc_time()
+    claimed = collection.find_one_and_update(
+        {
+            '_id': record_id,
+            'balances_applied': False,
+            'balances_claimed_at': {'$not': {'$gte': now - timedelta(seconds=BALANCE_CLAIM_SECONDS)}}
+        },
+        {'$set': {'balances_claimed_at': now}}
+    )
+    return claimed is not None
+
+
+def _apply_claimed_balances(collection, record, apply_balances):
+    """Apply a claimed record's balances and mark them applied"""
+    try:
+        balance_coll, balance_filters = apply_balances(record)
+    except Exception:
+        # Release the claim so the outbox retry can take over without waiting it out
+        collection.update_one({'_id': record['_id']}, {'$unset': {'balances_claimed_at': ''}})
+        raise
+    collection.update_one(
+        {'_id': record['_id']},
+        {'$set': {'balances_applied': True}, '$unset': {'balances_claimed_at': ''}}
+    )
+    record['balances_applied'] = True
+    record.pop('balances_claimed_at', None)
+
+    # Applied records are never re-applied, so their markers can go (a writer
+    # stopping before this only leaves a stale _id behind)
+    if balance_filters:
+        balance_coll.bulk_write([
+            UpdateOne(balance_filter, {'$pull': {APPLIED_POSTINGS_FIELD: record['_id']}})
+            for balance_filter in balance_filters
+        ], ordered=False)
+
+
+def _balance_update(record, balance_filter, balance_change):
+    """Filter and update adding a posting's change to a balance document (once for keyed postings)"""
+    if not record.get('idempotency_key'):
+        return balance_filter, {'$inc': {'balance': balance_change}}
+    return (
+        {**balance_filter, APPLIED_POSTINGS_FIELD: {'$ne': record['_id']}},
+        {'$inc': {'balance': balance_change}, '$push': {APPLIED_POSTINGS_FIELD: record['_id']}}
+    )
 
 
 # =================== TRANSACTION POSTING FUNCTIONS ===================
 
-def post_cash_sale(sale_data):
+def step_key(idempotency_key, step):
+    """Idempotency key of one write of a posting (journal, customer/vendor ledger)"""
+    return f"{idempotency_key}:{step}" if idempotency_key else None
+
+
+def post_cash_sale(sale_data, idempotency_key=None):
     """
     Post journal entry for a cash sale
     Debit: Cash (increase asset)
@@ -241,11 +433,12 @@ def post_cash_sale(sale_data):
         description=f"Cash Sale - {sale_data.get('receipt_number', '')}",
         entries=entries,
         reference_type='sale',
-        reference_id=sale_data.get('_id')
+        reference_id=sale_data.get('_id'),
+        idempotency_key=step_key(idempotency_key, 'journal')
     )
 
 
-def post_credit_sale(sale_data, customer_id, customer_name):
+def post_credit_sale(sale_data, customer_id, customer_name, idempotency_key=None):
     """
     Post journal entry for a credit sale
     Debit: Accounts Receivable (increase asset)
@@ -288,7 +481,8 @@ def post_credit_sale(sale_data, customer_id, customer_name):
         description=f"Credit Sale to {customer_name} - {sale_data.get('receipt_number', '')}",
         entries=entries,
         reference_type='sale',
-        reference_id=sale_data.get('_id')
+        reference_id=sale_data.get('_id'),
+        idempotency_key=step_key(idempotency_key, 'journal')
     )
     
     # Update customer ledger
@@ -299,13 +493,14 @@ def post_credit_sale(sale_data, customer_id, customer_name):
         credit=0,
         description=f"Credit Sale - {sale_data.get('receipt_number', '')}",
         reference_type='sale',
-        reference_id=sale_data.get('_id')
+        reference_id=sale_data.get('_id'),
+        idempotency_key=step_key(idempotency_key, 'customer_ledger')
     )
     
     return journal_entry
 
 
-def post_payment_received(payment_data, customer_id, customer_name):
+def post_payment_received(payment_data, customer_id, customer_name, idempotency_key=None):
     """
     Post journal entry for payment received from customer
     Debit: Cash/Bank (increase asset)
@@ -333,7 +528,8 @@ def post_payment_received(payment_data, customer_id, customer_name):
         description=f"Payment from {customer_name}",
         entries=entries,
         reference_type='payment_received',
-        reference_id=payment_data.get('_id')
+        reference_id=payment_data.get('_id'),
+        idempotency_key=step_key(idempotency_key, 'journal')
     )
     
     # Update customer ledger
@@ -344,13 +540,14 @@ def post_payment_received(payment_data, customer_id, customer_name):
         credit=payment_data['amount'],
         description=f"Payment Received",
         reference_type='payment_received',
-        reference_id=payment_data.get('_id')
+        reference_id=payment_data.get('_id'),
+        idempotency_key=step_key(idempotency_key, 'customer_ledger')
     )
     
     return journal_entry
 
 
-def post_purchase(purchase_data, vendor_id, vendor_name, payment_type='credit'):
+def post_purchase(purchase_data, vendor_id, vendor_name, payment_type='credit', idempotency_key=None):
     """
     Post journal entry for a purchase
     Debit: Inventory (increase asset)
@@ -380,7 +577,8 @@ def post_purchase(purchase_data, vendor_id, vendor_name, payment_type='credit'):
         description=f"Purchase from {vendor_name} - {purchase_data.get('po_number', '')}",
         entries=entries,
         reference_type='purchase',
-        reference_id=purchase_data.get('_id')
+        reference_id=purchase_data.get('_id'),
+        idempotency_key=step_key(idempotency_key, 'journal')
     )
     
     # Update vendor ledger for credit purchases
@@ -392,13 +590,14 @@ def post_purchase(purchase_data, vendor_id, vendor_name, payment_type='credit'):
             credit=purchase_data['total'],
             description=f"Purchase - {purchase_data.get('po_number', '')}",
             reference_type='purchase',
-            reference_id=purchase_data.get('_id')
+            reference_id=purchase_data.get('_id'),
+            idempotency_key=step_key(idempotency_key, 'vendor_ledger')
         )
     
     return journal_entry
 
 
-def post_payment_made(payment_data, vendor_id, vendor_name):
+def post_payment_made(payment_data, vendor_id, vendor_name, idempotency_key=None):
     """
     Post journal entry for payment made to vendor
     Debit: Accounts Payable (decrease liability)
@@ -426,7 +625,8 @@ def post_payment_made(payment_data, vendor_id, vendor_name):
         description=f"Payment to {vendor_name}",
         entries=entries,
         reference_type='payment_made',
-        reference_id=payment_data.get('_id')
+        reference_id=payment_data.get('_id'),
+        idempotency_key=step_key(idempotency_key, 'journal')
     )
     
     # Update vendor ledger
@@ -437,13 +637,14 @@ def post_payment_made(payment_data, vendor_id, vendor_name):
         credit=0,
         description=f"Payment Made",
         reference_type='payment_made',
-        reference_id=payment_data.get('_id')
+        reference_id=payment_data.get('_id'),
+        idempotency_key=step_key(idempotency_key, 'vendor_ledger')
     )
     
     return journal_entry
 
 
-def post_expense(expense_data):
+def post_expense(expense_data, idempotency_key=None):
     """
     Post journal entry for an expense
     Debit: Expense Account
@@ -475,20 +676,26 @@ def post_expense(expense_data):
         description=expense_data.get('description', 'Expense'),
         entries=entries,
         reference_type='expense',
-        reference_id=expense_data.get('_id')
+        reference_id=expense_data.get('_id'),
+        idempotency_key=step_key(idempotency_key, 'journal')
     )
 
 
 # =================== CUSTOMER & VENDOR LEDGER FUNCTIONS ===================
 
-def update_customer_ledger(customer_id, customer_name, debit, credit, description, reference_type=None, reference_id=None):
+def update_customer_ledger(customer_id, customer_name, debit, credit, description, reference_type=None, reference_id=None, idempotency_key=None):
     """
     Update customer ledger with a transaction
     Debit = amount owed by customer (increases receivable)
     Credit = payment received (decreases receivable)
+    An idempotency_key that was already recorded only completes that entry (see _post_once)
     """
     ledger_coll = get_customer_ledger_collection()
-    customers_coll = current_app.db[get_collection_name('customers')]
+    if idempotency_key:
+        existing = ledger_coll.find_one({**get_tenant_filter(), 'idempotency_key': idempotency_key})
+        if existing:
+            _post_once(ledger_coll, existing, _apply_customer_balance)
+            return
     
     # Create ledger entry
     entry = {
@@ -503,28 +710,33 @@ def update_customer_ledger(customer_id, customer_name, debit, credit, descriptio
         'reference_id': ObjectId(reference_id) if reference_id else None,
         'created_at': get_current_utc_time()
     }
+    if idempotency_key:
+        entry['idempotency_key'] = idempotency_key
     
-    ledger_coll.insert_one(entry)
-    
-    # Update customer balance (debit increases balance, credit decreases)
-    balance_change = debit - credit
-    customer_filter = get_tenant_filter()
-    customer_filter['_id'] = ObjectId(customer_id)
-    
-    customers_coll.update_one(
-        customer_filter,
-        {'$inc': {'balance': balance_change}}
-    )
+    _post_once(ledger_coll, entry, _apply_customer_balance)
+
+
+def _apply_customer_balance(entry):
+    """Update customer balance (debit increases balance, credit decreases)"""
+    customers_coll = current_app.db[get_collection_name('customers')]
+    customer_filter = {**_owner_filter(entry), '_id': entry['customer_id']}
+    customers_coll.update_one(*_balance_update(entry, customer_filter, entry['debit'] - entry['credit']))
+    return customers_coll, [customer_filter]
 
 
-def update_vendor_ledger(vendor_id, vendor_name, debit, credit, description, reference_type=None, reference_id=None):
+def update_vendor_ledger(vendor_id, vendor_name, debit, credit, description, reference_type=None, reference_id=None, idempotency_key=None):
     """
     Update vendor ledger with a transaction
     Credit = amount owed to vendor (increases payable)
     Debit = payment made (decreases payable)
+    An idempotency_key that was already recorded only completes that entry (see _post_once)
     """
     ledger_coll = get_vendor_ledger_collection()
-    suppliers_coll = current_app.db[get_collection_name('suppliers')]
+    if idempotency_key:
+        existing = ledger_coll.find_one({**get_tenant_filter(), 'idempotency_key': idempotency_key})
+        if existing:
+            _post_once(ledger_coll, existing, _apply_vendor_balance)
+            return
     
     # Create ledger entry
     entry = {
@@ -539,18 +751,18 @@ def update_vendor_ledger(vendor_id, vendor_name, debit, credit, description, ref
         'reference_id': ObjectId(reference_id) if reference_id else None,
         'created_at': get_current_utc_time()
     }
+    if idempotency_key:
+        entry['idempotency_key'] = idempotency_key
     
-    ledger_coll.insert_one(entry)
-    
-    # Update vendor balance (credit increases balance, debit decreases)
-    balance_change = credit - debit
-    vendor_filter = get_tenant_filter()
-    vendor_filter['_id'] = ObjectId(vendor_id)
-    
-    suppliers_coll.update_one(
-        vendor_filter,
-        {'$inc': {'balance': balance_change}}
-    )
+    _post_once(ledger_coll, entry, _apply_vendor_balance)
+
+
+def _apply_vendor_balance(entry):
+    """Update vendor balance (credit increases balance, debit decreases)"""
+    suppliers_coll = current_app.db[get_collection_name('suppliers')]
+    vendor_filter = {**_owner_filter(entry), '_id': entry['vendor_id']}
+    suppliers_coll.update_one(*_balance_update(entry, vendor_filter, entry['credit'] - entry['debit']))
+    return suppliers_coll, [vendor_filter]
 
 
 def get_customer_balance(customer_id):
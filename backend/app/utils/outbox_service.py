@@ -0,0 +1,355 @@
+"""
+Outbox Service - Durable post-commit side effects (ledger postings, activity logs, sales rollups)
+A route writes its business document with one outbox record listing the
+side effects to run embedded in it (outbox_pending), so the two are one
+write; it then copies the record to the outbox and pulls it from the
+document. Records a crash left behind on a document are copied by
+sweep_pending (scheduler). Worker threads drain the outbox off the request path,
+retry failures with exponential backoff and move records that keep failing
+to 'dead' so they can be inspected and retried (manage_outbox.py).
+
+Every effect is idempotent, so a record that is retried - or run twice after
+a worker lost its lease - does not post anything twice:
+- ledger postings carry an idempotency key that journal entries and
+  customer/vendor ledger entries are checked against
+- activity entries are built (with their _id) in the request and inserted once
+- sales rollup increments record their key in the rollup they are added to
+"""
+import os
+import random
+import socket
+import threading
+from datetime import timedelta
+from flask import current_app, g
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from app.utils.helpers import get_current_utc_time, is_demo_request, get_demo_collection_name
+from app.middleware.auth import get_current_user
+
+
+OUTBOX_COLLECTION = 'outbox'
+
+# Ledger posting functions an outbox record may run (ledger_service)
+LEDGER_POSTINGS = ('post_cash_sale', 'post_credit_sale', 'post_payment_received', 'post_purchase', 'post_payment_made')
+
+MAX_BACKOFF_SECONDS = 300
+
+# Field of a business document holding its not yet enqueued outbox records
+PENDING_FIELD = 'outbox_pending'
+
+# Collections (and their demo equivalents) whose documents carry outbox records
+PENDING_SOURCES = ('sales_pos', 'purchase_orders')
+
+_lock = threading.Lock()
+_wake = threading.Event()
+_stop = threading.Event()
+_workers = []
+
+_stats = {
+    'enqueued': 0,
+    'processed': 0,
+    'retried': 0,
+    'dead': 0,
+    'inline_fallbacks': 0
+}
+
+
+def get_outbox_collection():
+    return current_app.db[OUTBOX_COLLECTION]
+
+
+def _count(key, amount=1):
+    with _lock:
+        _stats[key] += amount
+
+
+# =================== EFFECTS ===================
+
+def ledger_effect(posting, **kwargs):
+    """Side effect that runs a ledger_service posting function with kwargs"""
+    if posting not in LEDGER_POSTINGS:
+        raise ValueError(f"Unknown ledger posting: {posting}")
+    return {'type': 'ledger', 'posting': posting, 'kwargs': kwargs}
+
+
+def activity_effect(activity_type, **kwargs):
+    """Side effect that writes an activity log entry (built now, from the request)"""
+    from app.utils.activity_service import build_activity_entry
+    return {'type': 'activity', 'entry': build_activity_entry(activity_type, **kwargs)}
+
+
+def rollup_effect(rollup):
+    """Side effect that adds a sales rollup increment (rollup_service.sale_rollup / payment_rollup)"""
+    return {'type': 'rollup', 'rollup': rollup}
+
+
+def _run_effects(effects, idempotency_key):
+    """Run a record's effects in order; raises on the first failure"""
+    from app.utils import ledger_service
+    from app.utils.activity_service import write_activity_entry
+    from app.utils.rollup_service import apply_rollup
+
+    for position, effect in enumerate(effects):
+        if effect['type'] == 'ledger':
+            posting = getattr(ledger_service, effect['posting'])
+            posting(**effect['kwargs'], idempotency_key=f"{idempotency_key}:{position}")
+        elif effect['type'] == 'activity':
+            write_activity_entry(effect['entry'])
+        elif effect['type'] == 'rollup':
+            apply_rollup(current_app.db, effect['rollup'], f"{idempotency_key}:{position}")
+        else:
+            raise ValueError(f"Unknown outbox effect: {effect['type']}")
+
+
+# =================== ENQUEUE ===================
+
+def outbox_record(idempotency_key, effects, source=None):
+    """
+    Build an outbox record for the side effects of the current request
+
+    Args:
+        idempotency_key: Unique key of the business event, e.g. 'sale:<id>'
+        effects: List of ledger_effect(...) / activity_effect(...)
+        source: (collection name, _id) of the business document the record is
+            embedded in (PENDING_FIELD) by the same write
+
+    Returns:
+        The record, for the business write and then enqueue_record
+    """
+    user = get_current_user()
+    now = get_current_utc_time()
+    record = {
+        'idempotency_key': idempotency_key,
+        'effects': effects,
+        'is_demo': is_demo_request(),
+        # Enough of the user to rebuild the request context in a worker
+        'actor': {
+            '_id': user['_id'],
+            'tenant_id': user.get('tenant_id'),
+            'name': user.get('name'),
+            'email': user.get('email')
+        },
+        'status': 'pending',
+        'attempts': 0,
+        'available_at': now,
+        'created_at': now
+    }
+    if source:
+        record['source'] = {'collection': source[0], '_id': source[1]}
+    return record
+
+
+def enqueue(idempotency_key, effects):
+    """
+    Record side effects of the current request for the outbox workers
+    (enqueue_record(outbox_record(...)) for effects not embedded in a document)
+
+    Returns:
+        True when queued, False when the effects had to run inline instead
+    """
+    return enqueue_record(outbox_record(idempotency_key, effects))
+
+
+def enqueue_record(record):
+    """
+    Copy a record to the outbox; enqueueing the same key twice is a no-op
+    An embedded record is then pulled from its document. If the outbox is
+    unavailable it stays there for sweep_pending; a record that is not
+    embedded runs inline instead.
+
+    Returns:
+        True when queued, False when it was not (left embedded or run inline)
+    """
+    idempotency_key = record['idempotency_key']
+    try:
+        get_outbox_collection().insert_one(dict(record))
+    except DuplicateKeyError:
+        pass
+    except Exception as e:
+        if record.get('source'):
+            print(f"❌ Outbox enqueue failed for {idempotency_key}, left for the sweep: {e}")
+            return False
+        # Outbox unavailable - fall back to running the effects in the request
+        print(f"❌ Outbox enqueue failed for {idempotency_key}, running inline: {e}")
+        _count('inline_fallbacks')
+        try:
+            _run_effects(record['effects'], idempotency_key)
+        except Exception as effect_error:
+            print(f"❌ Inline side effects failed for {idempotency_key}: {effect_error}")
+        return False
+    else:
+        _count('enqueued')
+        _wake.set()
+
+    _release(record)
+    return True
+
+
+def _release(record):
+    """Pull an enqueued record from the document it was embedded in"""
+    source = record.get('source')
+    if source:
+        current_app.db[source['collection']].update_one(
+            {'_id': source['_id']},
+            {'$pull': {PENDING_FIELD: {'idempotency_key': record['idempotency_key']}}}
+        )
+
+
+def sweep_pending(limit=500):
+    """
+    Enqueue records left embedded in documents (the request stopped between
+    its write and enqueue_record) once they are a lease old
+
+    Returns:
+        Number of records enqueued
+    """
+    db = current_app.db
+    cutoff = get_current_utc_time() - timedelta(seconds=current_app.config.get('OUTBOX_LEASE_SECONDS', 60))
+    swept = 0
+    for base_name in PENDING_SOURCES:
+        for name in (base_name, get_demo_collection_name(base_name)):
+            documents = db[name].find({f'{PENDING_FIELD}.created_at': {'$lte': cutoff}}, {PENDING_FIELD: 1}).limit(limit)
+            for document in documents:
+                for record in document[PENDING_FIELD]:
+                    if enqueue_record(record):
+                        swept += 1
+    return swept
+
+
+# =================== WORKERS ===================
+
+def _claim(worker_id):
+    """Atomically claim the next due record (pending, or processing with an expired lease)"""
+    now = get_current_utc_time()
+    lease = current_app.config.get('OUTBOX_LEASE_SECONDS', 60)
+    return get_outbox_collection().find_one_and_update(
+        {'status': {'$in': ['pending', 'processing']}, 'available_at': {'$lte': now}},
+        {
+            '$set': {
+                'status': 'processing',
+                'available_at': now + timedelta(seconds=lease),
+                'claimed_by': worker_id
+            },
+            '$inc': {'attempts': 1}
+        },
+        sort=[('available_at', 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def process_next(worker_id):
+    """
+    Claim and run one outbox record
+
+    Returns:
+        True if a record was processed (successfully or not), False when the outbox is empty
+    """
+    record = _claim(worker_id)
+    if record is None:
+        return False
+
+    outbox = get_outbox_collection()
+    owner = {'_id': record['_id'], 'claimed_by': worker_id}
+
+    # Rebuild the request user so the services resolve the same tenant and collections
+    g.is_demo = record.get('is_demo', False)
+    if g.is_demo:
+        g.demo_user = record['actor']
+    else:
+        g.current_user = record['actor']
+
+    try:
+        _run_effects(record['effects'], record['idempotency_key'])
+    except Exception as e:
+        max_attempts = current_app.config.get('OUTBOX_MAX_ATTEMPTS', 8)
+        if record['attempts'] >= max_attempts:
+            outbox.update_one(owner, {'$set': {'status': 'dead', 'last_error': str(e), 'failed_at': get_current_utc_time()}})
+            _count('dead')
+            print(f"❌ Outbox record {record['idempotency_key']} failed {record['attempts']} times, moved to dead: {e}")
+        else:
+            delay = min(MAX_BACKOFF_SECONDS, 2 ** record['attempts']) * random.uniform(0.8, 1.2)
+            outbox.update_one(owner, {'$set': {
+                'status': 'pending',
+                'available_at': get_current_utc_time() + timedelta(seconds=delay),
+                'last_error': str(e)
+            }})
+            _count('retried')
+        return True
+
+    outbox.delete_one(owner)
+    # Normally pulled already by enqueue_record - unless the request stopped before that
+    _release(record)
+    _count('processed')
+    return True
+
+
+def _worker_loop(app, worker_id):
+    poll_interval = app.config.get('OUTBOX_POLL_INTERVAL', 2)
+    while not _stop.is_set():
+        try:
+            with app.app_context():
+                processed = process_next(worker_id)
+        except Exception as e:
+            print(f"❌ Outbox worker error: {e}")
+            processed = False
+        if not processed:
+            _wake.wait(poll_interval)
+            _wake.clear()
+
+
+def start_outbox_workers(app):
+    """Start OUTBOX_WORKERS draining threads for this process (0 = enqueue only)"""
+    count = app.config.get('OUTBOX_WORKERS', 2)
+    with _lock:
+        if _workers or count <= 0:
+            return
+        _stop.clear()
+        host = f"{socket.gethostname()}:{os.getpid()}"
+        for n in range(count):
+            thread = threading.Thread(
+                target=_worker_loop,
+                args=(app, f"{host}:{n}"),
+                name=f"outbox-{n}",
+                daemon=True
+            )
+            thread.start()
+            _workers.append(thread)
+    print(f"✅ Outbox workers started ({count})")
+
+
+def stop_outbox_workers():
+    """Stop the draining threads after their current record"""
+    _stop.set()
+    _wake.set()
+    with _lock:
+        workers = list(_workers)
+        _workers.clear()
+    for thread in workers:
+        thread.join(timeout=10)
+
+
+# =================== ADMIN ===================
+
+def retry_dead(idempotency_key=None):
+    """Move dead records (or one of them) back to pending; returns how many"""
+    query = {'status': 'dead'}
+    if idempotency_key:
+        query['idempotency_key'] = idempotency_key
+    result = get_outbox_collection().update_many(
+        query,
+        {'$set': {'status': 'pending', 'attempts': 0, 'available_at': get_current_utc_time()}}
+    )
+    _wake.set()
+    return result.modified_count
+
+
+def get_outbox_stats():
+    """Counters for this worker plus the outbox backlog by status"""
+    with _lock:
+        stats = dict(_stats)
+        stats['workers'] = len(_workers)
+    backlog = {'pending': 0, 'processing': 0, 'dead': 0}
+    for row in get_outbox_collection().aggregate([{'$group': {'_id': '$status', 'count': {'$sum': 1}}}]):
+        backlog[row['_id']] = row['count']
+    stats['backlog'] = backlog
+    return stats
@@ -0,0 +1,112 @@
+"""
+Pagination - Keyset (cursor) pagination for list endpoints
+Pages are ordered by (sort field, _id) and continue from the last document
+of the previous page instead of skipping over it, so with an index on
+(owner, sort field, _id) page N costs the same as page 1.
+
+Clients pass ?limit= (and ?cursor= from the previous page); the cursor of
+the next page is returned in the X-Next-Cursor header, and as next_cursor in
+responses that already carry pagination details. The cursor is opaque: the
+last document's sort value and _id, BSON-typed JSON in URL-safe base64.
+"""
+import base64
+from flask import request, jsonify
+from pymongo import DESCENDING
+from bson import json_util
+from app.utils.projection import with_fields
+
+
+DEFAULT_PAGE_LIMIT = 50
+MAX_PAGE_LIMIT = 200
+
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+
+def encode_cursor(sort_value, doc_id):
+    """Opaque cursor for the position after (sort_value, doc_id)"""
+    raw = json_util.dumps({'v': sort_value, 'i': doc_id})
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(sort value, _id) of a cursor; raises ValueError when it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        position = json_util.loads(raw.decode('utf-8'))
+        return position['v'], position['i']
+    except Exception:
+        raise ValueError('Invalid pagination cursor')
+
+
+def keyset_filter(sort_field, direction, sort_value, doc_id):
+    """Condition matching the documents after (sort_value, doc_id) in (sort_field, _id) order"""
+    op = '$lt' if direction == DESCENDING else '$gt'
+    return {'$or': [
+        {sort_field: {op: sort_value}},
+        {sort_field: sort_value, '_id': {op: doc_id}}
+    ]}
+
+
+def keyset_paginate(collection, query, sort_field, direction=DESCENDING, limit=DEFAULT_PAGE_LIMIT, cursor=None, projection=None):
+    """
+    Fetch one page of a listing ordered by (sort_field, _id)
+
+    Args:
+        collection: Collection to read
+        query: Filter (tenant filter plus any conditions)
+        sort_field: Field to order by (a document without it sorts as null)
+        direction: DESCENDING (newest first) or ASCENDING
+        limit: Page size
+        cursor: next_cursor of the previous page (None for the first page)
+        projection: Optional projection
+
+    Returns:
+        Dict with items, next_cursor (None on the last page) and has_more
+    """
+    if cursor:
+        sort_value, doc_id = decode_cursor(cursor)
+        query = {'$and': [query, keyset_filter(sort_field, direction, sort_value, doc_id)]}
+
+    # The next cursor is built from the sort field
+    projection = with_fields(projection, sort_field)
+
+    # One extra document tells whether there is a next page
+    items = list(
+        collection.find(query, projection)
+        .sort([(sort_field, direction), ('_id', direction)])
+        .limit(limit + 1)
+    )
+    has_more = len(items) > limit
+    items = items[:limit]
+
+    next_cursor = None
+    if has_more:
+        last = items[-1]
+        next_cursor = encode_cursor(last.get(sort_field), last['_id'])
+
+    return {'items': items, 'next_cursor': next_cursor, 'has_more': has_more}
+
+
+def is_page_request():
+    """The client asked for a page (?limit= or ?cursor=) rather than the full listing"""
+    return 'cursor' in request.args or 'limit' in request.args
+
+
+def get_page_args(default_limit=DEFAULT_PAGE_LIMIT, max_limit=MAX_PAGE_LIMIT):
+    """(cursor, limit) from the query string; raises ValueError for a bad limit"""
+    limit = request.args.get('limit', default_limit, type=int)
+    if limit is None or limit < 1:
+        raise ValueError('limit must be a positive integer')
+    return request.args.get('cursor') or None, min(limit, max_limit)
+
+
+def page_response(page, key=None, **extra):
+    """
+    JSON response for a keyset page: the items as a bare array (or {key: items, **extra})
+    with the next page's cursor in the X-Next-Cursor header
+    """
+    body = page['items'] if key is None else {key: page['items'], **extra}
+    response = jsonify(body)
+    if page['next_cursor']:
+        response.headers[NEXT_CURSOR_HEADER] = page['next_cursor']
+    return response
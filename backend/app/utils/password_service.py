@@ -0,0 +1,155 @@
+"""
+Password Service - bcrypt hashing on a bounded worker pool
+Keeps a burst of logins (e.g. a shift change) from pinning every request
+thread on bcrypt. bcrypt releases the GIL while hashing, so a thread pool
+runs hashes in parallel while the number of cores spent on them stays capped.
+
+When more than PASSWORD_HASH_QUEUE_LIMIT hashes are in flight, new ones are
+rejected with PasswordServiceBusy, which routes answer with 503.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import bcrypt
+
+
+class PasswordServiceBusy(Exception):
+    """Raised when the hashing queue is full"""
+    pass
+
+
+_settings = {
+    'rounds': 12,
+    'workers': os.cpu_count() or 2,
+    'queue_limit': 64,
+    'timeout': 30
+}
+_executor = None
+_lock = threading.Lock()
+
+_stats = {
+    'hashed': 0,
+    'verified': 0,
+    'rehashed': 0,
+    'rejected': 0,
+    'in_flight': 0
+}
+
+
+def configure_password_hashing(rounds=None, workers=None, queue_limit=None, timeout=None):
+    """Apply settings (called once at startup from app config)"""
+    global _executor
+    with _lock:
+        for key, value in (('rounds', rounds), ('workers', workers), ('queue_limit', queue_limit), ('timeout', timeout)):
+            if value:
+                _settings[key] = value
+        if _executor:
+            _executor.shutdown(wait=False)
+        _executor = None
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=_settings['workers'], thread_name_prefix='bcrypt')
+        return _executor
+
+
+def _submit(fn, *args):
+    """Queue fn on the pool, or raise PasswordServiceBusy when the queue is full"""
+    executor = _get_executor()
+    with _lock:
+        if _stats['in_flight'] >= _settings['queue_limit']:
+            _stats['rejected'] += 1
+            raise PasswordServiceBusy('Too many password operations in progress, please retry')
+        _stats['in_flight'] += 1
+    try:
+        future = executor.submit(fn, *args)
+    except Exception:
+        _count('in_flight', -1)
+        raise
+    future.add_done_callback(lambda _: _count('in_flight', -1))
+    return future
+
+
+def _run(fn, *args):
+    """Run fn on the pool and wait for it, or raise PasswordServiceBusy when the queue is full"""
+    return _submit(fn, *args).result(timeout=_settings['timeout'])
+
+
+def _count(key, amount=1):
+    with _lock:
+        _stats[key] += amount
+
+
+def hash_password(password):
+    """
+    Hash a password with the configured cost factor
+
+    Returns:
+        bcrypt hash as str
+    """
+    rounds = _settings['rounds']
+    password_hash = _run(lambda: bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)))
+    _count('hashed')
+    return password_hash.decode('utf-8')
+
+
+def hash_password_later(password, on_done):
+    """
+    Hash a password on the pool without waiting for it
+
+    Args:
+        password: Password to hash
+        on_done: Called with the new hash (str) from the pool thread
+
+    Raises:
+        PasswordServiceBusy: When the queue is full
+    """
+    rounds = _settings['rounds']
+
+    def run():
+        password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+        _count('hashed')
+        on_done(password_hash)
+
+    return _submit(run)
+
+
+def verify_password(password, password_hash):
+    """Check a password against a stored bcrypt hash"""
+    if not password or not password_hash:
+        return False
+    result = _run(bcrypt.checkpw, password.encode('utf-8'), password_hash.encode('utf-8'))
+    _count('verified')
+    return result
+
+
+def get_hash_rounds(password_hash):
+    """Cost factor of a bcrypt hash ($2b$12$... -> 12)"""
+    try:
+        return int(password_hash.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def needs_rehash(password_hash):
+    """Check if a hash was made with a different cost factor than configured"""
+    return get_hash_rounds(password_hash) != _settings['rounds']
+
+
+def record_rehash():
+    _count('rehashed')
+
+
+def get_password_stats():
+    """Hashing pool settings and counters for this worker"""
+    with _lock:
+        stats = dict(_stats)
+    stats.update({
+        'rounds': _settings['rounds'],
+        'workers': _settings['workers'],
+        'queue_limit': _settings['queue_limit']
+    })
+    return stats
@@ -0,0 +1,43 @@
+"""
+Product Events - Keep derived product views current after product writes
+Every route or service that creates, updates or deletes products (or moves
+their stock) reports it here, once, instead of knowing about each view:
+- catalog tombstones for delta-syncing POS terminals (catalog_service)
+- the in-process barcode/SKU index (product_index)
+- the in-process search index (product_search)
+"""
+from bson import ObjectId
+from app.utils.catalog_service import record_product_deleted
+from app.utils import product_index, product_search
+
+
+def _as_object_id(product_id):
+    return product_id if isinstance(product_id, ObjectId) else ObjectId(product_id)
+
+
+def product_saved(products_collection, owner_filter, product):
+    """A product was created (product includes its _id)"""
+    product_index.index_product(products_collection, owner_filter, product)
+    product_search.index_product(products_collection, owner_filter, product)
+
+
+def product_updated(products_collection, owner_filter, product_id, fields):
+    """Fields of a product were $set"""
+    product_id = _as_object_id(product_id)
+    product_index.update_indexed_product(products_collection, owner_filter, product_id, fields)
+    product_search.update_indexed_product(products_collection, owner_filter, product_id, fields)
+
+
+def product_deleted(products_collection, owner_filter, product_id):
+    """A product was deleted"""
+    record_product_deleted(products_collection, owner_filter, product_id)
+    product_id = _as_object_id(product_id)
+    product_index.remove_indexed_product(products_collection, owner_filter, product_id)
+    product_search.remove_indexed_product(products_collection, owner_filter, product_id)
+
+
+def stock_changed(products_collection, owner_filter, deltas):
+    """Stock moved by {product_id: +/-quantity} (sales, restocks)"""
+    deltas = {_as_object_id(product_id): delta for product_id, delta in deltas.items()}
+    product_index.adjust_indexed_stock(products_collection, owner_filter, deltas)
+    product_search.adjust_indexed_stock(products_collection, owner_filter, deltas)
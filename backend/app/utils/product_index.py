@@ -0,0 +1,200 @@
+"""
+Product Index - Per-tenant in-process barcode/SKU lookup for scan-to-cart
+Each tenant's products are loaded once into a hash map keyed by normalized
+barcode and SKU, so a scan is a dict lookup instead of a Mongo round trip.
+
+Indexes are built lazily on the first scan, kept current by the product
+write paths (see product_events) and rebuilt after PRODUCT_INDEX_TTL seconds
+so writes made by other workers are picked up. A miss falls back to an exact
+barcode/SKU query and adds the product to the index.
+"""
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+
+
+# Product fields kept in the index (enough to add a line to the cart)
+INDEX_FIELDS = ('sku', 'barcode', 'name', 'price', 'stock', 'category', 'category_id', 'unit', 'is_active')
+
+_lock = threading.RLock()
+_indexes = OrderedDict()
+
+_stats = {
+    'lookups': 0,
+    'index_hits': 0,
+    'database_hits': 0,
+    'not_found': 0,
+    'builds': 0
+}
+
+
+class TenantProductIndex:
+    """Barcode/SKU -> product map for one tenant's products collection"""
+
+    def __init__(self, built_at):
+        self.built_at = built_at
+        self.products = {}
+        self.codes = {}
+
+    def put(self, product):
+        product_id = product['_id']
+        self.remove(product_id)
+        entry = {'_id': product_id}
+        for field in INDEX_FIELDS:
+            if field in product:
+                entry[field] = product[field]
+        self.products[product_id] = entry
+        for code in _entry_codes(entry):
+            self.codes[code] = product_id
+
+    def update(self, product_id, fields):
+        entry = self.products.get(product_id)
+        if entry is None:
+            return
+        updated = dict(entry)
+        updated.update({k: v for k, v in fields.items() if k in INDEX_FIELDS})
+        self.put(updated)
+
+    def adjust_stock(self, product_id, delta):
+        entry = self.products.get(product_id)
+        if entry is not None:
+            entry['stock'] = entry.get('stock', 0) + delta
+
+    def remove(self, product_id):
+        entry = self.products.pop(product_id, None)
+        if entry is None:
+            return
+        for code in _entry_codes(entry):
+            if self.codes.get(code) == product_id:
+                del self.codes[code]
+
+    def get(self, code):
+        product_id = self.codes.get(normalize_code(code))
+        entry = self.products.get(product_id) if product_id is not None else None
+        return dict(entry) if entry else None
+
+
+def normalize_code(code):
+    """Barcodes and SKUs match case-insensitively, ignoring surrounding spaces"""
+    return str(code).strip().lower() if code is not None else ''
+
+
+def _entry_codes(entry):
+    for field in ('barcode', 'sku'):
+        code = normalize_code(entry.get(field))
+        if code:
+            yield code
+
+
+def _index_key(products_collection, owner_filter):
+    field, value = next(iter(owner_filter.items()))
+    return (products_collection.name, field, str(value))
+
+
+def _count(key):
+    with _lock:
+        _stats[key] += 1
+
+
+def _get_index(products_collection, owner_filter, build=True):
+    """Get the tenant's index, building it when missing or expired"""
+    key = _index_key(products_collection, owner_filter)
+    ttl = current_app.config.get('PRODUCT_INDEX_TTL', 300)
+    now = time.monotonic()
+
+    with _lock:
+        index = _indexes.get(key)
+        if index is not None and now - index.built_at < ttl:
+            _indexes.move_to_end(key)
+            return index
+    if not build:
+        return None
+
+    index = TenantProductIndex(now)
+    projection = {field: 1 for field in INDEX_FIELDS}
+    for product in products_collection.find(owner_filter, projection):
+        index.put(product)
+
+    max_tenants = current_app.config.get('PRODUCT_INDEX_MAX_TENANTS', 500)
+    with _lock:
+        _indexes[key] = index
+        _indexes.move_to_end(key)
+        while len(_indexes) > max_tenants:
+            _indexes.popitem(last=False)
+        _stats['builds'] += 1
+    return index
+
+
+def lookup_product(products_collection, owner_filter, code):
+    """
+    Find a product by barcode or SKU
+
+    Returns:
+        Tuple of (product dict or None, source) where source is 'index' or 'database'
+    """
+    _count('lookups')
+    index = _get_index(products_collection, owner_filter)
+    with _lock:
+        product = index.get(code)
+    if product:
+        _count('index_hits')
+        return product, 'index'
+
+    # Not indexed yet (e.g. created on another worker) - exact match on the indexed fields
+    raw = str(code).strip()
+    candidates = list({raw, raw.upper(), raw.lower()})
+    product = products_collection.find_one(
+        {**owner_filter, '$or': [{'barcode': {'$in': candidates}}, {'sku': {'$in': candidates}}]},
+        {field: 1 for field in INDEX_FIELDS}
+    )
+    if not product:
+        _count('not_found')
+        return None, 'database'
+
+    with _lock:
+        index.put(product)
+    _count('database_hits')
+    return product, 'database'
+
+
+def index_product(products_collection, owner_filter, product):
+    """Add or replace a product in an already built index"""
+    index = _get_index(products_collection, owner_filter, build=False)
+    if index is not None:
+        with _lock:
+            index.put(product)
+
+
+def update_indexed_product(products_collection, owner_filter, product_id, fields):
+    """Apply changed fields to an indexed product"""
+    index = _get_index(products_collection, owner_filter, build=False)
+    if index is not None:
+        with _lock:
+            index.update(product_id, fields)
+
+
+def adjust_indexed_stock(products_collection, owner_filter, deltas):
+    """Apply stock deltas {product_id: +/-quantity} to indexed products"""
+    index = _get_index(products_collection, owner_filter, build=False)
+    if index is not None:
+        with _lock:
+            for product_id, delta in deltas.items():
+                index.adjust_stock(product_id, delta)
+
+
+def remove_indexed_product(products_collection, owner_filter, product_id):
+    """Drop a deleted product from the index"""
+    index = _get_index(products_collection, owner_filter, build=False)
+    if index is not None:
+        with _lock:
+            index.remove(product_id)
+
+
+def get_product_index_stats():
+    """Lookup counters and index sizes for this worker"""
+    with _lock:
+        stats = dict(_stats)
+        stats['tenants'] = len(_indexes)
+        stats['products'] = sum(len(index.products) for index in _indexes.values())
+    return stats
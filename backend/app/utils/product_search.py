@@ -0,0 +1,388 @@
+"""
+Product Search - Per-tenant in-process search index for the product catalog
+Matches query terms against name, SKU, barcode and category tokens:
+- exact tokens
+- prefixes (binary search over the sorted vocabulary), so "cok" finds "coke"
+- one-typo matches through a deletion neighborhood (SymSpell style), so
+  "cpke" finds "coke"; pure digit tokens are matched exactly or by prefix only
+
+Every query term must match. Results are ranked by match quality and field
+weight, with a boost for products that sold well recently and a large boost
+for an exact SKU/barcode hit.
+
+Indexes are built lazily, kept current by product_events and rebuilt after
+SEARCH_INDEX_TTL seconds (which also refreshes sales velocity from Mongo).
+"""
+import math
+import re
+import heapq
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from datetime import timedelta
+from flask import current_app
+from app.utils.helpers import get_current_utc_time, get_demo_collection_name
+
+
+# Field weights
+FIELD_WEIGHTS = {'name': 3.0, 'sku': 3.0, 'barcode': 3.0, 'category': 1.0}
+
+# Match quality factors
+MATCH_EXACT = 1.0
+MATCH_PREFIX = 0.6
+MATCH_FUZZY = 0.4
+
+CODE_MATCH_BOOST = 10.0
+VELOCITY_WEIGHT = 0.5
+
+MIN_PREFIX_LENGTH = 2
+MIN_FUZZY_LENGTH = 4
+MAX_PREFIX_EXPANSIONS = 500
+
+# Fields returned with each hit
+RESULT_FIELDS = ('sku', 'barcode', 'name', 'price', 'stock', 'category', 'unit', 'image')
+
+_TOKEN_RE = re.compile(r'[0-9a-z]+')
+
+
+def tokenize(text):
+    """Lowercase alphanumeric tokens of a field value"""
+    if text is None or text == '':
+        return []
+    return _TOKEN_RE.findall(str(text).lower())
+
+
+def normalize_code(code):
+    return str(code).strip().lower() if code is not None else ''
+
+
+def _deletes(token):
+    """All strings one deletion away from token"""
+    return {token[:i] + token[i + 1:] for i in range(len(token))}
+
+
+def _fuzzy_indexable(token):
+    return len(token) >= MIN_FUZZY_LENGTH - 1 and not token.isdigit()
+
+
+def _within_one_edit(a, b):
+    """Damerau-Levenshtein distance <= 1"""
+    if a == b:
+        return True
+    la, lb = len(a), len(b)
+    if abs(la - lb) > 1:
+        return False
+    if la == lb:
+        diffs = [i for i in range(la) if a[i] != b[i]]
+        if len(diffs) == 1:
+            return True
+        return (len(diffs) == 2 and diffs[1] == diffs[0] + 1
+                and a[diffs[0]] == b[diffs[1]] and a[diffs[1]] == b[diffs[0]])
+    if la > lb:
+        a, b = b, a
+    # b is one longer than a: skip one char of b
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    return a[i:] == b[i + 1:]
+
+
+class TenantSearchIndex:
+    """Inverted index over one tenant's products"""
+
+    def __init__(self, built_at=0):
+        self.built_at = built_at
+        self.docs = {}        # product id -> result fields
+        self.doc_terms = {}   # product id -> {token: field weight}
+        self.postings = {}    # token -> {product id: field weight}
+        self.vocabulary = []  # sorted tokens, for prefix ranges
+        self.deletes = {}     # token or deletion variant -> {tokens}
+        self.codes = {}       # normalized sku/barcode -> product id
+        self.velocity = {}    # product id -> units sold recently
+
+    # ----- maintenance -----
+
+    def load(self, products):
+        """Bulk-load products into an empty index (sorts the vocabulary once)"""
+        for product in products:
+            self.put(product, bulk=True)
+        self.vocabulary = sorted(self.postings)
+        for token in self.vocabulary:
+            self._add_fuzzy_variants(token)
+
+    def put(self, product, bulk=False):
+        product_id = product['_id']
+        self.remove(product_id, keep_velocity=True)
+
+        entry = {'_id': product_id}
+        for field in RESULT_FIELDS:
+            if field in product:
+                entry[field] = product[field]
+        self.docs[product_id] = entry
+
+        terms = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(product.get(field)):
+                if weight > terms.get(token, 0):
+                    terms[token] = weight
+        self.doc_terms[product_id] = terms
+        for token, weight in terms.items():
+            posting = self.postings.get(token)
+            if posting is None:
+                posting = self.postings[token] = {}
+                if not bulk:
+                    insort(self.vocabulary, token)
+                    self._add_fuzzy_variants(token)
+            posting[product_id] = weight
+
+        for field in ('sku', 'barcode'):
+            code = normalize_code(product.get(field))
+            if code:
+                self.codes[code] = product_id
+
+    def update(self, product_id, fields):
+        entry = self.docs.get(product_id)
+        if entry is None:
+            return
+        product = dict(entry)
+        product.update(fields)
+        self.put(product)
+
+    def remove(self, product_id, keep_velocity=False):
+        entry = self.docs.pop(product_id, None)
+        if entry is None:
+            return
+        for token in self.doc_terms.pop(product_id, {}):
+            posting = self.postings.get(token)
+            if posting is None:
+                continue
+            posting.pop(product_id, None)
+            if not posting:
+                del self.postings[token]
+                self._drop_token(token)
+        for field in ('sku', 'barcode'):
+            code = normalize_code(entry.get(field))
+            if code and self.codes.get(code) == product_id:
+                del self.codes[code]
+        if not keep_velocity:
+            self.velocity.pop(product_id, None)
+
+    def adjust_stock(self, product_id, delta):
+        entry = self.docs.get(product_id)
+        if entry is not None:
+            entry['stock'] = entry.get('stock', 0) + delta
+        if delta < 0:
+            self.velocity[product_id] = self.velocity.get(product_id, 0) - delta
+
+    def _add_fuzzy_variants(self, token):
+        if _fuzzy_indexable(token):
+            for variant in _deletes(token) | {token}:
+                self.deletes.setdefault(variant, set()).add(token)
+
+    def _drop_token(self, token):
+        i = bisect_left(self.vocabulary, token)
+        if i < len(self.vocabulary) and self.vocabulary[i] == token:
+            del self.vocabulary[i]
+        if _fuzzy_indexable(token):
+            for variant in _deletes(token) | {token}:
+                tokens = self.deletes.get(variant)
+                if tokens:
+                    tokens.discard(token)
+                    if not tokens:
+                        del self.deletes[variant]
+
+    # ----- querying -----
+
+    def _expand(self, term):
+        """Vocabulary tokens matching a query term -> match factor"""
+        matches = {}
+        if term in self.postings:
+            matches[term] = MATCH_EXACT
+
+        if len(term) >= MIN_PREFIX_LENGTH:
+            i = bisect_left(self.vocabulary, term)
+            end = min(len(self.vocabulary), i + MAX_PREFIX_EXPANSIONS)
+            while i < end and self.vocabulary[i].startswith(term):
+                matches.setdefault(self.vocabulary[i], MATCH_PREFIX)
+                i += 1
+
+        if len(term) >= MIN_FUZZY_LENGTH and not term.isdigit():
+            for variant in _deletes(term) | {term}:
+                for token in self.deletes.get(variant, ()):
+                    if token not in matches and _within_one_edit(term, token):
+                        matches[token] = MATCH_FUZZY
+        return matches
+
+    def search(self, query, offset=0, limit=20):
+        """
+        Rank products for a query
+
+        Returns:
+            Tuple of (total matches, [result dicts with 'score'])
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return 0, []
+
+        # Most selective term first, so broad terms only re-score the survivors
+        expansions = []
+        for term in terms:
+            matches = self._expand(term)
+            size = sum(len(self.postings[token]) for token in matches)
+            expansions.append((size, matches))
+        expansions.sort(key=lambda item: item[0])
+
+        scores = None
+        for size, matches in expansions:
+            if scores is not None and len(scores) * len(matches) < size:
+                # Probe the remaining candidates instead of walking large postings
+                narrowed = {}
+                for product_id, total in scores.items():
+                    best = 0
+                    for token, factor in matches.items():
+                        weight = self.postings[token].get(product_id)
+                        if weight and weight * factor > best:
+                            best = weight * factor
+                    if best:
+                        narrowed[product_id] = total + best
+                scores = narrowed
+            else:
+                term_scores = {}
+                for token, factor in matches.items():
+                    for product_id, weight in self.postings[token].items():
+                        score = weight * factor
+                        if score > term_scores.get(product_id, 0):
+                            term_scores[product_id] = score
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {pid: scores[pid] + s for pid, s in term_scores.items() if pid in scores}
+            if not scores:
+                break
+
+        scores = scores or {}
+        code_hit = self.codes.get(normalize_code(query))
+        if code_hit is not None:
+            scores[code_hit] = scores.get(code_hit, 0) + CODE_MATCH_BOOST
+
+        velocity = self.velocity
+        ranked = heapq.nlargest(
+            offset + limit,
+            ((score + VELOCITY_WEIGHT * math.log1p(velocity.get(pid, 0)), pid) for pid, score in scores.items()),
+            key=lambda item: item[0]
+        )[offset:]
+
+        results = []
+        for score, product_id in ranked:
+            result = dict(self.docs[product_id])
+            result['score'] = round(score, 3)
+            results.append(result)
+        return len(scores), results
+
+
+# ===== Per-tenant registry =====
+
+_lock = threading.RLock()
+_indexes = OrderedDict()
+
+
+def _index_key(products_collection, owner_filter):
+    field, value = next(iter(owner_filter.items()))
+    return (products_collection.name, field, str(value))
+
+
+def _sales_collection(products_collection):
+    if products_collection.name == get_demo_collection_name('products'):
+        return products_collection.database[get_demo_collection_name('sales_pos')]
+    return products_collection.database['sales_pos']
+
+
+def _load_velocity(products_collection, owner_filter):
+    """Units sold per product over the last SEARCH_VELOCITY_DAYS days"""
+    days = current_app.config.get('SEARCH_VELOCITY_DAYS', 30)
+    since = get_current_utc_time() - timedelta(days=days)
+    pipeline = [
+        {'$match': {**owner_filter, 'created_at': {'$gte': since}}},
+        {'$unwind': '$items'},
+        {'$group': {'_id': '$items.id', 'units': {'$sum': '$items.quantity'}}}
+    ]
+    velocity = {}
+    for row in _sales_collection(products_collection).aggregate(pipeline):
+        velocity[str(row['_id'])] = row['units'] or 0
+    return velocity
+
+
+def _get_index(products_collection, owner_filter, build=True):
+    """Get the tenant's search index, building it when missing or expired"""
+    key = _index_key(products_collection, owner_filter)
+    ttl = current_app.config.get('SEARCH_INDEX_TTL', 600)
+    now = time.monotonic()
+
+    with _lock:
+        index = _indexes.get(key)
+        if index is not None and now - index.built_at < ttl:
+            _indexes.move_to_end(key)
+            return index
+    if not build:
+        return None
+
+    index = TenantSearchIndex(now)
+    projection = {field: 1 for field in set(RESULT_FIELDS) | set(FIELD_WEIGHTS)}
+    index.load(products_collection.find(owner_filter, projection))
+
+    velocity = _load_velocity(products_collection, owner_filter)
+    index.velocity = {pid: velocity[str(pid)] for pid in index.docs if str(pid) in velocity}
+
+    max_tenants = current_app.config.get('SEARCH_INDEX_MAX_TENANTS', 200)
+    with _lock:
+        _indexes[key] = index
+        _indexes.move_to_end(key)
+        while len(_indexes) > max_tenants:
+            _indexes.popitem(last=False)
+    return index
+
+
+def search_products(products_collection, owner_filter, query, page=1, per_page=20):
+    """
+    Search the tenant's products
+
+    Returns:
+        Dict with products, total, page, per_page and total_pages
+    """
+    index = _get_index(products_collection, owner_filter)
+    with _lock:
+        total, results = index.search(query, offset=(page - 1) * per_page, limit=per_page)
+    return {
+        'products': results,
+        'total': total,
+        'page': page,
+        'per_page': per_page,
+        'total_pages': (total + per_page - 1) // per_page if total > 0 else 0
+    }
+
+
+def _apply(products_collection, owner_filter, action):
+    index = _get_index(products_collection, owner_filter, build=False)
+    if index is not None:
+        with _lock:
+            action(index)
+
+
+def index_product(products_collection, owner_filter, product):
+    _apply(products_collection, owner_filter, lambda index: index.put(product))
+
+
+def update_indexed_product(products_collection, owner_filter, product_id, fields):
+    _apply(products_collection, owner_filter, lambda index: index.update(product_id, fields))
+
+
+def remove_indexed_product(products_collection, owner_filter, product_id):
+    _apply(products_collection, owner_filter, lambda index: index.remove(product_id))
+
+
+def adjust_indexed_stock(products_collection, owner_filter, deltas):
+    def action(index):
+        for product_id, delta in deltas.items():
+            index.adjust_stock(product_id, delta)
+    _apply(products_collection, owner_filter, action)
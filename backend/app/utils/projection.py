@@ -0,0 +1,109 @@
+"""
+Field Projection - Sparse responses for read endpoints (?fields=)
+Clients list the fields a screen needs (?fields=name,price,stock, or a
+sub-field such as items.name); the list is checked against the resource's
+whitelist and pushed down to Mongo as a projection, so the other fields are
+neither read from the server nor serialized. _id is always returned.
+Internal bookkeeping fields (HIDDEN_FIELDS) are never returned.
+"""
+import re
+from flask import request
+
+
+# Bookkeeping fields every resource carries
+COMMON_FIELDS = ('created_at', 'created_by', 'updated_at', 'updated_by')
+
+# Fields a client may select, per resource
+RESOURCE_FIELDS = {
+    # Inventory
+    'products': ('name', 'sku', 'barcode', 'category_id', 'category', 'price', 'cost', 'stock', 'min_stock',
+                 'description', 'unit', 'image', 'is_active'),
+    'categories': ('name', 'description', 'color'),
+    'stock_adjustments': ('product_id', 'product_name', 'previous_stock', 'adjustment', 'new_stock', 'reason',
+                          'adjusted_by'),
+    # POS & Sales
+    'sales': ('receipt_number', 'items', 'subtotal', 'cost_total', 'discount_type', 'discount_value',
+              'discount_amount', 'tax_rate', 'tax_amount', 'total_amount', 'payment_type', 'payment_method',
+              'payment_status', 'amount_paid', 'amount_due', 'change_due', 'due_date', 'payments',
+              'customer_id', 'customer_name', 'notes', 'status',
+              'discount', 'tax', 'total'),  # demo sales
+    'invoices': ('invoice_number', 'customer_id', 'customer_name', 'items', 'subtotal', 'tax', 'discount', 'total',
+                 'status', 'due_date'),
+    'customers': ('name', 'email', 'phone', 'company', 'address', 'credit_limit', 'balance', 'is_active'),
+    # Purchase
+    'suppliers': ('name', 'email', 'phone', 'company', 'address', 'payment_terms', 'balance', 'is_active'),
+    'purchase_orders': ('po_number', 'supplier_id', 'supplier_name', 'items', 'subtotal', 'tax', 'total',
+                        'payment_type', 'payment_status', 'amount_paid', 'amount_due', 'due_date', 'payments',
+                        'status', 'expected_date', 'received_items', 'received_at'),
+    # Accounting
+    'accounts': ('code', 'name', 'type', 'description', 'balance', 'is_active'),
+    'journal_entries': ('entry_number', 'date', 'description', 'reference', 'lines', 'total_amount', 'total_debit',
+                        'total_credit', 'reference_type', 'reference_id', 'status'),
+    # HR
+    'employees': ('employee_id', 'first_name', 'last_name', 'email', 'phone', 'department', 'position', 'salary',
+                  'hire_date', 'status', 'user_id', 'has_user_account'),
+    'attendance': ('employee_id', 'date', 'check_in', 'check_out', 'status', 'notes'),
+    # Manufacturing & Assets
+    'boms': ('product_id', 'product_name', 'quantity', 'components', 'status'),
+    'work_orders': ('bom_id', 'product_name', 'quantity', 'start_date', 'due_date', 'status'),
+    'assets': ('name', 'description', 'category', 'serial_number', 'purchase_date', 'purchase_cost',
+               'current_value', 'location', 'status'),
+    # Platform
+    'users': ('email', 'username', 'first_name', 'last_name', 'tenant_id', 'role', 'allowed_modules', 'is_active',
+              'is_super_admin', 'last_login'),
+    'tenants': ('tenant_id', 'company_name', 'email', 'contact_person', 'phone', 'address', 'license', 'limits',
+                'enabled_modules', 'is_active'),
+    'bookings': ('package_id', 'package_name', 'company_name', 'email', 'contact_person', 'phone', 'address',
+                 'status'),
+}
+
+# Internal fields left out of whole documents too: outbox records awaiting
+# enqueue (outbox_service), in-flight balance postings (ledger_service) and
+# password hashes
+HIDDEN_FIELDS = {
+    'users': ('password_hash',),
+    'sales': ('outbox_pending',),
+    'purchase_orders': ('outbox_pending',),
+    'customers': ('applied_postings',),
+    'suppliers': ('applied_postings',),
+    'accounts': ('applied_postings',),
+}
+
+FIELD_PATTERN = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z0-9_]+)*$')
+
+
+def get_projection(resource):
+    """
+    Mongo projection for the current request's ?fields=
+
+    Args:
+        resource: Key of RESOURCE_FIELDS
+
+    Returns:
+        {field: 1, '_id': 1}; when no fields were asked for (whole documents) the
+        exclusion of the resource's hidden fields, or None if it has none
+
+    Raises:
+        ValueError: For malformed fields or fields outside the whitelist
+    """
+    fields = [field.strip() for field in request.args.get('fields', '').split(',') if field.strip()]
+    if not fields:
+        hidden = HIDDEN_FIELDS.get(resource)
+        return {field: 0 for field in hidden} if hidden else None
+
+    allowed = set(RESOURCE_FIELDS[resource]) | set(COMMON_FIELDS) | {'_id'}
+    unknown = [field for field in fields if not FIELD_PATTERN.match(field) or field.split('.')[0] not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown field(s) for {resource}: {', '.join(unknown)}")
+
+    # A parent and its sub-field ('items', 'items.name') collide in Mongo - the parent covers both
+    projection = {field: 1 for field in fields if not any(field.startswith(other + '.') for other in fields)}
+    projection['_id'] = 1
+    return projection
+
+
+def with_fields(projection, *fields):
+    """Add fields a route needs itself to a projection (whole documents already have them)"""
+    if not projection or not any(projection.values()):
+        return projection
+    return {**projection, **{field: 1 for field in fields}}
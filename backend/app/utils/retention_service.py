@@ -0,0 +1,304 @@
+"""
+Retention Service - Tiered retention for activity and audit logs
+Entries stay in the hot collections (activity_logs, audit_logs) for their
+retention window - per tenant for activity logs (settings 'retention'),
+AUDIT_RETENTION_DAYS for audit logs. The nightly archive job moves older
+entries into gzip-compressed chunks in MongoDB ({collection}_archive), so
+every worker reads the same archive, and reads of older date ranges are
+served from those chunks.
+
+Every entry also carries expire_at (window + LOG_ARCHIVE_GRACE_DAYS) with a
+TTL index on it, so the hot collections stay bounded even if the job stops;
+demo activity logs are never archived and simply expire.
+
+Archive chunk - one per owner, day and archive batch:
+    {_id: <_id of its oldest entry>, <owner field>: owner, day, count,
+     groups: [{activity_type, entity_type, user_id, count}],
+     entity_ids: [distinct entity_id], first, last, data: <gzip JSON lines>}
+Without data, the chunks are the archive's manifest: counts over whole
+chunks under any mix of the GROUP_FIELDS - and the entries skipped before
+a numbered page - are read from it without decompressing anything, and an
+entity_id filter only opens the chunks listing that entity.
+"""
+import gzip
+from datetime import timedelta, timezone
+from itertools import groupby
+from flask import current_app
+from bson import json_util, Binary
+from bson.json_util import JSONOptions, JSONMode
+from app.utils.helpers import get_current_utc_time, get_collection_name
+from app.utils.cache import get_cache
+
+
+ARCHIVE_BATCH_SIZE = 5000
+
+# Fields a chunk counts its entries by in combination (groups)
+GROUP_FIELDS = ('activity_type', 'entity_type', 'user_id')
+
+# Field whose distinct values a chunk lists (entity_ids)
+KEY_FIELD = 'entity_id'
+KEY_LIST = 'entity_ids'
+
+# Chunk fields read without the entries
+MANIFEST_PROJECTION = {'data': 0, KEY_LIST: 0}
+
+# Keep ObjectIds/dates typed and read timestamps back as UTC-aware datetimes
+JSON_OPTIONS = JSONOptions(json_mode=JSONMode.RELAXED, tz_aware=True, tzinfo=timezone.utc)
+
+_retention_cache = get_cache('log_retention', maxsize=10000, ttl=300)
+
+
+def _aware(value):
+    """Mongo returns naive UTC datetimes; compare everything as aware"""
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+# =================== RETENTION WINDOWS ===================
+
+def _owner(filter_or_entry):
+    for field in ('tenant_id', 'demo_user_id'):
+        if filter_or_entry.get(field) is not None:
+            return field, filter_or_entry[field]
+    return None, None
+
+
+def get_retention_days(owner_filter, settings_collection=None):
+    """
+    Activity log retention window of a tenant, in days
+
+    Args:
+        owner_filter: {'tenant_id': ...} or {'demo_user_id': ...}
+        settings_collection: Settings collection to read (defaults to the current request's)
+    """
+    default = current_app.config.get('ACTIVITY_RETENTION_DAYS', 90)
+    field, value = _owner(owner_filter)
+    if field is None:
+        return default
+
+    settings_collection = settings_collection if settings_collection is not None else current_app.db[get_collection_name('settings')]
+    key = (settings_collection.name, field, str(value))
+    days = _retention_cache.get(key)
+    if days is None:
+        settings = settings_collection.find_one({field: value}, {'retention': 1}) or {}
+        days = settings.get('retention', {}).get('activity_log_days') or default
+        _retention_cache.set(key, days)
+    return days
+
+
+def invalidate_retention(owner_filter):
+    """Drop the cached window after the tenant's retention settings change"""
+    field, value = _owner(owner_filter)
+    _retention_cache.invalidate((current_app.db[get_collection_name('settings')].name, field, str(value)))
+
+
+def get_hot_cutoff(retention_days):
+    """Entries older than this are (or are about to be) archived"""
+    return get_current_utc_time() - timedelta(days=retention_days)
+
+
+def get_expire_at(timestamp, retention_days):
+    """TTL backstop for a hot entry: the window plus the archive grace period"""
+    grace = current_app.config.get('LOG_ARCHIVE_GRACE_DAYS', 7)
+    return timestamp + timedelta(days=retention_days + grace)
+
+
+def apply_retention_change(owner_filter, retention_days):
+    """
+    Recompute expire_at of a tenant's hot activity logs for a new window
+    (a longer window must not let the TTL delete entries before they are archived)
+    """
+    invalidate_retention(owner_filter)
+    grace = current_app.config.get('LOG_ARCHIVE_GRACE_DAYS', 7)
+    milliseconds = (retention_days + grace) * 24 * 3600 * 1000
+    current_app.db[get_collection_name('activity_logs')].update_many(
+        owner_filter,
+        [{'$set': {'expire_at': {'$add': ['$timestamp', milliseconds]}}}]
+    )
+
+
+# =================== ARCHIVE CHUNKS ===================
+
+def get_archive_collection(collection_name):
+    """Archive of a hot collection ('activity_logs' -> activity_logs_archive)"""
+    return current_app.db[f"{collection_name}_archive"]
+
+
+def _start_of_day(timestamp):
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _write_chunk(archive, owner_field, owner_value, day, entries):
+    """
+    Store one day's entries of a batch (oldest first) as a compressed chunk
+    Keyed by the oldest entry, so re-archiving a batch whose delete did not
+    happen replaces the chunk instead of adding a second copy
+    """
+    lines = ''.join(json_util.dumps(entry, json_options=JSON_OPTIONS) + '\n' for entry in entries)
+    groups = {}
+    keys = {}
+    for entry in entries:
+        group = tuple(entry.get(field) for field in GROUP_FIELDS)
+        groups[group] = groups.get(group, 0) + 1
+        if entry.get(KEY_FIELD) is not None:
+            keys[str(entry[KEY_FIELD])] = entry[KEY_FIELD]
+    archive.replace_one(
+        {'_id': entries[0]['_id']},
+        {
+            owner_field: owner_value,
+            'day': day,
+            'count': len(entries),
+            'groups': [{**dict(zip(GROUP_FIELDS, group)), 'count': count} for group, count in groups.items()],
+            KEY_LIST: list(keys.values()),
+            'first': entries[0]['timestamp'],
+            'last': entries[-1]['timestamp'],
+            'data': Binary(gzip.compress(lines.encode('utf-8'))),
+            'archived_at': get_current_utc_time()
+        },
+        upsert=True
+    )
+
+
+def _read_chunk(chunk):
+    lines = gzip.decompress(chunk['data']).decode('utf-8').splitlines()
+    return [json_util.loads(line, json_options=JSON_OPTIONS) for line in lines if line.strip()]
+
+
+def _chunk_query(owner_filter, start_date, end_date, match):
+    field, value = _owner(owner_filter)
+    query = {field: value, 'day': {'$gte': _start_of_day(start_date), '$lte': _start_of_day(end_date)}}
+    if KEY_FIELD in match:
+        # Chunks archived before entity_ids was listed have to be opened
+        query['$or'] = [{KEY_LIST: match[KEY_FIELD]}, {KEY_LIST: {'$exists': False}}]
+    return query
+
+
+def _manifest_count(chunk, start_date, end_date, match):
+    """Entries of a chunk matching a query, from its manifest (None when the chunk has to be read)"""
+    if KEY_FIELD in match or 'groups' not in chunk or set(match) - set(GROUP_FIELDS):
+        return None
+    if not (start_date <= _aware(chunk['first']) and _aware(chunk['last']) <= end_date):
+        return None
+    return sum(
+        group['count'] for group in chunk['groups']
+        if all(group.get(key) == expected for key, expected in match.items())
+    )
+
+
+def _matches(entry, start_date, end_date, match):
+    return start_date <= entry['timestamp'] <= end_date and all(
+        entry.get(key) == expected for key, expected in match.items()
+    )
+
+
+def read_archived_logs(collection_name, owner_filter, start_date, end_date, match=None, skip=0):
+    """
+    Yield archived entries of one owner between two dates, newest first
+
+    Args:
+        collection_name: Hot collection the entries came from ('activity_logs', 'audit_logs')
+        owner_filter: {'tenant_id': ...}
+        start_date, end_date: Inclusive range (end_date None = now)
+        match: Extra equality conditions {field: value}
+        skip: Matching entries to leave out first (whole days are skipped on their manifest counts)
+    """
+    start_date = _aware(start_date)
+    end_date = _aware(end_date) if end_date else get_current_utc_time()
+    match = match or {}
+
+    archive = get_archive_collection(collection_name)
+    chunks = archive.find(_chunk_query(owner_filter, start_date, end_date, match), MANIFEST_PROJECTION).sort('day', -1)
+    seen = set()
+    # Entries of a day may be spread over several chunks - sort them together
+    for _, day_chunks in groupby(chunks, key=lambda chunk: chunk['day']):
+        day_chunks = list(day_chunks)
+        if skip:
+            counts = [_manifest_count(chunk, start_date, end_date, match) for chunk in day_chunks]
+            if None not in counts and sum(counts) <= skip:
+                skip -= sum(counts)
+                continue
+
+        chunk_ids = [chunk['_id'] for chunk in day_chunks]
+        entries = [entry for chunk in archive.find({'_id': {'$in': chunk_ids}}, {'data': 1}) for entry in _read_chunk(chunk)]
+        entries.sort(key=lambda entry: (entry['timestamp'], entry['_id']), reverse=True)
+        for entry in entries:
+            if entry['_id'] in seen:
+                continue
+            seen.add(entry['_id'])
+            if _matches(entry, start_date, end_date, match):
+                if skip:
+                    skip -= 1
+                    continue
+                yield entry
+
+
+def count_archived_logs(collection_name, owner_filter, start_date, end_date, match=None):
+    """
+    Count what read_archived_logs would yield
+    From the manifest for conditions on the GROUP_FIELDS; only chunks cut by
+    the range ends (or listing a filtered entity) are decompressed.
+    """
+    match = match or {}
+    start_date = _aware(start_date)
+    end_date = _aware(end_date) if end_date else get_current_utc_time()
+    archive = get_archive_collection(collection_name)
+    total = 0
+    for chunk in archive.find(_chunk_query(owner_filter, start_date, end_date, match), MANIFEST_PROJECTION):
+        count = _manifest_count(chunk, start_date, end_date, match)
+        if count is None:
+            entries = _read_chunk(archive.find_one({'_id': chunk['_id']}, {'data': 1}))
+            count = sum(1 for entry in entries if _matches(entry, start_date, end_date, match))
+        total += count
+    return total
+
+
+# =================== ARCHIVE JOB ===================
+
+def _archive_owner(collection, owner_field, owner_value, cutoff):
+    """Move one owner's entries older than cutoff into archive chunks; returns how many"""
+    archive = get_archive_collection(collection.name)
+    moved = 0
+    query = {owner_field: owner_value, 'timestamp': {'$lt': cutoff}}
+    while True:
+        batch = list(collection.find(query).sort('timestamp', 1).limit(ARCHIVE_BATCH_SIZE))
+        if not batch:
+            return moved
+
+        by_day = {}
+        for entry in batch:
+            entry['timestamp'] = _aware(entry['timestamp'])
+            by_day.setdefault(_start_of_day(entry['timestamp']), []).append(entry)
+        for day, entries in by_day.items():
+            _write_chunk(archive, owner_field, owner_value, day, entries)
+
+        # Only delete what is safely archived
+        collection.delete_many({'_id': {'$in': [entry['_id'] for entry in batch]}})
+        moved += len(batch)
+
+
+def archive_logs():
+    """
+    Archive activity and audit log entries that are past their retention window
+
+    Returns:
+        Dict of {collection name: entries archived}
+    """
+    db = current_app.db
+    archived = {}
+
+    activity = db['activity_logs']
+    settings = db['settings']
+    count = 0
+    for tenant_id in activity.distinct('tenant_id'):
+        days = get_retention_days({'tenant_id': tenant_id}, settings_collection=settings)
+        count += _archive_owner(activity, 'tenant_id', tenant_id, get_hot_cutoff(days))
+    archived['activity_logs'] = count
+
+    audit = db['audit_logs']
+    cutoff = get_hot_cutoff(current_app.config.get('AUDIT_RETENTION_DAYS', 365))
+    count = 0
+    # Platform-level entries have no tenant_id and are archived with tenant_id None
+    for tenant_id in set(audit.distinct('tenant_id')) | {None}:
+        count += _archive_owner(audit, 'tenant_id', tenant_id, cutoff)
+    archived['audit_logs'] = count
+
+    return archived
@@ -0,0 +1,374 @@
+"""
+Sales Rollups - Incrementally maintained sales figures for reports
+sales_rollups holds one document per tenant, UTC day and hour:
+
+    {_id: '<owner>:<YYYYMMDD>:<HH>', tenant_id, day, hour, count, total,
+     subtotal, cost_total, tax, discount, cash_total, credit_total,
+     payments_received, payments_count, products: {<product id>: {qty, revenue}},
+     events: [<latest event keys>]}
+
+Each sale adds itself to the hour it was made in, and each payment against
+a credit sale to the hour it was received in, so reports sum a few hundred
+rollups (days x trading hours) instead of reading the sales. The increments
+are outbox effects (outbox_service.rollup_effect), written with the sale and
+retried until applied; apply_rollup records the effect's key in the rollup
+(events) by the same $inc upsert, so a retry never counts it twice. The _id
+is derived from the hour, so the upsert cannot create a second document for
+it, and events keeps the last ROLLUP_EVENTS_KEPT keys: an hour only takes
+sales and payments while it is the current hour, so a redelivery is still
+in the window unless that many events reached the hour after the original.
+
+rebuild_sales_rollups recomputes them from the sales (rebuild_sales_rollups.py)
+after a bulk import. It is not safe to run while sales are being made: it
+drops the event keys, and increments still in the outbox would be added on
+top of sales it already counted. Run it once over all days to move rollups
+written before their _id was derived onto the derived _ids.
+"""
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+from app.utils.helpers import is_demo_request, get_collection_name, get_demo_collection_name
+from app.middleware.auth import get_current_user
+
+
+# Amounts summed by sum_sales_rollups
+ROLLUP_FIELDS = ('count', 'total', 'subtotal', 'cost_total', 'tax', 'discount', 'cash_total', 'credit_total',
+                 'payments_received', 'payments_count')
+
+# Event keys an hour remembers (its latest), so a redelivered increment is not added twice
+ROLLUP_EVENTS_KEPT = 1000
+
+
+def get_tenant_filter():
+    """Get the filter for tenant/demo data isolation"""
+    user = get_current_user()
+    if is_demo_request():
+        return {'demo_user_id': user['_id']}
+    return {'tenant_id': ObjectId(user['tenant_id'])}
+
+
+def get_sales_rollups_collection():
+    return current_app.db[get_collection_name('sales_rollups')]
+
+
+def _rollups_collection_name(sales_collection_name):
+    """sales_pos -> sales_rollups, for the regular or demo collection"""
+    if sales_collection_name == get_demo_collection_name('sales_pos'):
+        return get_demo_collection_name('sales_rollups')
+    return 'sales_rollups'
+
+
+def _owner(document):
+    """(owner field, owner) of a sale"""
+    for owner_field in ('tenant_id', 'demo_user_id'):
+        if document.get(owner_field) is not None:
+            return owner_field, document[owner_field]
+    return None, None
+
+
+def _hour_key(timestamp):
+    """(UTC day, hour) a timestamp is rolled up into"""
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0), timestamp.hour
+
+
+def _rollup_id(owner, day, hour):
+    """_id of an owner's rollup for a UTC day and hour"""
+    return f"{owner}:{day:%Y%m%d}:{hour:02d}"
+
+
+def _naive_utc(timestamp):
+    """Stored dates come back naive (UTC) - compare bounds the same way"""
+    if timestamp.tzinfo is not None:
+        return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+def _product_key(item):
+    """Rollup key of a sale line's product (None when it cannot be a field name)"""
+    product_id = item.get('id') or item.get('product_id')
+    if not product_id:
+        return None
+    product_id = str(product_id)
+    if '.' in product_id or product_id.startswith('$'):
+        return None
+    return product_id
+
+
+# =================== INCREMENTAL UPDATES ===================
+
+def sale_rollup(sales_collection_name, sale):
+    """Increment of a newly written sale, for rollup_effect (None for a sale without an owner)"""
+    owner_field, owner = _owner(sale)
+    if owner_field is None:
+        return None
+    day, hour = _hour_key(sale['created_at'])
+
+    total = sale.get('total_amount', 0)
+    amounts = {
+        'count': 1,
+        'total': total,
+        'subtotal': sale.get('subtotal', 0),
+        'cost_total': sale.get('cost_total', 0),
+        # Demo sales store tax/discount instead of tax_amount/discount_amount
+        'tax': sale.get('tax_amount', sale.get('tax', 0)),
+        'discount': sale.get('discount_amount', sale.get('discount', 0)),
+        'credit_total' if sale.get('payment_type') == 'credit' else 'cash_total': total
+    }
+    products = {}
+    for item in sale.get('items', []):
+        product_key = _product_key(item)
+        if product_key is None:
+            continue
+        product = products.setdefault(product_key, {'qty': 0, 'revenue': 0})
+        quantity = item.get('quantity', 0)
+        product['qty'] += quantity
+        product['revenue'] += item.get('price', 0) * quantity
+
+    return {
+        'collection': _rollups_collection_name(sales_collection_name),
+        'owner_field': owner_field,
+        'owner': owner,
+        'day': day,
+        'hour': hour,
+        'amounts': amounts,
+        'products': products
+    }
+
+
+def payment_rollup(sales_collection_name, sale, amount, received_at):
+    """Increment of a payment against a credit sale, in the hour it was received in"""
+    owner_field, owner = _owner(sale)
+    if owner_field is None:
+        return None
+    day, hour = _hour_key(received_at)
+    return {
+        'collection': _rollups_collection_name(sales_collection_name),
+        'owner_field': owner_field,
+        'owner': owner,
+        'day': day,
+        'hour': hour,
+        'amounts': {'payments_received': amount, 'payments_count': 1},
+        'products': {}
+    }
+
+
+def apply_rollup(db, rollup, event_key):
+    """
+    Add an increment (sale_rollup / payment_rollup) to its hour once per event key
+    The key is pushed to the rollup's events by the same update that adds the
+    amounts, so the increment and its marker cannot be split by a crash.
+    The upsert targets the hour's derived _id, so it never inserts a second
+    document for an hour that already holds the key.
+    """
+    if rollup is None:
+        return
+    increments = dict(rollup['amounts'])
+    for product_key, figures in rollup['products'].items():
+        increments[f'products.{product_key}.qty'] = figures['qty']
+        increments[f'products.{product_key}.revenue'] = figures['revenue']
+
+    collection = db[rollup['collection']]
+    query = {
+        '_id': _rollup_id(rollup['owner'], rollup['day'], rollup['hour']),
+        'events': {'$ne': event_key}
+    }
+    update = {
+        '$inc': increments,
+        '$push': {'events': {'$each': [event_key], '$slice': -ROLLUP_EVENTS_KEPT}},
+        '$setOnInsert': {rollup['owner_field']: rollup['owner'], 'day': rollup['day'], 'hour': rollup['hour']}
+    }
+    try:
+        collection.update_one(query, update, upsert=True)
+    except DuplicateKeyError:
+        # The hour exists: either it already holds the key (nothing to do) or
+        # another event created it first (add to it)
+        collection.update_one(query, update)
+
+
+# =================== READING ===================
+
+def find_sales_rollups(collection, owner_filter, start, end=None, products=False):
+    """
+    Rollups of one owner between two times, at hour precision: the hour that
+    contains `start` is included whole, `end` is exclusive - hours that begin
+    before it are included (an end of midnight leaves that day out)
+
+    Args:
+        collection: Rollups collection (get_sales_rollups_collection(), or the demo one)
+        owner_filter: {'tenant_id': ...} or {'demo_user_id': ...}
+        start: Start time
+        end: End time, exclusive (default: no upper bound)
+        products: Also read the per-product figures
+
+    Returns:
+        List of rollup documents
+    """
+    start_key = _hour_key(start)
+    day_range = {'$gte': start_key[0]}
+    if end is not None:
+        # Last hour that begins before end
+        end_key = _hour_key(end - timedelta(microseconds=1))
+        day_range['$lte'] = end_key[0]
+
+    projection = {'events': 0} if products else {'events': 0, 'products': 0}
+    rollups = collection.find({**owner_filter, 'day': day_range}, projection)
+
+    # Only the first and last day can hold hours outside the range
+    start_key = (_naive_utc(start_key[0]), start_key[1])
+    if end is not None:
+        end_key = (_naive_utc(end_key[0]), end_key[1])
+    return [
+        rollup for rollup in rollups
+        if start_key <= (_naive_utc(rollup['day']), rollup['hour'])
+        and (end is None or (_naive_utc(rollup['day']), rollup['hour']) <= end_key)
+    ]
+
+
+def sum_sales_rollups(rollups):
+    """
+    Add up rollups
+
+    Returns:
+        Dict of ROLLUP_FIELDS, plus products ({product id: {qty, revenue}})
+        when the rollups were read with their products
+    """
+    totals = {field: 0 for field in ROLLUP_FIELDS}
+    products = {}
+
+    for rollup in rollups:
+        for field in ROLLUP_FIELDS:
+            totals[field] += rollup.get(field, 0)
+        for product_id, figures in rollup.get('products', {}).items():
+            product = products.setdefault(product_id, {'qty': 0, 'revenue': 0})
+            product['qty'] += figures.get('qty', 0)
+            product['revenue'] += figures.get('revenue', 0)
+
+    for field in ROLLUP_FIELDS:
+        if field not in ('count', 'payments_count'):
+            totals[field] = round(totals[field], 2)
+    if products:
+        totals['products'] = {
+            product_id: {'qty': figures['qty'], 'revenue': round(figures['revenue'], 2)}
+            for product_id, figures in products.items()
+        }
+    return totals
+
+
+def get_sales_totals(start, end=None, products=False):
+    """Sales figures of the current tenant between two times (see find_sales_rollups)"""
+    return sum_sales_rollups(
+        find_sales_rollups(get_sales_rollups_collection(), get_tenant_filter(), start, end, products=products)
+    )
+
+
+# =================== REBUILD ===================
+
+def _hour_group(owner_field, date_field):
+    """$group _id of an owner's hour - the day as a string, parsed back by _rollup_key"""
+    return {
+        'owner': f'${owner_field}',
+        'day': {'$dateToString': {'format': '%Y-%m-%d', 'date': date_field}},
+        'hour': {'$hour': date_field}
+    }
+
+
+def _rollup_key(group_id):
+    return group_id['owner'], datetime.strptime(group_id['day'], '%Y-%m-%d').replace(tzinfo=timezone.utc), group_id['hour']
+
+
+def rebuild_sales_rollups(since=None):
+    """
+    Recompute the rollups from the sales (and their payments)
+    Rollups for days before `since` (default: all days that have sales) are
+    left alone. Not safe while sales are made or rollup effects wait in the
+    outbox (see the module docstring).
+
+    Returns:
+        Dict of {rollups collection name: rollup documents written}
+    """
+    db = current_app.db
+    rebuilt = {}
+
+    for sales_name, owner_field in (('sales_pos', 'tenant_id'), (get_demo_collection_name('sales_pos'), 'demo_user_id')):
+        sales = db[sales_name]
+        rollups = db[_rollups_collection_name(sales_name)]
+
+        start = since
+        if start is None:
+            oldest = sales.find_one({'created_at': {'$ne': None}}, {'created_at': 1}, sort=[('created_at', 1)])
+            if not oldest:
+                rebuilt[rollups.name] = 0
+                continue
+            start = oldest['created_at']
+        start, _ = _hour_key(start)
+
+        match = {'$match': {owner_field: {'$ne': None}, 'created_at': {'$gte': start}}}
+        hour_of_sale = _hour_group(owner_field, '$created_at')
+        documents = {}
+
+        def rollup_for(group_id):
+            return documents.setdefault(_rollup_key(group_id), {})
+
+        # Sale totals per hour
+        for row in sales.aggregate([
+            match,
+            {'$group': {
+                '_id': hour_of_sale,
+                'count': {'$sum': 1},
+                'total': {'$sum': '$total_amount'},
+                'subtotal': {'$sum': '$subtotal'},
+                'cost_total': {'$sum': '$cost_total'},
+                'tax': {'$sum': {'$ifNull': ['$tax_amount', '$tax']}},
+                'discount': {'$sum': {'$ifNull': ['$discount_amount', '$discount']}},
+                'credit_total': {'$sum': {'$cond': [{'$eq': ['$payment_type', 'credit']}, '$total_amount', 0]}}
+            }}
+        ], allowDiskUse=True):
+            rollup = rollup_for(row.pop('_id'))
+            rollup.update(row)
+            rollup['cash_total'] = row['total'] - row['credit_total']
+
+        # Quantities and revenue per hour and product
+        for row in sales.aggregate([
+            match,
+            {'$unwind': '$items'},
+            {'$group': {
+                '_id': {**hour_of_sale, 'product': {'$ifNull': ['$items.id', '$items.product_id']}},
+                'qty': {'$sum': '$items.quantity'},
+                'revenue': {'$sum': {'$multiply': ['$items.price', '$items.quantity']}}
+            }}
+        ], allowDiskUse=True):
+            product_key = _product_key({'id': row['_id']['product']})
+            if product_key is not None:
+                rollup_for(row['_id']).setdefault('products', {})[product_key] = {'qty': row['qty'], 'revenue': row['revenue']}
+
+        # Payments per hour received (on sales of any age)
+        for row in sales.aggregate([
+            {'$match': {owner_field: {'$ne': None}, 'payments.date': {'$gte': start}}},
+            {'$unwind': '$payments'},
+            {'$match': {'payments.date': {'$gte': start}}},
+            {'$group': {
+                '_id': _hour_group(owner_field, '$payments.date'),
+                'payments_received': {'$sum': '$payments.amount'},
+                'payments_count': {'$sum': 1}
+            }}
+        ], allowDiskUse=True):
+            rollup_for(row.pop('_id')).update(row)
+
+        rollups.delete_many({'day': {'$gte': start}})
+        operations = [
+            UpdateOne(
+                {'_id': _rollup_id(owner_value, day, hour)},
+                {'$set': {owner_field: owner_value, 'day': day, 'hour': hour, **fields}},
+                upsert=True
+            )
+            for (owner_value, day, hour), fields in documents.items()
+        ]
+        for offset in range(0, len(operations), 1000):
+            rollups.bulk_write(operations[offset:offset + 1000], ordered=False)
+        rebuilt[rollups.name] = len(operations)
+
+    return rebuilt
@@ -0,0 +1,205 @@
+"""
+Sequence Service - Per-tenant document numbering
+Hands out receipt, invoice, PO, journal and employee numbers from a counters
+collection updated atomically with find_one_and_update/$inc
+
+Numbers are unique under concurrency. With SEQUENCE_BLOCK_SIZE > 1 each worker
+reserves a block of numbers per counter, so a hot tenant does not serialize on
+one counter document; numbers then stay unique but are no longer strictly in
+creation order across workers, and unused numbers of a block are skipped when
+a worker restarts.
+"""
+import threading
+from flask import current_app
+from bson import ObjectId
+from pymongo import ReturnDocument
+from app.utils.helpers import get_current_utc_time, is_demo_request, get_collection_name, get_demo_collection_name
+from app.middleware.auth import get_current_user
+
+
+# Document number formats
+SEQUENCES = {
+    'receipt': {'collection': 'sales_pos', 'field': 'receipt_number', 'prefix': 'REC-', 'width': 6},
+    'invoice': {'collection': 'invoices', 'field': 'invoice_number', 'prefix': 'INV-', 'width': 5},
+    'purchase_order': {'collection': 'purchase_orders', 'field': 'po_number', 'prefix': 'PO-', 'width': 5},
+    'journal_entry': {'collection': 'journal_entries', 'field': 'entry_number', 'prefix': 'JE-', 'width': 6},
+    'employee': {'collection': 'employees', 'field': 'employee_id', 'prefix': 'EMP-', 'width': 4},
+}
+
+COUNTERS_COLLECTION = 'counters'
+
+# Per-worker state: pre-allocated blocks {key: [next, last]} and counters already seeded
+_lock = threading.Lock()
+_blocks = {}
+_seeded = set()
+
+
+def get_counters_collection():
+    return current_app.db[COUNTERS_COLLECTION]
+
+
+def get_tenant_filter():
+    """Get tenant filter for data isolation"""
+    user = get_current_user()
+    if is_demo_request():
+        return {'demo_user_id': user['_id']}
+    return {'tenant_id': ObjectId(user['tenant_id'])}
+
+
+def counter_key(collection_name, owner_value, name):
+    """Build the counters _id for a sequence of one tenant"""
+    return f"{collection_name}:{owner_value}:{name}"
+
+
+def format_number(name, value):
+    """Format a sequence value, e.g. 12 -> REC-000012"""
+    spec = SEQUENCES[name]
+    return f"{spec['prefix']}{value:0{spec['width']}d}"
+
+
+def parse_number(name, number):
+    """Parse a formatted document number back to its integer value"""
+    prefix = SEQUENCES[name]['prefix']
+    if not isinstance(number, str) or not number.startswith(prefix):
+        return None
+    try:
+        return int(number[len(prefix):])
+    except ValueError:
+        return None
+
+
+def next_number(name):
+    """
+    Allocate the next document number for the current tenant
+
+    Args:
+        name: Sequence name (receipt, invoice, purchase_order, journal_entry, employee)
+
+    Returns:
+        Formatted document number, e.g. 'REC-000042'
+    """
+    spec = SEQUENCES[name]
+    owner_filter = get_tenant_filter()
+    collection_name = get_collection_name(spec['collection'])
+    owner_value = next(iter(owner_filter.values()))
+    key = counter_key(collection_name, owner_value, name)
+
+    if key not in _seeded:
+        _seed_from_existing(key, name, collection_name, owner_filter)
+
+    return format_number(name, _allocate(key))
+
+
+def _take_from_block(key):
+    """Next value of this worker's block for key, or None when it is used up"""
+    with _lock:
+        block = _blocks.get(key)
+        if block and block[0] <= block[1]:
+            value = block[0]
+            block[0] += 1
+            return value
+    return None
+
+
+def _allocate(key):
+    """Take the next value from this worker's block, reserving a new block when empty"""
+    value = _take_from_block(key)
+    if value is not None:
+        return value
+
+    # Reserve outside the lock, so one round trip does not hold up every other counter
+    block_size = max(1, current_app.config.get('SEQUENCE_BLOCK_SIZE', 1))
+    counter = get_counters_collection().find_one_and_update(
+        {'_id': key},
+        {
+            '$inc': {'seq': block_size},
+            '$set': {'updated_at': get_current_utc_time()}
+        },
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    first, last = counter['seq'] - block_size + 1, counter['seq']
+
+    with _lock:
+        block = _blocks.get(key)
+        # A thread that raced us may have stored a block with numbers left - keep it,
+        # the rest of ours is skipped like any unused block
+        if not block or block[0] > block[1]:
+            _blocks[key] = [first + 1, last]
+    return first
+
+
+def _number_value(spec):
+    """Aggregation expression for the integer value of a stored number (0 when it does not parse)"""
+    return {'$convert': {
+        'input': {'$substrCP': [f"${spec['field']}", len(spec['prefix']), 32]},
+        'to': 'long',
+        'onError': 0,
+        'onNull': 0
+    }}
+
+
+def _seed_from_existing(key, name, collection_name, owner_filter):
+    """
+    Make sure a counter starts above numbers handed out before counters existed
+    A counter that exists was seeded when it was created; otherwise the highest
+    stored number is found numerically (past the pad width, a string sort
+    would put REC-999999 above REC-1000000)
+    """
+    if get_counters_collection().find_one({'_id': key}, {'_id': 1}) is None:
+        spec = SEQUENCES[name]
+        rows = list(current_app.db[collection_name].aggregate([
+            {'$match': {**owner_filter, spec['field']: {'$regex': f"^{spec['prefix']}"}}},
+            {'$group': {'_id': None, 'highest': {'$max': _number_value(spec)}}}
+        ]))
+        highest = int(rows[0]['highest']) if rows and rows[0]['highest'] else None
+
+        if highest:
+            get_counters_collection().update_one(
+                {'_id': key},
+                {'$max': {'seq': highest}},
+                upsert=True
+            )
+    with _lock:
+        _seeded.add(key)
+
+
+def backfill_sequences():
+    """
+    Seed counters from the highest numbers already stored for every tenant
+    Safe to run repeatedly - counters only ever move forward
+
+    Returns:
+        Number of counters seeded
+    """
+    db = current_app.db
+    counters = get_counters_collection()
+    seeded = 0
+
+    for name, spec in SEQUENCES.items():
+        targets = [
+            (spec['collection'], 'tenant_id'),
+            (get_demo_collection_name(spec['collection']), 'demo_user_id'),
+        ]
+        for collection_name, owner_field in targets:
+            pipeline = [
+                {'$match': {
+                    owner_field: {'$ne': None},
+                    spec['field']: {'$regex': f"^{spec['prefix']}"}
+                }},
+                {'$group': {
+                    '_id': f'${owner_field}',
+                    'highest': {'$max': _number_value(spec)}
+                }}
+            ]
+            for row in db[collection_name].aggregate(pipeline):
+                if not row['highest']:
+                    continue
+                counters.update_one(
+                    {'_id': counter_key(collection_name, row['_id'], name)},
+                    {'$max': {'seq': int(row['highest'])}},
+                    upsert=True
+                )
+                seeded += 1
+
+    return seeded
@@ -1,10 +1,20 @@
 """
 Settings Service - System Configuration Management
 Handles tax, currency, and other tenant-specific settings
+
+Settings are read on hot paths (every tax calculation and formatted amount),
+so each worker caches a tenant's document (SETTINGS_CACHE_TTL seconds) and
+memoizes it for the rest of the request. Every update bumps the document's
+version; a worker compares its cached copy against the current version, read
+through a short-TTL cache (SETTINGS_VERSION_CACHE_TTL seconds), which bounds
+how long another worker serves settings that changed elsewhere.
 """
-from flask import current_app
+from flask import current_app, g
 from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from app.utils.helpers import get_current_utc_time, is_demo_request, get_collection_name
+from app.utils.cache import get_cache
 from app.middleware.auth import get_current_user
 
 
@@ -50,9 +60,17 @@ DEFAULT_SETTINGS = {
         'starting_number': 1,
         'terms': 'Payment due within 30 days',
         'notes': '',
+    },
+    'retention': {
+        'activity_log_days': None,  # None = platform default (ACTIVITY_RETENTION_DAYS)
     }
 }
 
+# (collection, owner field, owner) -> settings document
+_settings_cache = get_cache('settings', ttl=300)
+# same key -> current settings version
+_settings_version_cache = get_cache('settings_versions', ttl=5)
+
 
 def get_settings_collection():
     """Get the settings collection"""
@@ -67,29 +85,91 @@ def get_tenant_filter():
     return {'tenant_id': ObjectId(user['tenant_id'])}
 
 
+def _settings_key(settings_coll, filter_query):
+    field, value = next(iter(filter_query.items()))
+    return (settings_coll.name, field, str(value))
+
+
+def _materialize_settings(settings_coll, filter_query):
+    """
+    Load the tenant's settings, creating them from the defaults on first use
+    The unique owner index (index_registry) keeps concurrent first uses to one document
+    """
+    try:
+        return settings_coll.find_one_and_update(
+            filter_query,
+            {'$setOnInsert': {
+                **DEFAULT_SETTINGS,
+                'version': 1,
+                'created_at': get_current_utc_time()
+            }},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # Another worker's upsert won the race
+        return settings_coll.find_one(filter_query)
+
+
+def _get_settings_version(settings_coll, filter_query, key):
+    """Current version of the tenant's settings (None if they don't exist yet)"""
+    version = _settings_version_cache.get(key)
+    if version is None:
+        doc = settings_coll.find_one(filter_query, {'version': 1})
+        if not doc:
+            return None
+        # Settings created before versioning count as version 0
+        version = doc.get('version', 0)
+        _settings_version_cache.set(key, version)
+    return version
+
+
+def _request_settings():
+    """Settings already resolved during this request"""
+    if 'settings' not in g:
+        g.settings = {}
+    return g.settings
+
+
 def get_settings():
     """
     Get all settings for current tenant
     Creates default settings if none exist
     """
     try:
-        settings = get_settings_collection().find_one(get_tenant_filter())
-        
-        if not settings:
-            # Create default settings
-            settings = {
-                **get_tenant_filter(),
-                **DEFAULT_SETTINGS,
-                'created_at': get_current_utc_time()
-            }
-            get_settings_collection().insert_one(settings)
-        
+        settings_coll = get_settings_collection()
+        filter_query = get_tenant_filter()
+        key = _settings_key(settings_coll, filter_query)
+
+        resolved = _request_settings()
+        if key in resolved:
+            return resolved[key]
+
+        settings = _settings_cache.get(key)
+        if settings is not None and settings.get('version', 0) != _get_settings_version(settings_coll, filter_query, key):
+            settings = None
+
+        if settings is None:
+            settings = settings_coll.find_one(filter_query) or _materialize_settings(settings_coll, filter_query)
+            _settings_cache.set(key, settings)
+            _settings_version_cache.set(key, settings.get('version', 0))
+
+        resolved[key] = settings
         return settings
     except Exception as e:
         print(f"Error getting settings: {e}")
         return DEFAULT_SETTINGS
 
 
+def invalidate_settings(filter_query=None):
+    """Drop this worker's cached settings of a tenant (defaults to the current one)"""
+    settings_coll = get_settings_collection()
+    key = _settings_key(settings_coll, filter_query or get_tenant_filter())
+    _settings_cache.invalidate(key)
+    _settings_version_cache.invalidate(key)
+    _request_settings().pop(key, None)
+
+
 def update_settings(category, data):
     """
     Update settings for a specific category
@@ -105,17 +185,6 @@ def update_settings(category, data):
         settings_coll = get_settings_collection()
         filter_query = get_tenant_filter()
         
-        # Ensure settings exist
-        existing = settings_coll.find_one(filter_query)
-        if not existing:
-            # Create with defaults first
-            new_settings = {
-                **filter_query,
-                **DEFAULT_SETTINGS,
-                'created_at': get_current_utc_time()
-            }
-            settings_coll.insert_one(new_settings)
-        
         # Build update query for nested category
         update_data = {}
         for key, value in data.items():
@@ -123,11 +192,20 @@ def update_settings(category, data):
         
         update_data['updated_at'] = get_current_utc_time()
         
-        settings_coll.update_one(
+        # Ensure settings exist (no-op once materialized), then apply the change
+        # and bump the version so other workers drop their cached copy
+        _materialize_settings(settings_coll, filter_query)
+        settings = settings_coll.find_one_and_update(
             filter_query,
-            {'$set': update_data}
+            {'$set': update_data, '$inc': {'version': 1}},
+            return_document=ReturnDocument.AFTER
         )
         
+        invalidate_settings(filter_query)
+        key = _settings_key(settings_coll, filter_query)
+        _settings_cache.set(key, settings)
+        _settings_version_cache.set(key, settings.get('version', 0))
+        
         return get_settings()
         
     except Exception as e:
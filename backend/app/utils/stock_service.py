@@ -0,0 +1,174 @@
+"""
+Stock Reservation Service - Oversell-safe stock decrements
+Shared by POS checkout, the legacy customer transactions endpoint and the demo POS
+
+Every cart is reserved all-or-nothing without a lock:
+- one unordered bulk write applies a conditional decrement (stock >= qty) per product
+  and tags each decremented product with a reservation token
+- if any product could not be decremented, the tagged ones are compensated
+  (the token tells us exactly which decrements were applied)
+- when the shortfall was caused by a concurrent terminal rather than real stock,
+  the reservation is retried and counted as contention
+"""
+import threading
+from flask import current_app
+from bson import ObjectId
+from pymongo import UpdateOne
+from app.utils.helpers import get_current_utc_time
+from app.utils import product_events
+
+# Product field holding tokens of in-flight reservations
+RESERVATION_FIELD = 'pending_reservations'
+
+# Process-wide reservation metrics
+_stats_lock = threading.Lock()
+_stats = {
+    'reservations': 0,
+    'rollbacks': 0,
+    'contention_retries': 0,
+    'insufficient_stock': 0,
+}
+
+
+class StockReservationError(Exception):
+    """Raised when a cart could not be reserved"""
+
+
+class InsufficientStockError(StockReservationError):
+    """Raised when a product does not have enough stock (or no longer exists)"""
+
+    def __init__(self, product_id, requested, product=None):
+        self.product_id = product_id
+        self.requested = requested
+        self.product = product
+        self.available = product.get('stock', 0) if product else 0
+        if product:
+            message = f"Insufficient stock for {product.get('name', product_id)}. Available: {self.available}"
+        else:
+            message = f"Product {product_id} not found"
+        super().__init__(message)
+
+
+def _record(metric, amount=1):
+    with _stats_lock:
+        _stats[metric] += amount
+
+
+def get_reservation_stats():
+    """Get a snapshot of the reservation metrics"""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def aggregate_quantities(items, id_key='id'):
+    """Sum cart quantities per product -> {ObjectId: quantity}"""
+    quantities = {}
+    for item in items:
+        product_id = ObjectId(item[id_key])
+        quantities[product_id] = quantities.get(product_id, 0) + item['quantity']
+    return quantities
+
+
+def reserve_stock(collection, owner_filter, quantities):
+    """
+    Decrement stock for every product in `quantities` or for none of them
+
+    Args:
+        collection: Products collection (regular or demo)
+        owner_filter: Tenant/demo isolation filter
+        quantities: Dict of {product ObjectId: quantity}
+
+    Raises:
+        InsufficientStockError: A product is missing or short (nothing is decremented)
+        StockReservationError: Contention retries were exhausted (nothing is decremented)
+    """
+    if not quantities:
+        return
+
+    max_retries = current_app.config.get('STOCK_RESERVATION_MAX_RETRIES', 3)
+    product_ids = list(quantities.keys())
+    attempt = 0
+
+    while True:
+        token = ObjectId()
+        now = get_current_utc_time()
+
+        result = collection.bulk_write([
+            UpdateOne(
+                {**owner_filter, '_id': product_id, 'stock': {'$gte': quantity}},
+                {
+                    '$inc': {'stock': -quantity},
+                    '$set': {'updated_at': now},
+                    '$push': {RESERVATION_FIELD: token}
+                }
+            )
+            for product_id, quantity in quantities.items()
+        ], ordered=False)
+
+        if result.modified_count == len(quantities):
+            collection.update_many(
+                {'_id': {'$in': product_ids}},
+                {'$pull': {RESERVATION_FIELD: token}}
+            )
+            product_events.stock_changed(
+                collection, owner_filter,
+                {product_id: -quantity for product_id, quantity in quantities.items()}
+            )
+            _record('reservations')
+            return
+
+        # Partial reservation - undo exactly the decrements that were applied
+        if result.modified_count:
+            _compensate(collection, quantities, token)
+            _record('rollbacks')
+
+        # Find out whether the shortfall is real
+        current = {
+            p['_id']: p for p in collection.find(
+                {**owner_filter, '_id': {'$in': product_ids}},
+                {'name': 1, 'stock': 1}
+            )
+        }
+        for product_id, quantity in quantities.items():
+            product = current.get(product_id)
+            if not product or product.get('stock', 0) < quantity:
+                _record('insufficient_stock')
+                raise InsufficientStockError(product_id, quantity, product)
+
+        # Enough stock now - we lost a race against another terminal
+        if attempt >= max_retries:
+            raise StockReservationError('Stock is being updated by another terminal, please retry')
+        attempt += 1
+        _record('contention_retries')
+
+
+def _compensate(collection, quantities, token):
+    """Give back the decrements tagged with `token`"""
+    now = get_current_utc_time()
+    collection.bulk_write([
+        UpdateOne(
+            {'_id': product_id, RESERVATION_FIELD: token},
+            {
+                '$inc': {'stock': quantity},
+                '$set': {'updated_at': now},
+                '$pull': {RESERVATION_FIELD: token}
+            }
+        )
+        for product_id, quantity in quantities.items()
+    ], ordered=False)
+
+
+def restock(collection, owner_filter, quantities):
+    """Return reserved stock, e.g. when the sale could not be recorded"""
+    if not quantities:
+        return
+
+    now = get_current_utc_time()
+    collection.bulk_write([
+        UpdateOne(
+            {**owner_filter, '_id': product_id},
+            {'$inc': {'stock': quantity}, '$set': {'updated_at': now}}
+        )
+        for product_id, quantity in quantities.items()
+    ], ordered=False)
+    product_events.stock_changed(collection, owner_filter, quantities)
@@ -0,0 +1,12 @@
+"""
+Seed document number counters from existing receipts, invoices, POs,
+journal entries and employees. Run once after upgrading; safe to re-run.
+"""
+from app import create_app
+from app.utils.sequence_service import backfill_sequences
+
+app = create_app()
+
+with app.app_context():
+    seeded = backfill_sequences()
+    print(f"✅ Seeded {seeded} document number counters")
@@ -0,0 +1,100 @@
+"""
+Benchmark JSON responses of raw Mongo documents (app/utils/json_provider.py)
+
+Encodes a synthetic journal listing (/api/accounting/journal) the old way -
+serialize_doc, then Flask's default encoder - and through MongoJSONProvider
+with the stdlib encoder and with orjson, and checks all three agree.
+
+Usage:
+    python bench_json_encoding.py [--docs 10000] [--runs 10]
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from app.utils import json_provider
+from app.utils.helpers import serialize_doc
+
+ACCOUNTS = [('1000', 'Cash'), ('1100', 'Accounts Receivable'), ('1200', 'Inventory'),
+            ('2000', 'Accounts Payable'), ('4000', 'Sales Revenue'), ('5000', 'Cost of Goods Sold')]
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument('--docs', type=int, default=10000)
+parser.add_argument('--runs', type=int, default=10)
+args = parser.parse_args()
+
+random.seed(42)
+tenant_id = ObjectId()
+started_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+entries = []
+for i in range(args.docs):
+    amount = round(random.uniform(100, 50000), 2)
+    debit, credit = random.sample(ACCOUNTS, 2)
+    created = started_at + timedelta(minutes=i * 7)
+    entries.append({
+        '_id': ObjectId(),
+        'tenant_id': tenant_id,
+        'entry_number': f"JE-{i + 1:06d}",
+        'date': created,
+        'description': f"Sale #{i + 1}",
+        'reference': f"INV-{i + 1:06d}",
+        'lines': [
+            {'account_id': ObjectId(), 'account_code': debit[0], 'account_name': debit[1], 'debit': amount, 'credit': 0},
+            {'account_id': ObjectId(), 'account_code': credit[0], 'account_name': credit[1], 'debit': 0, 'credit': amount}
+        ],
+        'total_debit': amount,
+        'total_credit': amount,
+        'status': 'posted',
+        'created_by': ObjectId(),
+        'created_at': created
+    })
+
+app = Flask(__name__)
+default_provider = DefaultJSONProvider(app)
+mongo_provider = json_provider.MongoJSONProvider(app)
+orjson_module = json_provider.orjson
+
+
+def old_path():
+    return default_provider.response(serialize_doc(entries)).get_data()
+
+
+def stdlib_path():
+    json_provider.orjson = None
+    try:
+        return mongo_provider.response(entries).get_data()
+    finally:
+        json_provider.orjson = orjson_module
+
+
+def orjson_path():
+    return mongo_provider.response(entries).get_data()
+
+
+def measure(label, encode, baseline=None):
+    timings = []
+    for _ in range(args.runs):
+        started = time.perf_counter()
+        body = encode()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    median = timings[len(timings) // 2]
+    speedup = f"  {baseline / median:.1f}x" if baseline else ''
+    print(f"📦 {label:<34} {median:8.1f} ms  {len(body) / 1024:8.0f} KB{speedup}")
+    return median, body
+
+
+with app.app_context():
+    print(f"🧾 {args.docs} journal entries, median of {args.runs} runs")
+    baseline, expected = measure('serialize_doc + Flask encoder', old_path)
+    _, body = measure('MongoJSONProvider (stdlib)', stdlib_path, baseline)
+    assert json.loads(body) == json.loads(expected), "stdlib output differs from serialize_doc"
+    if orjson_module is not None:
+        _, body = measure('MongoJSONProvider (orjson)', orjson_path, baseline)
+        assert json.loads(body) == json.loads(expected), "orjson output differs from serialize_doc"
+    else:
+        print("⚠️  orjson is not installed - skipped")
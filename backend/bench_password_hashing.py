@@ -0,0 +1,57 @@
+"""
+Benchmark password verification throughput through the bcrypt pool
+
+Simulates a shift-change burst: many concurrent logins verified through
+app/utils/password_service.py, for each cost factor and pool size.
+
+Usage:
+    python bench_password_hashing.py [--rounds 10 12] [--logins 200] [--clients 32]
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from app.utils.password_service import (
+    configure_password_hashing, hash_password, verify_password, PasswordServiceBusy
+)
+
+
+def run(rounds, workers, logins, clients, queue_limit):
+    configure_password_hashing(rounds=rounds, workers=workers, queue_limit=queue_limit)
+    password = 'Shift-Change-123'
+    password_hash = hash_password(password)
+
+    def login(_):
+        try:
+            return verify_password(password, password_hash)
+        except PasswordServiceBusy:
+            return None
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        results = list(pool.map(login, range(logins)))
+    elapsed = time.perf_counter() - started
+
+    rejected = results.count(None)
+    verified = logins - rejected
+    per_sec = verified / elapsed if elapsed else 0
+    print(f"  rounds={rounds:<3} workers={workers:<3} "
+          f"{per_sec:8.1f} logins/sec  {per_sec / workers:7.1f} per core  "
+          f"rejected={rejected}")
+
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument('--rounds', type=int, nargs='+', default=[10, 12])
+parser.add_argument('--logins', type=int, default=200)
+parser.add_argument('--clients', type=int, default=32)
+parser.add_argument('--queue-limit', type=int, default=64)
+args = parser.parse_args()
+
+cores = os.cpu_count() or 1
+pool_sizes = sorted({1, max(1, cores // 2), cores})
+
+print(f"🔐 bcrypt login benchmark ({cores} cores, {args.logins} logins, {args.clients} concurrent clients)")
+for rounds in args.rounds:
+    for workers in pool_sizes:
+        run(rounds, workers, args.logins, args.clients, args.queue_limit)
+print("✅ Done")
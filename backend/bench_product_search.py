@@ -0,0 +1,62 @@
+"""
+Benchmark the in-process product search index (app/utils/product_search.py)
+
+Builds an index over a synthetic catalog and reports build time and
+per-query latency for prefix, typo, multi-term and SKU/barcode queries.
+
+Usage:
+    python bench_product_search.py [--products 100000] [--runs 50]
+"""
+import argparse
+import random
+import string
+import time
+from app.utils.product_search import TenantSearchIndex
+
+WORDS = [
+    'coke', 'cola', 'pepsi', 'sprite', 'fanta', 'water', 'milk', 'bread', 'chips', 'lays',
+    'chocolate', 'cookie', 'coffee', 'tea', 'juice', 'mango', 'apple', 'orange', 'soap', 'shampoo',
+    'rice', 'sugar', 'salt', 'oil', 'butter', 'cheese', 'yogurt', 'biscuit', 'candy', 'gum'
+]
+SIZES = ['250ml', '500ml', '1l', '1.5l', '100g', '250g', '1kg', 'small', 'large', 'family']
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument('--products', type=int, default=100000)
+parser.add_argument('--runs', type=int, default=50)
+args = parser.parse_args()
+
+random.seed(42)
+products = []
+for i in range(args.products):
+    brand = ''.join(random.choices(string.ascii_lowercase, k=6))
+    products.append({
+        '_id': i,
+        'name': f"{brand} {' '.join(random.sample(WORDS, 2))} {random.choice(SIZES)}",
+        'sku': f"SKU-{i:06d}",
+        'barcode': str(4000000000000 + i),
+        'category': random.choice(WORDS),
+        'price': round(random.uniform(10, 500), 2),
+        'stock': random.randint(0, 200)
+    })
+
+index = TenantSearchIndex()
+started = time.perf_counter()
+index.load(products)
+print(f"🔎 Indexed {args.products} products in {time.perf_counter() - started:.2f}s "
+      f"({len(index.vocabulary)} distinct tokens)")
+
+index.velocity = {i: random.randint(1, 100) for i in range(0, args.products, 5)}
+
+queries = ['cok', 'cpke', 'chocolate cookie', 'mango jui', 'shampo 250', 'SKU-001234', str(4000000000000 + 777)]
+for query in queries:
+    timings = []
+    for _ in range(args.runs):
+        started = time.perf_counter()
+        total, results = index.search(query, offset=0, limit=20)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    p50 = timings[len(timings) // 2]
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    top = results[0]['name'] if results else '-'
+    print(f"  {query:<18} {total:>7} hits  p50 {p50:6.2f} ms  p95 {p95:6.2f} ms  top: {top}")
+print("✅ Done")
@@ -0,0 +1,43 @@
+"""
+Build and audit MongoDB indexes declared in app/utils/index_registry.py
+
+Usage:
+    python manage_indexes.py build    # create missing indexes (run once per deploy)
+    python manage_indexes.py report   # list missing, unused and undeclared indexes
+"""
+import os
+import sys
+
+# Build here, not in create_app - otherwise `build` would always find everything built
+os.environ['AUTO_CREATE_INDEXES'] = 'false'
+
+from app import create_app
+from app.utils.index_registry import ensure_indexes, report_indexes
+
+command = sys.argv[1] if len(sys.argv) > 1 else 'report'
+if command not in ('build', 'report'):
+    print(__doc__)
+    sys.exit(1)
+
+app = create_app()
+
+with app.app_context():
+    if command == 'build':
+        created = ensure_indexes()
+        for collection_name, names in created.items():
+            for name in names:
+                print(f"✅ {collection_name}: created {name}")
+        if not created:
+            print("✅ All declared indexes exist")
+    else:
+        report = report_indexes()
+        for collection_name, details in report.items():
+            print(f"\n📁 {collection_name}")
+            for name in details['missing']:
+                print(f"   ❌ missing     {name}")
+            for name in details['unused']:
+                print(f"   💤 unused      {name}")
+            for name in details['undeclared']:
+                print(f"   ⚠️ undeclared  {name}")
+        if not report:
+            print("✅ Indexes match the registry")
@@ -0,0 +1,46 @@
+"""
+Inspect and operate the post-commit outbox (app/utils/outbox_service.py)
+
+Usage:
+    python manage_outbox.py stats         # backlog by status
+    python manage_outbox.py dead          # list records that exhausted their retries
+    python manage_outbox.py retry [key]   # move dead records (or one key) back to pending
+    python manage_outbox.py drain         # process due records in the foreground until none are left
+"""
+import os
+import sys
+
+# This script works the outbox itself - don't start the background workers
+os.environ['OUTBOX_WORKERS'] = '0'
+
+from app import create_app
+from app.utils.outbox_service import get_outbox_collection, get_outbox_stats, retry_dead, process_next
+
+command = sys.argv[1] if len(sys.argv) > 1 else 'stats'
+if command not in ('stats', 'dead', 'retry', 'drain'):
+    print(__doc__)
+    sys.exit(1)
+
+app = create_app()
+
+with app.app_context():
+    if command == 'stats':
+        for status, count in get_outbox_stats()['backlog'].items():
+            print(f"📦 {status:<11} {count}")
+    elif command == 'dead':
+        dead = list(get_outbox_collection().find({'status': 'dead'}).sort('failed_at', 1))
+        for record in dead:
+            print(f"❌ {record['idempotency_key']}  attempts={record['attempts']}  {record.get('last_error')}")
+        if not dead:
+            print("✅ No dead records")
+    elif command == 'retry':
+        count = retry_dead(sys.argv[2] if len(sys.argv) > 2 else None)
+        print(f"✅ {count} record(s) moved back to pending")
+    else:
+        processed = 0
+        while True:
+            with app.app_context():
+                if not process_next(f"manage_outbox:{os.getpid()}"):
+                    break
+            processed += 1
+        print(f"✅ Processed {processed} record(s)")
@@ -0,0 +1,29 @@
+"""
+Recompute the daily activity counters (activity_counters) from the activity logs
+
+Usage:
+    python rebuild_activity_counters.py                # every day still in the hot logs
+    python rebuild_activity_counters.py 2026-01-01     # only days from this date on
+
+Counters of days that were already archived are kept. Best run while few
+logs are being written - entries logged during the rebuild can be miscounted.
+"""
+import sys
+from datetime import datetime, timezone
+from app import create_app
+from app.utils.activity_service import rebuild_activity_counters
+
+since = None
+if len(sys.argv) > 1:
+    try:
+        since = datetime.strptime(sys.argv[1], '%Y-%m-%d').replace(tzinfo=timezone.utc)
+    except ValueError:
+        print(__doc__)
+        sys.exit(1)
+
+app = create_app()
+
+with app.app_context():
+    rebuilt = rebuild_activity_counters(since)
+    for collection_name, count in rebuilt.items():
+        print(f"✅ {collection_name}: {count} counters rebuilt")
@@ -0,0 +1,31 @@
+"""
+Recompute the hourly sales rollups (sales_rollups) from the sales and their payments
+
+Usage:
+    python rebuild_sales_rollups.py                # every day that has sales
+    python rebuild_sales_rollups.py 2026-01-01     # only days from this date on
+
+Run it once after deploying the rollups, to cover the sales made before them.
+It is not safe to run live: stop the app, drain the outbox first
+(python manage_outbox.py drain) and leave no records pending or dead, or
+their rollup increments are added on top of sales the rebuild counted.
+"""
+import sys
+from datetime import datetime, timezone
+from app import create_app
+from app.utils.rollup_service import rebuild_sales_rollups
+
+since = None
+if len(sys.argv) > 1:
+    try:
+        since = datetime.strptime(sys.argv[1], '%Y-%m-%d').replace(tzinfo=timezone.utc)
+    except ValueError:
+        print(__doc__)
+        sys.exit(1)
+
+app = create_app()
+
+with app.app_context():
+    rebuilt = rebuild_sales_rollups(since)
+    for collection_name, count in rebuilt.items():
+        print(f"✅ {collection_name}: {count} rollups rebuilt")
@@ -342,6 +342,53 @@ function TrialBalanceReport({ data }) {
     )
 }
 
+// Further rows of the aged report buckets: the summary carries each bucket's first
+// page, the rest is read from `${endpoint}/items` at the summary's as_of
+function useAgingPages(data, endpoint) {
+    const toast = useToast()
+    const [pages, setPages] = useState({})
+    const [loadingBucket, setLoadingBucket] = useState(null)
+
+    useEffect(() => {
+        setPages({})
+    }, [data])
+
+    const itemsOf = (key) => [...(data[key]?.items || []), ...(pages[key]?.items || [])]
+    const cursorOf = (key) => (key in pages ? pages[key].next_cursor : data[key]?.next_cursor)
+
+    const loadMore = async (key) => {
+        setLoadingBucket(key)
+        try {
+            const params = new URLSearchParams({ bucket: key, cursor: cursorOf(key), as_of: data.as_of })
+            const res = await api.get(`${endpoint}/items?${params}`)
+            setPages(prev => ({
+                ...prev,
+                [key]: { items: [...(prev[key]?.items || []), ...res.data.items], next_cursor: res.data.next_cursor }
+            }))
+        } catch (error) {
+            console.error('Error loading bucket rows:', error)
+            toast.error('Failed to load more rows')
+        } finally {
+            setLoadingBucket(null)
+        }
+    }
+
+    return { itemsOf, cursorOf, loadMore, loadingBucket }
+}
+
+function AgingLoadMore({ shown, count, hasMore, loading, onLoadMore }) {
+    return (
+        <div className="flex justify-between items-center px-4 py-3 border-t bg-gray-50 text-sm text-gray-600">
+            <span>Showing {shown} of {count}</span>
+            {hasMore && (
+                <button onClick={onLoadMore} disabled={loading} className="btn-secondary">
+                    {loading ? 'Loading...' : 'Load more'}
+                </button>
+            )}
+        </div>
+    )
+}
+
 function AgedReceivablesReport({ data }) {
     const buckets = [
         { key: 'current', label: 'Current (0-30 days)', bgClass: 'bg-green-50', borderClass: 'border-green-500', textClass: 'text-green-700', headerBg: 'bg-green-100', headerText: 'text-green-800' },
@@ -349,6 +396,7 @@ function AgedReceivablesReport({ data }) {
         { key: 'days_61_90', label: '61-90 days', bgClass: 'bg-orange-50', borderClass: 'border-orange-500', textClass: 'text-orange-700', headerBg: 'bg-orange-100', headerText: 'text-orange-800' },
         { key: 'over_90', label: 'Over 90 days', bgClass: 'bg-red-50', borderClass: 'border-red-500', textClass: 'text-red-700', headerBg: 'bg-red-100', headerText: 'text-red-800' }
     ]
+    const { itemsOf, cursorOf, loadMore, loadingBucket } = useAgingPages(data, '/accounting/reports/aged-receivables')
 
     return (
         <div className="space-y-6">
@@ -360,7 +408,7 @@ function AgedReceivablesReport({ data }) {
                         <p className={`text-xl font-bold ${bucket.textClass}`}>
                             PKR {data[bucket.key]?.total?.toLocaleString()}
                         </p>
-                        <p className="text-sm text-gray-600">{data[bucket.key]?.items?.length || 0} invoices</p>
+                        <p className="text-sm text-gray-600">{data[bucket.key]?.count ?? data[bucket.key]?.items?.length ?? 0} invoices</p>
                     </div>
                 ))}
                 <div className="bg-indigo-600 rounded-lg p-4 text-white">
@@ -371,7 +419,7 @@ function AgedReceivablesReport({ data }) {
 
             {/* Detail Tables */}
             {buckets.map(bucket => (
-                data[bucket.key]?.items?.length > 0 && (
+                itemsOf(bucket.key).length > 0 && (
                     <div key={bucket.key} className="bg-white rounded-xl shadow-sm overflow-hidden">
                         <div className={`${bucket.headerBg} px-6 py-3 border-b`}>
                             <h4 className={`font-bold ${bucket.headerText}`}>{bucket.label}</h4>
@@ -389,7 +437,7 @@ function AgedReceivablesReport({ data }) {
                                 </tr>
                             </thead>
                             <tbody className="divide-y divide-gray-200">
-                                {data[bucket.key].items.map((item, i) => (
+                                {itemsOf(bucket.key).map((item, i) => (
                                     <tr key={i} className="hover:bg-gray-50">
                                         <td className="px-4 py-2 font-mono text-sm text-gray-900">{item.receipt_number}</td>
                                         <td className="px-4 py-2 text-gray-900">{item.customer_name}</td>
@@ -402,6 +450,13 @@ function AgedReceivablesReport({ data }) {
                                 ))}
                             </tbody>
                         </table>
+                        <AgingLoadMore
+                            shown={itemsOf(bucket.key).length}
+                            count={data[bucket.key].count}
+                            hasMore={Boolean(cursorOf(bucket.key))}
+                            loading={loadingBucket === bucket.key}
+                            onLoadMore={() => loadMore(bucket.key)}
+                        />
                     </div>
                 )
             ))}
@@ -416,6 +471,7 @@ function AgedPayablesReport({ data }) {
         { key: 'days_61_90', label: '61-90 days', bgClass: 'bg-orange-50', borderClass: 'border-orange-500', textClass: 'text-orange-700', headerBg: 'bg-orange-100', headerText: 'text-orange-800' },
         { key: 'over_90', label: 'Over 90 days', bgClass: 'bg-red-50', borderClass: 'border-red-500', textClass: 'text-red-700', headerBg: 'bg-red-100', headerText: 'text-red-800' }
     ]
+    const { itemsOf, cursorOf, loadMore, loadingBucket } = useAgingPages(data, '/accounting/reports/aged-payables')
 
     return (
         <div className="space-y-6">
@@ -427,7 +483,7 @@ function AgedPayablesReport({ data }) {
                         <p className={`text-xl font-bold ${bucket.textClass}`}>
                             PKR {data[bucket.key]?.total?.toLocaleString()}
                         </p>
-                        <p className="text-sm text-gray-600">{data[bucket.key]?.items?.length || 0} POs</p>
+                        <p className="text-sm text-gray-600">{data[bucket.key]?.count ?? data[bucket.key]?.items?.length ?? 0} POs</p>
                     </div>
                 ))}
                 <div className="bg-red-600 rounded-lg p-4 text-white">
@@ -438,7 +494,7 @@ function AgedPayablesReport({ data }) {
 
             {/* Detail Tables */}
             {buckets.map(bucket => (
-                data[bucket.key]?.items?.length > 0 && (
+                itemsOf(bucket.key).length > 0 && (
                     <div key={bucket.key} className="bg-white rounded-xl shadow-sm overflow-hidden">
                         <div className={`${bucket.headerBg} px-6 py-3 border-b`}>
                             <h4 className={`font-bold ${bucket.headerText}`}>{bucket.label}</h4>
@@ -456,7 +512,7 @@ function AgedPayablesReport({ data }) {
                                 </tr>
                             </thead>
                             <tbody className="divide-y divide-gray-200">
-                                {data[bucket.key].items.map((item, i) => (
+                                {itemsOf(bucket.key).map((item, i) => (
                                     <tr key={i} className="hover:bg-gray-50">
                                         <td className="px-4 py-2 font-mono text-sm text-gray-900">{item.po_number}</td>
                                         <td className="px-4 py-2 text-gray-900">{item.supplier_name}</td>
@@ -469,6 +525,13 @@ function AgedPayablesReport({ data }) {
                                 ))}
                             </tbody>
                         </table>
+                        <AgingLoadMore
+                            shown={itemsOf(bucket.key).length}
+                            count={data[bucket.key].count}
+                            hasMore={Boolean(cursorOf(bucket.key))}
+                            loading={loadingBucket === bucket.key}
+                            onLoadMore={() => loadMore(bucket.key)}
+                        />
                     </div>
                 )
             ))}